@@ -1,6 +1,5 @@
 from src.mcp_server import mcp 
 import argparse  # 添加 argparse 模块
-import docker
 from mcp.server.models import InitializationOptions
 
 
@@ -16,6 +15,7 @@ if __name__ == "__main__":
     if args.kali_image:
         image_name = args.kali_image
         # use docker lib to check if the image exists
+        import docker
         client = docker.from_env()
         try:
             client.images.get(image_name)
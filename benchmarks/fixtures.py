@@ -0,0 +1,130 @@
+"""
+Local fixtures for the benchmark suite: generated ELF binaries, synthetic pcaps and a localhost scan target
+"""
+import os
+import sys
+import random
+import shutil
+import socket
+import struct
+import asyncio
+import subprocess
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+# number of generated functions per ELF size
+ELF_SIZES = {"small": 50, "medium": 2000, "large": 20000}
+# ports opened on 127.0.0.1; all are in nmap's --top-ports 100 used by -F
+TARGET_PORTS = (8000, 8080, 8443, 9100)
+
+
+def _c_source(functions: int, seed: int) -> str:
+    rng = random.Random(seed)
+    lines = ["#include <stdio.h>", "#include <string.h>", ""]
+    for i in range(functions):
+        cases = "\n".join(
+            f"    case {c}: return x * {rng.randrange(3, 977)} + {rng.randrange(1 << 20)};" for c in range(6)
+        )
+        lines.append(f'const char *message_{i} = "benchmark fixture string {i} {rng.getrandbits(64):016x}";')
+        lines.append(f"__attribute__((noinline)) int function_{i}(int x) {{\n"
+                     f"  switch (x % 7) {{\n{cases}\n"
+                     f"    default: return (int)strlen(message_{i}) + x;\n  }}\n}}")
+    calls = " + ".join(f"function_{i}(argc)" for i in range(0, functions, max(1, functions // 64)))
+    lines.append(f"int main(int argc, char **argv) {{ printf(\"%d\\n\", {calls}); return 0; }}")
+    return "\n".join(lines) + "\n"
+
+
+def build_elf(directory: str, size: str, seed: int = 0) -> str:
+    """
+    Compile an ELF executable with a number of functions given by ELF_SIZES[size]
+    Falls back to a system binary of similar scale when no C compiler is available.
+    """
+    path = os.path.join(directory, f"fixture_{size}")
+    compiler = shutil.which("cc") or shutil.which("gcc") or shutil.which("clang")
+    if compiler is None:
+        fallbacks = {"small": "/bin/true", "medium": "/bin/ls", "large": sys.executable}
+        shutil.copy(os.path.realpath(fallbacks[size]), path)
+        return path
+    source = os.path.join(directory, f"fixture_{size}.c")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write(_c_source(ELF_SIZES[size], seed))
+    subprocess.run([compiler, "-O1", "-fno-inline", "-o", path, source], check=True)
+    return path
+
+
+def _checksum(header: bytes) -> int:
+    total = sum(struct.unpack(f"!{len(header) // 2}H", header))
+    total = (total >> 16) + (total & 0xFFFF)
+    return ~(total + (total >> 16)) & 0xFFFF
+
+
+def _ipv4(source: int, destination: int, protocol: int, payload: bytes, ident: int) -> bytes:
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), ident & 0xFFFF, 0x4000, 64, protocol, 0,
+                         source.to_bytes(4, "big"), destination.to_bytes(4, "big"))
+    return header[:10] + struct.pack("!H", _checksum(header)) + header[12:] + payload
+
+
+def write_pcap(path: str, packets: int, seed: int = 0) -> str:
+    """
+    Write a pcap of Ethernet/IPv4 traffic: HTTP requests and responses, DNS
+    queries and bare TCP segments between a few hundred hosts
+    """
+    rng = random.Random(seed)
+    clients = [0x0A000000 + rng.randrange(1, 1 << 16) for _ in range(200)]
+    servers = [0xC0A80000 + rng.randrange(1, 255) for _ in range(20)]
+    ethernet = b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02\x08\x00"
+    seconds = 1_700_000_000
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for number in range(packets):
+            client, server = rng.choice(clients), rng.choice(servers)
+            port = rng.randrange(1024, 65535)
+            kind = rng.random()
+            if kind < 0.3:
+                uri = f"/api/v1/items/{rng.randrange(1000)}"
+                payload = f"GET {uri} HTTP/1.1\r\nHost: example.test\r\nUser-Agent: bench\r\n\r\n".encode()
+                segment = struct.pack("!HHIIBBHHH", port, 80, number, 0, 0x50, 0x18, 65535, 0, 0) + payload
+                frame = _ipv4(client, server, 6, segment, number)
+            elif kind < 0.5:
+                payload = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+                segment = struct.pack("!HHIIBBHHH", 80, port, number, 0, 0x50, 0x18, 65535, 0, 0) + payload
+                frame = _ipv4(server, client, 6, segment, number)
+            elif kind < 0.7:
+                name = b"".join(bytes([len(label)]) + label for label in (b"host%d" % rng.randrange(100), b"example", b"test"))
+                query = struct.pack("!HHHHHH", number & 0xFFFF, 0x0100, 1, 0, 0, 0) + name + b"\x00\x00\x01\x00\x01"
+                datagram = struct.pack("!HHHH", port, 53, 8 + len(query), 0) + query
+                frame = _ipv4(client, server, 17, datagram, number)
+            else:
+                segment = struct.pack("!HHIIBBHHH", port, rng.choice((22, 443, 3306)), number, 0, 0x50, 0x10,
+                                      65535, 0, 0)
+                frame = _ipv4(client, server, 6, segment, number)
+            data = ethernet + frame
+            f.write(struct.pack("<IIII", seconds + number // 1000, (number % 1000) * 1000, len(data), len(data)))
+            f.write(data)
+    return path
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        writer.write(b"HTTP/1.0 200 OK\r\nServer: bench\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+@asynccontextmanager
+async def local_target() -> AsyncIterator[dict]:
+    """Listen on TARGET_PORTS of 127.0.0.1 for the nmap benchmarks; busy ports are skipped"""
+    servers = []
+    for port in TARGET_PORTS:
+        try:
+            servers.append(await asyncio.start_server(_serve, "127.0.0.1", port, family=socket.AF_INET))
+        except OSError:
+            continue
+    try:
+        yield {"address": "127.0.0.1", "ports": [s.sockets[0].getsockname()[1] for s in servers]}
+    finally:
+        for server in servers:
+            server.close()
@@ -0,0 +1,361 @@
+"""
+Benchmark every action module on local fixtures, directly and in the sandbox
+
+Usage:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --only 'objdump|strings' --modes direct,sandbox
+    python -m benchmarks.suite --compare base.json results.json --threshold 1.2
+
+Each case reports latency (min/median/p95/mean over --repeat sequential calls),
+throughput with --concurrency calls in flight, the peak RSS of the server
+process while the case ran and the largest RSS of any tool process so far.
+The result cache and request coalescing are off unless --cache / --coalesce
+are given, so every call runs the tool.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+from benchmarks.fixtures import ELF_SIZES, build_elf, write_pcap, local_target
+
+
+@dataclass
+class Case:
+    """One action benchmarked on one fixture"""
+    module: str
+    action: str
+    tool: str
+    fixture: str
+    call: Callable[[dict], Awaitable[Any]]
+    # slow network cases run fewer times
+    repeat: Optional[int] = None
+    concurrency: Optional[int] = None
+    params: dict = field(default_factory=dict)
+
+
+def build_cases(fixtures: dict) -> list[Case]:
+    """All cases, importing the actions only after the environment is configured"""
+    from src.kali_mcps.nm import actions as nm
+    from src.kali_mcps.objdump import actions as objdump
+    from src.kali_mcps.strings import actions as strings
+    from src.kali_mcps.wireshark import actions as wireshark
+    from src.kali_mcps.traceroute import actions as traceroute
+    from src.kali_mcps.nmap import actions as nmap
+
+    cases = []
+    for size in fixtures["elf"]:
+        fixture = f"elf:{size}"
+        for name in ("basic_symbols", "dynamic_symbols", "demangle_symbols", "numeric_sort", "size_sort",
+                     "undefined_symbols"):
+            action = getattr(nm, f"{name}_action")
+            cases.append(Case("nm", name, "nm", fixture, lambda f, a=action, s=size: a(f["elf"][s])))
+        for name in ("file_headers", "disassemble", "symbol_table", "section_headers", "full_contents"):
+            action = getattr(objdump, f"{name}_action")
+            cases.append(Case("objdump", name, "objdump", fixture, lambda f, a=action, s=size: a(f["elf"][s])))
+        cases.append(Case("objdump", "elf_info", "objdump", fixture,
+                          lambda f, s=size: objdump.elf_info_action(f["elf"][s], include_symbols=True)))
+        cases.append(Case("objdump", "disassembly_lookup", "objdump", fixture,
+                          lambda f, s=size: objdump.disassembly_lookup_action(f["elf"][s], function="_start")))
+        cases.append(Case("objdump", "disassembly_page", "objdump", fixture,
+                          lambda f, s=size: objdump.disassembly_lookup_action(f["elf"][s], page=0)))
+        for name in ("basic_strings", "min_length_strings", "offset_strings", "encoding_strings"):
+            action = getattr(strings, f"{name}_action")
+            cases.append(Case("strings", name, "strings", fixture, lambda f, a=action, s=size: a(f["elf"][s])))
+        cases.append(Case("strings", "all_encodings_strings", "strings", fixture,
+                          lambda f, s=size: strings.all_encodings_strings_action(f["elf"][s])))
+
+    for packets in fixtures["pcap"]:
+        fixture = f"pcap:{packets}"
+        cases.extend([
+            Case("wireshark", "analyze_pcap", "tshark", fixture,
+                 lambda f, p=packets: wireshark.analyze_pcap_action(f["pcap"][p])),
+            Case("wireshark", "analyze_pcap_filtered", "tshark", fixture,
+                 lambda f, p=packets: wireshark.analyze_pcap_action(f["pcap"][p], "http and tcp.port == 80")),
+            Case("wireshark", "extract_http", "tshark", fixture,
+                 lambda f, p=packets: wireshark.extract_http_action(f["pcap"][p])),
+            Case("wireshark", "protocol_hierarchy", "tshark", fixture,
+                 lambda f, p=packets: wireshark.protocol_hierarchy_action(f["pcap"][p])),
+            Case("wireshark", "conversation_statistics", "tshark", fixture,
+                 lambda f, p=packets: wireshark.conversation_statistics_action(f["pcap"][p])),
+            Case("wireshark", "expert_info", "tshark", fixture,
+                 lambda f, p=packets: wireshark.expert_info_action(f["pcap"][p])),
+            Case("wireshark", "query_pcap", "tshark", fixture,
+                 lambda f, p=packets: wireshark.query_pcap_action(f["pcap"][p], "tcp", "ip.src")),
+        ])
+    cases.append(Case("wireshark", "capture_live", "tshark", "lo:1s",
+                      lambda f: wireshark.capture_live_action("lo", duration=1), repeat=1, concurrency=1))
+
+    target = "target:127.0.0.1"
+    for name in ("basic_scan", "quick_scan", "stealth_scan"):
+        action = getattr(nmap, f"{name}_action")
+        cases.append(Case("nmap", name, "nmap", target, lambda f, a=action: a(f["target"]), repeat=3,
+                          concurrency=2))
+    for name in ("intense_scan", "vulnerability_scan"):
+        action = getattr(nmap, f"{name}_action")
+        cases.append(Case("nmap", name, "nmap", target, lambda f, a=action: a(f["target"]), repeat=1,
+                          concurrency=1))
+    cases.append(Case("nmap", "sharded_scan", "nmap", "target:127.0.0.0/28",
+                      lambda f: nmap.sharded_scan_action("127.0.0.0/28", shard_size=4), repeat=1, concurrency=1))
+    cases.append(Case("traceroute", "traceroute", "traceroute", target,
+                      lambda f: traceroute.traceroute_action(f["target"]), repeat=3, concurrency=2))
+    return cases
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Track the peak RSS of this process while a case runs"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._task = asyncio.ensure_future(self._sample())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+        self.peak = max(self.peak, current_rss())
+
+
+def output_size(result: Any) -> int:
+    if isinstance(result, tuple):
+        return sum(len(part) for part in result if isinstance(part, str))
+    return len(json.dumps(result, default=str))
+
+
+def failed(result: Any) -> Optional[str]:
+    """The error text of a result, if the action reported one and produced nothing"""
+    if isinstance(result, tuple) and len(result) == 2 and not result[0] and result[1]:
+        return result[1][:200]
+    if isinstance(result, dict) and result.get("error"):
+        return str(result["error"])[:200]
+    return None
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "min": round(ordered[0], 6),
+        "median": round(statistics.median(ordered), 6),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+        "mean": round(statistics.fmean(ordered), 6),
+    }
+
+
+async def run_case(case: Case, fixtures: dict, mode: str, repeat: int, concurrency: int,
+                   timeout: float) -> dict:
+    result = {"module": case.module, "action": case.action, "fixture": case.fixture, "mode": mode}
+    # in the sandbox the tool runs in the container image
+    if mode == "direct" and shutil.which(case.tool) is None:
+        result["skipped"] = f"{case.tool} not installed"
+        return result
+    os.environ["IS_SAFE"] = "true" if mode == "sandbox" else "false"
+    input_bytes = fixtures["sizes"].get(case.fixture, 0)
+    repeat = case.repeat or repeat
+    concurrency = case.concurrency or concurrency
+
+    try:
+        with RssSampler() as sampler:
+            # warm-up call, also checks the case works at all
+            first = await asyncio.wait_for(case.call(fixtures), timeout)
+            error = failed(first)
+            if error:
+                result["error"] = error
+                return result
+            latencies = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await asyncio.wait_for(case.call(fixtures), timeout)
+                latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await asyncio.wait_for(asyncio.gather(*(case.call(fixtures) for _ in range(concurrency))),
+                                   timeout * concurrency)
+            elapsed = time.perf_counter() - started
+    except asyncio.TimeoutError:
+        result["error"] = f"timed out after {timeout}s"
+        return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    result.update({
+        "repeat": repeat,
+        "latency_s": summarize(latencies),
+        "concurrency": concurrency,
+        "throughput_calls_s": round(concurrency / elapsed, 3),
+        "throughput_mib_s": round(input_bytes * concurrency / elapsed / (1024 * 1024), 3) if input_bytes else None,
+        "output_bytes": output_size(first),
+        "peak_rss_mib": round(sampler.peak / (1024 * 1024), 1),
+        "children_max_rss_mib": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    })
+    return result
+
+
+def sandbox_available() -> Optional[str]:
+    """None if docker is reachable, otherwise the reason it is not"""
+    try:
+        import docker
+        docker.from_env().ping()
+    except Exception as e:
+        return f"docker unavailable: {type(e).__name__}"
+    return None
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key != "compare"},
+    }
+
+
+async def run_suite(args: argparse.Namespace, workdir: str) -> dict:
+    fixtures = {"elf": {}, "pcap": {}, "sizes": {}}
+    for size in args.elf_sizes.split(","):
+        fixtures["elf"][size] = build_elf(workdir, size)
+        fixtures["sizes"][f"elf:{size}"] = os.path.getsize(fixtures["elf"][size])
+    for packets in (int(p) for p in args.pcap_packets.split(",")):
+        fixtures["pcap"][packets] = write_pcap(os.path.join(workdir, f"fixture_{packets}.pcap"), packets)
+        fixtures["sizes"][f"pcap:{packets}"] = os.path.getsize(fixtures["pcap"][packets])
+
+    cases = [case for case in build_cases(fixtures)
+             if re.search(args.only, f"{case.module}.{case.action}")]
+    modes = args.modes.split(",")
+    unavailable = sandbox_available() if "sandbox" in modes else None
+
+    results = []
+    async with local_target() as target:
+        fixtures["target"] = target["address"]
+        for mode in modes:
+            for case in cases:
+                if mode == "sandbox" and unavailable:
+                    result = {"module": case.module, "action": case.action, "fixture": case.fixture,
+                              "mode": mode, "skipped": unavailable}
+                else:
+                    result = await run_case(case, fixtures, mode, args.repeat, args.concurrency, args.timeout)
+                results.append(result)
+                print(format_row(result), file=sys.stderr)
+    return {"meta": metadata(args), "fixtures": fixtures["sizes"], "results": results}
+
+
+def format_row(result: dict) -> str:
+    name = f"{result['mode']:<7} {result['module']}.{result['action']} [{result['fixture']}]"
+    if "skipped" in result:
+        return f"{name:<64} skipped: {result['skipped']}"
+    if "error" in result:
+        return f"{name:<64} error: {result['error']}"
+    latency = result["latency_s"]
+    return (f"{name:<64} median {latency['median'] * 1000:9.2f} ms  p95 {latency['p95'] * 1000:9.2f} ms  "
+            f"{result['throughput_calls_s']:8.2f} calls/s  rss {result['peak_rss_mib']:7.1f} MiB")
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    """Print the median latency ratio of every case present in both files; 1 if any regressed"""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    def index(report: dict) -> dict:
+        return {(r["mode"], r["module"], r["action"], r["fixture"]): r for r in report["results"]
+                if "latency_s" in r}
+
+    before, after = index(base), index(new)
+    regressions = 0
+    print(f"base {base['meta'].get('commit')} -> new {new['meta'].get('commit')}")
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key]["latency_s"]["median"] / max(before[key]["latency_s"]["median"], 1e-9)
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{key[0]:<7} {key[1]}.{key[2]} [{key[3]}]".ljust(64)
+              + f"{before[key]['latency_s']['median'] * 1000:9.2f} ms -> "
+              f"{after[key]['latency_s']['median'] * 1000:9.2f} ms  x{ratio:.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all kali-mcps actions on local fixtures")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--only", default="", help="regex selecting cases by 'module.action'")
+    parser.add_argument("--modes", default="direct,sandbox", help="comma separated: direct, sandbox")
+    parser.add_argument("--repeat", type=int, default=10, help="sequential calls measured per case")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent calls for the throughput run")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed per call")
+    parser.add_argument("--elf-sizes", default=",".join(ELF_SIZES), help="comma separated ELF fixture sizes")
+    parser.add_argument("--pcap-packets", default="1000,100000", help="comma separated pcap fixture sizes")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache and pcap store enabled")
+    parser.add_argument("--coalesce", action="store_true", help="keep request coalescing enabled")
+    parser.add_argument("--no-native", action="store_true", help="run nm, strings and elf_info through the tools")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--threshold", type=float, default=1.2, help="median ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        raise SystemExit(compare(*args.compare, args.threshold))
+
+    with tempfile.TemporaryDirectory(prefix="kali-mcps-bench-") as workdir:
+        # keep every store inside the work directory so runs don't affect each other
+        os.environ.update({
+            "KALI_MCPS_CACHE": "true" if args.cache else "false",
+            "KALI_MCPS_PCAP_STORE": "true" if args.cache else "false",
+            "KALI_MCPS_COALESCE": "true" if args.coalesce else "false",
+            "KALI_MCPS_CACHE_DIR": os.path.join(workdir, "results"),
+            "KALI_MCPS_PCAP_STORE_DIR": os.path.join(workdir, "pcap"),
+            "KALI_MCPS_SCAN_DB": os.path.join(workdir, "scans.sqlite3"),
+            "KALI_MCPS_SCAN_DIR": os.path.join(workdir, "scans"),
+            "KALI_MCPS_SPOOL_DIR": os.path.join(workdir, "spool"),
+            "KALI_MCPS_JOB_DB": os.path.join(workdir, "jobs.sqlite3"),
+        })
+        if args.no_native:
+            os.environ.update({"KALI_MCPS_NATIVE_ELF": "false", "KALI_MCPS_NATIVE_STRINGS": "false"})
+        report = asyncio.run(run_suite(args, workdir))
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
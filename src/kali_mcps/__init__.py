@@ -1,13 +1,17 @@
 """
 Kali MCP Servers package
 """
-from src.kali_mcps.base.kali_command import CommandRunner
-from src.kali_mcps.objdump.actions import (
-    file_headers_action,
-    disassemble_action,
-    symbol_table_action,
-    section_headers_action,
-)
+import importlib
+
+# exported name -> module, imported on first attribute access so that importing
+# a single tool module does not load every other one
+_EXPORTS = {
+    "CommandRunner": "src.kali_mcps.base.kali_command",
+    "file_headers_action": "src.kali_mcps.objdump.actions",
+    "disassemble_action": "src.kali_mcps.objdump.actions",
+    "symbol_table_action": "src.kali_mcps.objdump.actions",
+    "section_headers_action": "src.kali_mcps.objdump.actions",
+}
 
 __all__ = [
     "CommandRunner",
@@ -15,4 +19,12 @@ __all__ = [
     "disassemble_action",
     "symbol_table_action",
     "section_headers_action",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
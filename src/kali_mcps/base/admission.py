@@ -0,0 +1,296 @@
+"""
+Admission control: start tool processes only while the host has CPU and memory for them
+"""
+import os
+import time
+import asyncio
+from typing import Optional
+from src.metrics import QUEUE_WAIT_SECONDS, get_metrics
+from src.kali_mcps.base.usage import SAMPLE_SECONDS, ProcessMonitor, get_usage_tracker
+
+ADMISSION = os.environ.get("KALI_MCPS_ADMISSION", "true").lower() == "true"
+# share of the host's memory tool processes may be charged for
+MEMORY_FRACTION = float(os.environ.get("KALI_MCPS_ADMISSION_MEMORY_FRACTION", "0.8"))
+# CPUs of tool work admitted per core
+CPU_FACTOR = float(os.environ.get("KALI_MCPS_ADMISSION_CPU_FACTOR", "1"))
+# commands waiting for admission beyond this many are rejected
+MAX_QUEUE = int(os.environ.get("KALI_MCPS_ADMISSION_QUEUE", "256"))
+# a command that waited this long for admission is rejected
+MAX_WAIT = float(os.environ.get("KALI_MCPS_ADMISSION_WAIT", "600"))
+
+# queued commands re-check load and free memory at least this often
+RECHECK_SECONDS = 1.0
+# estimates are observed peaks times this, capped at what the tool declares
+HEADROOM = 1.25
+MIN_MEMORY = 16 * 1024 * 1024
+MIN_CPUS = 0.05
+# weight of older observations when a tool's usage goes down
+DECAY = 0.8
+
+_UNITS = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+class AdmissionError(Exception):
+    """Raised when a command is rejected instead of queued"""
+    pass
+
+
+def parse_size(text: str) -> int:
+    """Bytes in a Docker style size such as '512m' or '2g'"""
+    text = str(text).strip().lower().rstrip("b")
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(float(text))
+
+
+def host_memory() -> tuple[int, int]:
+    """Total and available memory of the host in bytes"""
+    values = {}
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if "MemTotal" in values:
+        return values["MemTotal"], values.get("MemAvailable", values["MemTotal"])
+    total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    return total, total
+
+
+def host_load() -> float:
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return 0.0
+
+
+class Ticket:
+    """Admission of one command, holding its share of the host until released"""
+
+    def __init__(self, tool: str, declared_memory: int, declared_cpus: float, memory: int, cpus: float):
+        self.tool = tool
+        self.declared_memory = declared_memory
+        self.declared_cpus = declared_cpus
+        # what the command is currently charged
+        self.memory = memory
+        self.cpus = cpus
+        self.queued = time.monotonic()
+        self.started: Optional[float] = None
+        # samples of the local process, once it started
+        self.monitor: Optional[ProcessMonitor] = None
+
+    def describe(self, now: float) -> dict:
+        entry = {"tool": self.tool, "memory": self.memory, "cpus": round(self.cpus, 3)}
+        if self.started is None:
+            entry["waiting"] = round(now - self.queued, 3)
+        else:
+            entry.update(running=round(now - self.started, 3))
+            if self.monitor is not None:
+                entry.update(pid=self.monitor.pid, peak_rss=self.monitor.peak_rss)
+        return entry
+
+
+class AdmissionController:
+    """
+    Admits tool processes against the host's memory and CPU.
+
+    Each command is charged the memory and CPUs its runner declares
+    (memory_limit, cpus) until running processes of the same tool have been
+    sampled; from then on it is charged what they were seen to use, with
+    headroom. Queued commands are admitted in order while the memory charges
+    of the running ones fit, the host has the memory available and their
+    CPU charges, with the load from other processes, leave some CPU; a
+    command is always admitted when nothing else runs, so one larger than
+    the host still runs, alone.
+    """
+
+    def __init__(self, memory_capacity: Optional[int] = None, cpu_capacity: Optional[float] = None,
+                 max_queue: int = MAX_QUEUE, max_wait: float = MAX_WAIT):
+        self.memory_capacity = memory_capacity or int(host_memory()[0] * MEMORY_FRACTION)
+        self.cpu_capacity = cpu_capacity or (os.cpu_count() or 1) * CPU_FACTOR
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running: list = []
+        self.queue: list = []
+        # tool -> (peak memory, CPU share) seen
+        self.observed: dict = {}
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._waiters: dict = {}
+
+    @property
+    def memory_in_use(self) -> int:
+        return sum(ticket.memory for ticket in self.running)
+
+    @property
+    def cpus_in_use(self) -> float:
+        return sum(ticket.cpus for ticket in self.running)
+
+    def estimate(self, tool: str, declared_memory: int, declared_cpus: float) -> tuple[int, float]:
+        """Memory and CPUs a new command of a tool is charged"""
+        if tool not in self.observed:
+            return declared_memory, declared_cpus
+        memory, cpu_share = self.observed[tool]
+        return (min(declared_memory, max(MIN_MEMORY, int(memory * HEADROOM))),
+                min(declared_cpus, max(MIN_CPUS, cpu_share * HEADROOM)))
+
+    def cpu_available(self) -> float:
+        """CPUs left for tools, after what other processes on the host use"""
+        other = max(0.0, host_load() - self.cpus_in_use)
+        return max(1.0, self.cpu_capacity - other) - self.cpus_in_use
+
+    def fits(self, ticket: Ticket) -> bool:
+        if not self.running:
+            return True
+        if self.memory_in_use + ticket.memory > self.memory_capacity:
+            return False
+        if host_memory()[1] < ticket.memory:
+            return False
+        # CPU is a soft budget: a command starts while any is left, so one
+        # charged a whole CPU is not held back by a few idle long-running ones
+        return self.cpu_available() > 1e-9
+
+    def _wake(self) -> None:
+        for event in self._waiters.values():
+            event.set()
+
+    async def admit(self, tool: str, memory_limit: str, cpus: float) -> Ticket:
+        """
+        Wait until the host can take one more command of a tool
+        Args:
+            tool: Tool name, e.g. 'nmap'
+            memory_limit: Memory the runner declares, e.g. '2g'
+            cpus: CPUs the runner declares
+        Raises:
+            AdmissionError: The queue is full or the command waited longer than max_wait
+        """
+        declared_memory = parse_size(memory_limit)
+        ticket = Ticket(tool, declared_memory, cpus, *self.estimate(tool, declared_memory, cpus))
+        if not self.queue and self.fits(ticket):
+            return self._start(ticket)
+        if len(self.queue) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionError(f"{tool} rejected: {len(self.queue)} commands are already waiting for admission")
+
+        self.queued += 1
+        event = asyncio.Event()
+        self.queue.append(ticket)
+        self._waiters[id(ticket)] = event
+        deadline = ticket.queued + self.max_wait
+        try:
+            with QUEUE_WAIT_SECONDS.time("admission"):
+                while True:
+                    # charges may have changed since the command was queued
+                    ticket.memory, ticket.cpus = self.estimate(tool, declared_memory, cpus)
+                    if self.queue[0] is ticket and self.fits(ticket):
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionError(f"{tool} rejected: no capacity after waiting {self.max_wait:g} seconds")
+                    event.clear()
+                    try:
+                        await asyncio.wait_for(event.wait(), min(remaining, RECHECK_SECONDS))
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self.queue.remove(ticket)
+            del self._waiters[id(ticket)]
+            # the next command in line may fit now
+            self._wake()
+        return self._start(ticket)
+
+    def _start(self, ticket: Ticket) -> Ticket:
+        ticket.started = time.monotonic()
+        self.running.append(ticket)
+        self.admitted += 1
+        return ticket
+
+    def watch(self, ticket: Ticket, monitor: ProcessMonitor) -> None:
+        """Charge a command what its local process is sampled using"""
+        ticket.monitor = monitor
+
+    def _observe(self, ticket: Ticket) -> None:
+        monitor = ticket.monitor
+        elapsed = time.monotonic() - ticket.started
+        if elapsed < SAMPLE_SECONDS or not monitor.peak_rss:
+            return
+        share = monitor.cpu_seconds / elapsed
+        if ticket.tool in self.observed:
+            memory, cpu_share = self.observed[ticket.tool]
+            # go up at once, come down slowly
+            memory = max(monitor.peak_rss, int(DECAY * memory + (1 - DECAY) * monitor.peak_rss))
+            cpu_share = max(share, DECAY * cpu_share + (1 - DECAY) * share)
+        else:
+            memory, cpu_share = monitor.peak_rss, share
+        self.observed[ticket.tool] = (memory, cpu_share)
+
+    def update(self) -> None:
+        """Recharge running commands after their processes were sampled"""
+        lowered = False
+        for ticket in self.running:
+            monitor = ticket.monitor
+            if monitor is None or not monitor.peak_rss:
+                continue
+            elapsed = max(time.monotonic() - ticket.started, SAMPLE_SECONDS)
+            memory = min(ticket.declared_memory, max(MIN_MEMORY, int(monitor.peak_rss * HEADROOM)))
+            cpus = min(ticket.declared_cpus, max(MIN_CPUS, monitor.cpu_seconds / elapsed * HEADROOM))
+            lowered |= memory < ticket.memory or cpus < ticket.cpus
+            # a command growing past its charge holds back new ones until it is charged in full
+            ticket.memory, ticket.cpus = memory, cpus
+            self._observe(ticket)
+        if lowered:
+            self._wake()
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket in self.running:
+            self.running.remove(ticket)
+            if ticket.monitor is not None:
+                self._observe(ticket)
+            self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self.running),
+            "queued": len(self.queue),
+            "admitted": self.admitted,
+            "waited": self.queued,
+            "rejected": self.rejected,
+            "memory_capacity": self.memory_capacity,
+            "memory_in_use": self.memory_in_use,
+            "cpu_capacity": self.cpu_capacity,
+            "cpus_in_use": round(self.cpus_in_use, 3),
+            "load": host_load(),
+        }
+
+    def describe(self) -> dict:
+        """Counters, running and queued commands, and the current estimate per tool"""
+        now = time.monotonic()
+        return {
+            **self.stats(),
+            "memory_available": host_memory()[1],
+            "estimates": {
+                tool: {"memory": int(memory * HEADROOM), "cpus": round(cpu_share * HEADROOM, 3),
+                       "limit": max(1, int(min(self.memory_capacity / max(memory * HEADROOM, MIN_MEMORY),
+                                               self.cpu_capacity / max(cpu_share * HEADROOM, MIN_CPUS))))}
+                for tool, (memory, cpu_share) in sorted(self.observed.items())
+            },
+            "running_commands": [ticket.describe(now) for ticket in self.running],
+            "queued_commands": [ticket.describe(now) for ticket in self.queue],
+        }
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> Optional[AdmissionController]:
+    """Return the process-wide admission controller, or None when KALI_MCPS_ADMISSION=false"""
+    global _admission
+    if _admission is None and ADMISSION:
+        _admission = AdmissionController()
+        get_usage_tracker().add_listener(_admission.update)
+        get_metrics().register_stats("kali_mcps_admission", _admission.stats)
+    return _admission
@@ -0,0 +1,455 @@
+"""
+In-process ELF reader for header, section and symbol queries
+"""
+import os
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from functools import cached_property
+from typing import Optional
+
+# e_type
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+
+# e_machine
+EM_386 = 3
+EM_X86_64 = 62
+
+# sh_type
+SHT_NULL = 0
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+SHT_DYNSYM = 11
+SHT_GROUP = 17
+SHT_SYMTAB_SHNDX = 18
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERNEED = 0x6ffffffe
+SHT_GNU_VERSYM = 0x6fffffff
+
+# sh_flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+SHF_TLS = 0x400
+SHF_EXCLUDE = 0x80000000
+
+# special section indexes
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_ABS = 0xfff1
+SHN_COMMON = 0xfff2
+SHN_XINDEX = 0xffff
+
+# symbol binding and type
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+STB_GNU_UNIQUE = 10
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+STT_FILE = 4
+STT_COMMON = 5
+STT_TLS = 6
+STT_GNU_IFUNC = 10
+
+PT_LOAD = 1
+PT_TLS = 7
+
+# set KALI_MCPS_NATIVE_ELF=false to always run the binutils tools
+NATIVE_ELF = os.environ.get("KALI_MCPS_NATIVE_ELF", "true").lower() == "true"
+
+
+def native_elf() -> bool:
+    """Whether ELF files are parsed in the server; not in safe mode, where untrusted files are only read in the sandbox"""
+    return NATIVE_ELF and os.environ.get("IS_SAFE", "false").lower() != "true"
+
+VER_FLG_BASE = 0x1
+VERSYM_HIDDEN = 0x8000
+VERSYM_VERSION = 0x7fff
+
+
+class ELFFormatError(Exception):
+    """Raised when a file is not an ELF file this reader understands"""
+
+
+@dataclass
+class ElfHeader:
+    elf_class: int
+    endian: str
+    osabi: int
+    type: int
+    machine: int
+    version: int
+    entry: int
+    phoff: int
+    shoff: int
+    flags: int
+    phnum: int
+    shnum: int
+    shstrndx: int
+
+
+@dataclass
+class Segment:
+    type: int
+    flags: int
+    offset: int
+    vaddr: int
+    paddr: int
+    filesz: int
+    memsz: int
+    align: int
+
+
+@dataclass
+class Section:
+    index: int
+    name: str
+    type: int
+    flags: int
+    addr: int
+    offset: int
+    size: int
+    link: int
+    info: int
+    addralign: int
+    entsize: int
+
+
+@dataclass
+class Symbol:
+    index: int
+    name: str
+    value: int
+    size: int
+    bind: int
+    type: int
+    other: int
+    shndx: int
+    section: Optional[str] = None
+    # version suffix nm shows for dynamic symbols, "" when there is none
+    version: Optional[str] = None
+    version_hidden: bool = False
+
+    @property
+    def is_undefined(self) -> bool:
+        return self.shndx == SHN_UNDEF
+
+    @property
+    def is_common(self) -> bool:
+        return self.shndx == SHN_COMMON
+
+    @property
+    def is_absolute(self) -> bool:
+        return self.shndx == SHN_ABS
+
+
+class ELFFile:
+    """
+    Lazily parsed, mmap-backed view of an ELF file.
+
+    Nothing beyond the identification bytes is decoded until a property is
+    first accessed; table entries are unpacked straight from the mapping.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ELFFormatError("file is empty")
+        except OSError as e:
+            raise ELFFormatError(str(e))
+        self._view = memoryview(self._map)
+
+        ident = self._map[:16]
+        if len(ident) < 16 or ident[:4] != b"\x7fELF":
+            self.close()
+            raise ELFFormatError("file format not recognized")
+        if ident[4] not in (1, 2) or ident[5] not in (1, 2):
+            self.close()
+            raise ELFFormatError("unsupported ELF class or data encoding")
+        self.is_64 = ident[4] == 2
+        self.endian = "little" if ident[5] == 1 else "big"
+        self._prefix = "<" if ident[5] == 1 else ">"
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # a table view is still referenced, the mapping goes away with it
+            pass
+
+    def _unpack(self, fmt: str, offset: int) -> tuple:
+        try:
+            return struct.unpack_from(self._prefix + fmt, self._map, offset)
+        except struct.error:
+            raise ELFFormatError(f"truncated file at offset {offset:#x}")
+
+    def _iter_table(self, fmt: str, offset: int, count: int, entsize: int):
+        fmt = self._prefix + fmt
+        size = struct.calcsize(fmt)
+        if entsize != size:
+            raise ELFFormatError(f"unexpected table entry size {entsize}")
+        end = offset + count * size
+        if offset < 0 or end > len(self._map):
+            raise ELFFormatError(f"table at {offset:#x} runs past end of file")
+        return struct.iter_unpack(fmt, self._view[offset:end])
+
+    def _cstring(self, offset: int) -> str:
+        end = self._map.find(b"\0", offset)
+        if offset >= len(self._map) or end < 0:
+            raise ELFFormatError(f"bad string offset {offset:#x}")
+        return self._map[offset:end].decode("utf-8", errors="surrogateescape")
+
+    def _string_at(self, table: Section, offset: int) -> str:
+        if offset >= table.size:
+            raise ELFFormatError(f"string offset {offset:#x} outside {table.name or 'string table'}")
+        return self._cstring(table.offset + offset)
+
+    @cached_property
+    def header(self) -> ElfHeader:
+        fmt = "HHIQQQIHHHHHH" if self.is_64 else "HHIIIIIHHHHHH"
+        (e_type, machine, version, entry, phoff, shoff, flags,
+         _, _, phnum, _, shnum, shstrndx) = self._unpack(fmt, 16)
+        return ElfHeader(
+            elf_class=64 if self.is_64 else 32, endian=self.endian, osabi=self._map[7],
+            type=e_type, machine=machine, version=version, entry=entry, phoff=phoff,
+            shoff=shoff, flags=flags, phnum=phnum, shnum=shnum, shstrndx=shstrndx,
+        )
+
+    @cached_property
+    def segments(self) -> list[Segment]:
+        hdr = self.header
+        if not hdr.phoff:
+            return []
+        segments = []
+        if self.is_64:
+            entries = self._iter_table("IIQQQQQQ", hdr.phoff, hdr.phnum, 56)
+            for p_type, p_flags, offset, vaddr, paddr, filesz, memsz, align in entries:
+                segments.append(Segment(p_type, p_flags, offset, vaddr, paddr, filesz, memsz, align))
+        else:
+            entries = self._iter_table("IIIIIIII", hdr.phoff, hdr.phnum, 32)
+            for p_type, offset, vaddr, paddr, filesz, memsz, p_flags, align in entries:
+                segments.append(Segment(p_type, p_flags, offset, vaddr, paddr, filesz, memsz, align))
+        return segments
+
+    @cached_property
+    def sections(self) -> list[Section]:
+        hdr = self.header
+        if not hdr.shoff:
+            return []
+        fmt, entsize = ("IIQQQQIIQQ", 64) if self.is_64 else ("IIIIIIIIII", 40)
+        shnum, shstrndx = hdr.shnum, hdr.shstrndx
+        if shnum == 0 or shstrndx == SHN_XINDEX:
+            # extended numbering lives in the first section header
+            first = self._unpack(fmt, hdr.shoff)
+            shnum = shnum or first[5]
+            if shstrndx == SHN_XINDEX:
+                shstrndx = first[6]
+
+        entries = list(self._iter_table(fmt, hdr.shoff, shnum, entsize))
+        names = entries[shstrndx] if 0 < shstrndx < len(entries) else None
+        sections = []
+        for index, (sh_name, *fields) in enumerate(entries):
+            name = ""
+            if names is not None and sh_name:
+                if sh_name >= names[5]:
+                    raise ELFFormatError(f"section name offset {sh_name:#x} out of range")
+                name = self._cstring(names[4] + sh_name)
+            sections.append(Section(index, name, *fields))
+        return sections
+
+    def section_by_name(self, name: str) -> Optional[Section]:
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def _section_of(self, shndx: int) -> Optional[str]:
+        if shndx == SHN_UNDEF:
+            return "*UND*"
+        if shndx == SHN_ABS:
+            return "*ABS*"
+        if shndx == SHN_COMMON:
+            return "*COM*"
+        if shndx >= SHN_LORESERVE:
+            raise ELFFormatError(f"unsupported special section index {shndx:#x}")
+        if shndx >= len(self.sections):
+            raise ELFFormatError(f"symbol refers to missing section {shndx}")
+        return self.sections[shndx].name
+
+    def _read_symbols(self, table: Optional[Section]) -> list[Symbol]:
+        if table is None or table.size == 0:
+            return []
+        if table.link >= len(self.sections):
+            raise ELFFormatError("symbol table has no string table")
+        strtab = self.sections[table.link]
+        if self.is_64:
+            fmt, entsize = "IBBHQQ", 24
+        else:
+            fmt, entsize = "IIIBBH", 16
+        count = table.size // entsize
+        symbols = []
+        for index, entry in enumerate(self._iter_table(fmt, table.offset, count, table.entsize or entsize)):
+            if index == 0:
+                continue
+            if self.is_64:
+                st_name, st_info, st_other, st_shndx, st_value, st_size = entry
+            else:
+                st_name, st_value, st_size, st_info, st_other, st_shndx = entry
+            if st_shndx == SHN_XINDEX:
+                raise ELFFormatError("extended section indexes are not supported")
+            section = self._section_of(st_shndx)
+            sym_type = st_info & 0xf
+            name = self._string_at(strtab, st_name) if st_name else ""
+            if sym_type == STT_SECTION and not name:
+                name = section
+            symbols.append(Symbol(
+                index=index, name=name, value=st_value, size=st_size, bind=st_info >> 4,
+                type=sym_type, other=st_other, shndx=st_shndx, section=section,
+            ))
+        return symbols
+
+    @cached_property
+    def symbols(self) -> list[Symbol]:
+        """Entries of .symtab, without the null symbol"""
+        table = next((s for s in self.sections if s.type == SHT_SYMTAB), None)
+        return self._read_symbols(table)
+
+    @cached_property
+    def dynamic_symbols(self) -> list[Symbol]:
+        """Entries of .dynsym with their symbol versions resolved"""
+        table = next((s for s in self.sections if s.type == SHT_DYNSYM), None)
+        symbols = self._read_symbols(table)
+        versym = next((s for s in self.sections if s.type == SHT_GNU_VERSYM), None)
+        if versym is None or not symbols:
+            return symbols
+        definitions, requirements = self._version_names()
+        if not definitions and not requirements:
+            return symbols
+
+        entries = list(self._iter_table("H", versym.offset, versym.size // 2, 2))
+        for symbol in symbols:
+            if symbol.index >= len(entries):
+                break
+            raw = entries[symbol.index][0]
+            number = raw & VERSYM_VERSION
+            symbol.version_hidden = bool(raw & VERSYM_HIDDEN)
+            if number == 0:
+                symbol.version = ""
+            elif number == 1 and (number not in definitions or definitions[number][1]):
+                # the base definition names the object itself, nothing to show
+                symbol.version = ""
+            elif number in definitions:
+                name = definitions[number][0]
+                symbol.version = "" if name == symbol.name else name
+            elif number in requirements:
+                symbol.version = requirements[number]
+                symbol.version_hidden = True
+            else:
+                symbol.version = "<corrupt>"
+        return symbols
+
+    def _version_names(self) -> tuple[dict, dict]:
+        """Return ({index: (name, is_base)}, {index: name}) from verdef/verneed"""
+        definitions = {}
+        requirements = {}
+        for section in self.sections:
+            if section.type not in (SHT_GNU_VERDEF, SHT_GNU_VERNEED):
+                continue
+            if section.link >= len(self.sections):
+                raise ELFFormatError("version section has no string table")
+            strtab = self.sections[section.link]
+            offset = section.offset
+            for _ in range(section.info):
+                if section.type == SHT_GNU_VERDEF:
+                    _, vd_flags, vd_ndx, vd_cnt, _, vd_aux, vd_next = self._unpack("HHHHIII", offset)
+                    if vd_cnt:
+                        vda_name, _ = self._unpack("II", offset + vd_aux)
+                        definitions[vd_ndx] = (self._string_at(strtab, vda_name), bool(vd_flags & VER_FLG_BASE))
+                    next_offset = vd_next
+                else:
+                    _, vn_cnt, _, vn_aux, vn_next = self._unpack("HHIII", offset)
+                    aux = offset + vn_aux
+                    for _ in range(vn_cnt):
+                        _, _, vna_other, vna_name, vna_next = self._unpack("IHHII", aux)
+                        requirements[vna_other] = self._string_at(strtab, vna_name)
+                        if not vna_next:
+                            break
+                        aux += vna_next
+                    next_offset = vn_next
+                if not next_offset:
+                    break
+                offset += next_offset
+        return definitions, requirements
+
+    def to_dict(self, include_symbols: bool = False) -> dict:
+        """Return the parsed header and sections (and optionally symbols) as plain data"""
+        result = {
+            "header": asdict(self.header),
+            "segments": [asdict(segment) for segment in self.segments],
+            "sections": [asdict(section) for section in self.sections],
+        }
+        if include_symbols:
+            result["symbols"] = [asdict(symbol) for symbol in self.symbols]
+            result["dynamic_symbols"] = [asdict(symbol) for symbol in self.dynamic_symbols]
+        return result
+
+
+_open_files: OrderedDict = OrderedDict()
+_open_files_lock = threading.Lock()
+OPEN_FILES_MAX = 32
+
+
+def open_elf(path: str) -> ELFFile:
+    """
+    Return a parsed ELFFile for path, reusing the previous instance while the
+    file is unchanged so repeat queries skip parsing entirely
+    """
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise ELFFormatError(str(e))
+    key = (os.path.abspath(path), st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _open_files_lock:
+        elf = _open_files.get(key)
+        if elf is not None:
+            _open_files.move_to_end(key)
+            return elf
+
+    elf = ELFFile(path)
+    with _open_files_lock:
+        _open_files[key] = elf
+        while len(_open_files) > OPEN_FILES_MAX:
+            # other threads may still be reading it, the mapping is released with the object
+            _open_files.popitem(last=False)
+    return elf
+
+def try_native(render, target: str, **options) -> Optional[tuple[str, str]]:
+    """
+    Run a renderer against the parsed file
+    Args:
+        render: Function taking (ELFFile, target, **options) and returning (stdout, stderr)
+        target: Path of the file to analyze
+    Returns:
+        The rendered result, or None if the caller should fall back to the tool
+    """
+    if not native_elf():
+        return None
+    try:
+        return render(open_elf(target), target, **options)
+    except ELFFormatError:
+        return None
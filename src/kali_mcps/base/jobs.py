@@ -0,0 +1,338 @@
+"""
+Background jobs: run actions on a bounded, prioritized worker pool and poll for results
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import inspect
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+from src.kali_mcps.base.kali_command import OutputCollector
+from src.kali_mcps.base.spool import run_budgeted
+from src.metrics import get_metrics, QUEUE_WAIT_SECONDS
+
+JOB_DB = os.environ.get(
+    "KALI_MCPS_JOB_DB", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "jobs.sqlite3")
+)
+# partial output kept per job, the final result is stored separately
+JOB_OUTPUT_BYTES = 1024 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    output TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs(state, priority, created);
+"""
+
+
+@dataclass
+class JobAction:
+    """An action that can be submitted as a job"""
+    function: Callable[..., Awaitable[Any]]
+    priority: int
+
+    @property
+    def streams(self) -> bool:
+        """Whether the action takes an on_output callback for partial output"""
+        # read on use, so registering a lazily imported action does not import it
+        return "on_output" in inspect.signature(self.function).parameters
+
+
+@dataclass
+class Job:
+    id: str
+    action: str
+    params: dict
+    priority: int
+    state: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    output: OutputCollector = field(default_factory=lambda: OutputCollector(JOB_OUTPUT_BYTES))
+    task: Optional[asyncio.Task] = None
+
+    def status(self) -> dict:
+        now = self.finished or time.time()
+        return {
+            "job_id": self.id,
+            "action": self.action,
+            "state": self.state,
+            "priority": self.priority,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "runtime": round(now - self.started, 3) if self.started else None,
+            "output_bytes": self.output.kept + self.output.dropped,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Prioritized job queue with a fixed number of workers.
+
+    Lower priority values run first; jobs of equal priority run in
+    submission order. Jobs are persisted in SQLite, so queued jobs (and
+    jobs interrupted while running) are picked up again after a restart.
+    """
+
+    def __init__(self, workers: int = 4, db_path: str = JOB_DB, keep_finished: int = 1000):
+        """
+        Initialize JobQueue
+        Args:
+            workers: Number of jobs running at once
+            db_path: SQLite file persisting the jobs
+            keep_finished: Finished jobs kept in the database
+        """
+        self.workers = workers
+        self.db_path = db_path
+        self.keep_finished = keep_finished
+        self.actions: dict[str, JobAction] = {}
+        self.jobs: dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._sequence = 0
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def register(self, name: str, function: Callable[..., Awaitable[Any]], priority: int = 5) -> None:
+        """
+        Make an action available to submit()
+        Args:
+            name: Name used to submit the action
+            function: Async action function
+            priority: Default priority, lower runs first
+        """
+        self.actions[name] = JobAction(function, priority)
+
+    def _save(self, job: Job) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO jobs (id, action, params, priority, state, created, started, finished, "
+                "output, result, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.action, json.dumps(job.params), job.priority, job.state, job.created,
+                 job.started, job.finished,
+                 job.output.text() if job.state in FINISHED_STATES else None,
+                 json.dumps(job.result) if job.state == DONE else None, job.error),
+            )
+
+    def _enqueue(self, job: Job) -> None:
+        self._sequence += 1
+        self._queue.put_nowait((job.priority, self._sequence, job.id))
+
+    async def start(self) -> None:
+        """Start the workers and requeue jobs left over from a previous run"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        rows = self.db.execute(
+            "SELECT id, action, params, priority, created FROM jobs WHERE state IN (?, ?) "
+            "ORDER BY priority, created",
+            (QUEUED, RUNNING),
+        ).fetchall()
+        for job_id, action, params, priority, created in rows:
+            job = Job(id=job_id, action=action, params=json.loads(params), priority=priority, created=created)
+            self.jobs[job.id] = job
+            if action not in self.actions:
+                job.state, job.error, job.finished = FAILED, f"unknown action {action!r}", time.time()
+                self._save(job)
+                continue
+            self._save(job)
+            self._enqueue(job)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs stay 'running' in the database and are rerun on start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def submit(self, action: str, params: Optional[dict] = None, priority: Optional[int] = None) -> Job:
+        """
+        Queue an action
+        Args:
+            action: Name of a registered action
+            params: Keyword arguments for the action
+            priority: Overrides the action's default priority, lower runs first
+        """
+        if action not in self.actions:
+            raise ValueError(f"unknown action {action!r}, expected one of {', '.join(sorted(self.actions))}")
+        await self.start()
+        params = params or {}
+        signature = inspect.signature(self.actions[action].function)
+        try:
+            signature.bind(**params)
+        except TypeError as e:
+            raise ValueError(f"invalid parameters for {action}: {e}")
+        job = Job(id=uuid.uuid4().hex[:12], action=action, params=params,
+                  priority=self.actions[action].priority if priority is None else priority)
+        self.jobs[job.id] = job
+        self._save(job)
+        self._enqueue(job)
+        self._prune()
+        return job
+
+    async def _work(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.state != QUEUED:
+                continue
+            job.task = asyncio.create_task(self._run(job))
+            try:
+                # shielded so stopping the worker is never mistaken for cancelling the job
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+                raise
+            finally:
+                job.task = None
+
+    async def _run(self, job: Job) -> None:
+        action = self.actions[job.action]
+        job.state, job.started = RUNNING, time.time()
+        QUEUE_WAIT_SECONDS.observe(job.started - job.created, "jobs")
+        self._save(job)
+        params = dict(job.params)
+        if action.streams:
+            async def collect(chunk: str):
+                job.output.add(chunk)
+            params["on_output"] = collect
+        structured = []
+
+        async def run(_) -> tuple[str, str]:
+            result = await action.function(**params)
+            if isinstance(result, tuple):
+                return result
+            structured.append(result)
+            # structured results are budgeted by their JSON text
+            return json.dumps(result), ""
+
+        try:
+            # results over the output budget are stored and returned as a digest with a spool handle
+            result = await run_budgeted(job.action, run)
+            if isinstance(result, tuple):
+                result = structured[0] if structured else list(result)
+            job.result = result
+            job.state = DONE
+        except asyncio.CancelledError:
+            if job.state != CANCELLED:
+                # the worker is shutting down, leave the job to be rerun
+                raise
+        except Exception as e:
+            job.state, job.error = FAILED, f"{type(e).__name__}: {e}"
+        job.finished = time.time()
+        self._save(job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look a job up in memory, then in the database"""
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        row = self.db.execute(
+            "SELECT action, params, priority, state, created, started, finished, output, result, error "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        action, params, priority, state, created, started, finished, output, result, error = row
+        job = Job(id=job_id, action=action, params=json.loads(params), priority=priority, state=state,
+                  created=created, started=started, finished=finished, error=error,
+                  result=json.loads(result) if result else None)
+        job.output.add(output or "")
+        return job
+
+    def result(self, job_id: str, offset: int = 0) -> Optional[dict]:
+        """
+        Status plus partial output from offset, and the result once the job is done
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        output = job.output.text()
+        response = job.status()
+        response["output"] = output[offset:]
+        response["next_offset"] = len(output)
+        if job.state == DONE:
+            response["result"] = job.result
+        return response
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; running tools are killed"""
+        job = self.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return job
+        job.state, job.finished = CANCELLED, time.time()
+        if job.task is not None:
+            job.task.cancel()
+        self._save(job)
+        return job
+
+    def list(self, state: Optional[str] = None, limit: int = 50) -> list[dict]:
+        """Jobs known to this process, newest first"""
+        jobs = [job for job in self.jobs.values() if state is None or job.state == state]
+        jobs.sort(key=lambda job: job.created, reverse=True)
+        return [job.status() for job in jobs[:limit]]
+
+    def stats(self) -> dict:
+        """Return the number of jobs known to this process by state"""
+        counts = {state: 0 for state in (QUEUED, RUNNING, *FINISHED_STATES)}
+        for job in self.jobs.values():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return {"workers": self.workers, "jobs": counts}
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond keep_finished"""
+        finished = sorted((job for job in self.jobs.values() if job.state in FINISHED_STATES),
+                          key=lambda job: job.finished or 0)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job.id]
+        with self.db:
+            self.db.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE state IN (?, ?, ?) "
+                "ORDER BY finished DESC LIMIT -1 OFFSET ?)",
+                (*FINISHED_STATES, self.keep_finished),
+            )
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(workers=int(os.environ.get("KALI_MCPS_JOB_WORKERS", "4")))
+        get_metrics().register_stats("kali_mcps_job_queue", _job_queue.stats)
+    return _job_queue
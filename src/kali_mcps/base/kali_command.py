@@ -1,10 +1,126 @@
-import subprocess
 import os
+import time
 import asyncio
-from src.sandbox import create_sandbox_client, SandboxSettings, SandboxTimeoutError, SandboxError
+import codecs
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from src.sandbox import get_container_pool, shared_path, PooledContainer, SandboxSettings, SandboxTimeoutError, SandboxError
+from src.kali_mcps.base.result_cache import get_result_cache
+from src.kali_mcps.base.single_flight import get_single_flight, flight_key
+from src.kali_mcps.base.remote import RemoteProcess, get_remote_executor
+from src.kali_mcps.base.admission import AdmissionError, get_admission, parse_size
+from src.kali_mcps.base.usage import RLIMITS, get_usage_tracker, kill_group, child_limits
+from src.metrics import METRICS_ENABLED, PHASE_SECONDS, BYTES_IN, BYTES_OUT, CALLS, PROCESSES_RUNNING
+
+# how much output a single call keeps in memory, the rest is only streamed
+MAX_OUTPUT_BYTES = int(os.environ.get("KALI_MCPS_MAX_OUTPUT_BYTES", str(16 * 1024 * 1024)))
+STREAM_CHUNK_SIZE = 64 * 1024
+# multiplies every runner's timeout; 0 turns timeouts off
+TIMEOUT_SCALE = float(os.environ.get("KALI_MCPS_TIMEOUT_SCALE", "1"))
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
+
+class OutputCollector:
+    """Accumulate streamed output up to a byte cap"""
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES):
+        self.max_bytes = max_bytes
+        self.kept = 0
+        self.dropped = 0
+        self._chunks = []
+
+    def add(self, chunk: str) -> None:
+        size = len(chunk.encode("utf-8"))
+        room = self.max_bytes - self.kept
+        if size <= room:
+            self._chunks.append(chunk)
+            self.kept += size
+            return
+        if room > 0:
+            # cut on a character boundary, may drop a partial code point
+            head = chunk.encode("utf-8")[:room].decode("utf-8", errors="ignore")
+            self._chunks.append(head)
+            self.kept += room
+            size -= room
+        self.dropped += size
+
+    def text(self) -> str:
+        output = "".join(self._chunks)
+        if self.dropped:
+            output += f"\n[output truncated: {self.dropped} bytes omitted]\n"
+        return output
+
+
+async def iter_decoded(chunks: AsyncIterator[bytes], chunk_size: int = STREAM_CHUNK_SIZE,
+                       tool: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Decode a byte stream into text chunks that end on a line boundary where possible
+    When tool is given, decoding time and output bytes are recorded under that tool.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    measure = METRICS_ENABLED and tool is not None
+    decoding = 0.0
+    received = 0
+    pending = ""
+    async for data in chunks:
+        if measure:
+            started = time.perf_counter()
+            pending += decoder.decode(data)
+            decoding += time.perf_counter() - started
+            received += len(data)
+        else:
+            pending += decoder.decode(data)
+        cut = pending.rfind("\n") + 1
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+        elif len(pending) >= chunk_size:
+            yield pending
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if measure:
+        PHASE_SECONDS.observe(decoding, tool, "decode")
+        BYTES_OUT.inc(tool, amount=received)
+    if pending:
+        yield pending
+
+
+async def iter_until(chunks: AsyncIterator, seconds: Optional[float]) -> AsyncIterator:
+    """
+    Pass chunks through until seconds have passed
+    Raises:
+        SandboxTimeoutError: The stream did not end in time
+    """
+    iterator = chunks.__aiter__()
+    end = None if seconds is None else time.monotonic() + seconds
+    while True:
+        try:
+            if end is None:
+                chunk = await iterator.__anext__()
+            else:
+                chunk = await asyncio.wait_for(iterator.__anext__(), max(end - time.monotonic(), 0))
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise SandboxTimeoutError(f"timed out after {seconds:g} seconds")
+        yield chunk
+
 
 class CommandRunner:
     """Base class for executing Kali commands"""
+
+    max_output_bytes = MAX_OUTPUT_BYTES
+    sandbox_image = "kalilinux/kali-rolling"
+    # subclasses whose output depends only on the input file and flags set this
+    cacheable = False
+    # output that depends on the network is cached without input files, for this many seconds
+    cache_max_age: Optional[float] = None
+    # identical concurrent calls share one process unless a subclass opts out
+    coalesce = True
+    # network tools set this to run on the worker agents in KALI_MCPS_REMOTE_WORKERS, if any
+    remote = False
+    # CPUs one process may use, charged by admission control until its real use is known
+    cpus = 1.0
     
     def __init__(self, command_name: str, network_enabled: bool = False, 
                  memory_limit: str = "1g", timeout: int = 120):
@@ -13,70 +129,288 @@ class CommandRunner:
         Args:
             command_name: Name of the command (e.g. 'objdump', 'nm', etc.)
             network_enabled: Whether network access is needed
-            memory_limit: Memory limit for sandbox
-            timeout: Timeout in seconds
+            memory_limit: Memory limit for sandbox, and the memory admission control charges the process
+            timeout: Timeout in seconds; the process is killed when it runs longer (0: no limit)
         """
         self.command_name = command_name
         self.network_enabled = network_enabled
         self.memory_limit = memory_limit
         self.timeout = timeout
         self.IS_SAFE = os.environ.get("IS_SAFE", "false").lower() == "true"
+        self.use_cache = os.environ.get("KALI_MCPS_CACHE", "true").lower() == "true"
+        self.use_coalescing = os.environ.get("KALI_MCPS_COALESCE", "true").lower() == "true"
+        # set once a run finished and its whole output was kept
+        self.complete = False
+        # set when the last result came from the result cache
+        self.cached = False
+        # set when the last run was killed for its timeout; the exit code of the last
+        # direct or remote run (None in the sandbox, whose exit code is not reported)
+        self.timed_out = False
+        self.returncode: Optional[int] = None
+        # rlimits of the last direct process and the resources it used, see UsageTracker.finish
+        self.limits: dict = {}
+        self.usage: Optional[dict] = None
 
-    def run_command(self, command: list) -> tuple[str, str]:
-        """Execute command and return output results"""
-        try:
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
+    def deadline(self) -> Optional[float]:
+        """Seconds a process may run, or None for no limit"""
+        if not self.timeout or TIMEOUT_SCALE <= 0:
+            return None
+        return self.timeout * TIMEOUT_SCALE
+
+    async def admit(self):
+        """
+        Wait for admission control to let one more process of this tool start
+        Returns:
+            The admission ticket to release afterwards, or None when the
+            process is not admitted locally (no controller, remote workers)
+        """
+        admission = get_admission()
+        if admission is None or (self.remote and not self.IS_SAFE and get_remote_executor() is not None):
+            return None
+        return await admission.admit(self.command_name, self.memory_limit, self.cpus)
+
+    async def spawn(self, command: list):
+        """
+        Start command on the executor chosen for this runner
+        A local process leads its own process group, so it can be killed
+        with everything it started, and gets the runner's CPU time and
+        memory as rlimits unless KALI_MCPS_RLIMITS=false.
+        Returns:
+            An asyncio.subprocess.Process, or a RemoteProcess with the same
+            stdout/stderr readers, returncode, wait(), send_signal() and kill()
+        """
+        executor = get_remote_executor() if self.remote else None
+        if executor is not None:
+            return await executor.spawn(command)
+        preexec, self.limits = None, {}
+        if RLIMITS:
+            deadline = self.deadline()
+            preexec, self.limits = child_limits(
+                deadline * max(1.0, self.cpus) if deadline else None, parse_size(self.memory_limit)
             )
-            stdout, stderr = process.communicate()
-            return stdout, stderr
+        return await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            preexec_fn=preexec
+        )
+
+    def kill(self, process) -> None:
+        """Kill a process that has not been waited for, and the processes it started"""
+        if isinstance(process, RemoteProcess):
+            process.kill()
+        else:
+            kill_group(process.pid)
+
+    async def stream_command(self, command: list, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[str]:
+        """
+        Execute command and yield stdout in line-aligned chunks while it runs
+        Args:
+            command: Command to execute
+            chunk_size: Maximum number of bytes read from the pipe at once
+        While it runs the process is available as self.process, e.g. to
+        signal it. After the generator is exhausted, stderr and the exit
+        code are available as self.stderr and self.returncode. The process
+        starts once admission control admits it and is killed after the
+        runner's timeout.
+        """
+        self.stderr = ""
+        self.returncode = None
+        self.timed_out = False
+        self.usage = None
+        ticket = await self.admit()
+        try:
+            with PHASE_SECONDS.time(self.command_name, "spawn"):
+                process = await self.spawn(command)
+        except BaseException:
+            if ticket is not None:
+                get_admission().release(ticket)
+            raise
+        self.process = process
+        mode = "remote" if isinstance(process, RemoteProcess) else "direct"
+        monitor = None
+        if mode == "direct":
+            monitor = get_usage_tracker().start(self.command_name, process.pid, self.limits)
+            if ticket is not None:
+                get_admission().watch(ticket, monitor)
+        started = time.perf_counter()
+        PROCESSES_RUNNING.inc(self.command_name, mode)
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+
+        def expire():
+            if process.returncode is None:
+                self.timed_out = True
+                self.kill(process)
+
+        deadline = self.deadline()
+        timer = asyncio.get_running_loop().call_later(deadline, expire) if deadline else None
+
+        async def read_stdout():
+            while True:
+                data = await process.stdout.read(chunk_size)
+                if not data:
+                    return
+                yield data
+
+        try:
+            async for chunk in iter_decoded(read_stdout(), chunk_size, self.command_name):
+                yield chunk
+            self.stderr = (await stderr_task).decode("utf-8", errors="replace")
+            if monitor is not None:
+                # the last look before the exited process is waited for
+                monitor.sample()
+            self.returncode = await process.wait()
+            if self.timed_out:
+                self.stderr += f"\n{self.command_name} killed after the {deadline:g} second timeout\n"
+        finally:
+            if timer is not None:
+                timer.cancel()
+            # the caller went away, don't leave the tool running
+            cancelled = process.returncode is None
+            if cancelled:
+                self.kill(process)
+                await process.wait()
+            if not stderr_task.done():
+                stderr_task.cancel()
+            if monitor is not None:
+                killed = "timeout" if self.timed_out else "cancelled" if cancelled else None
+                self.usage = get_usage_tracker().finish(monitor, process.returncode, killed)
+                if self.usage["killed"] == "cpu_limit":
+                    self.stderr += (f"\n{self.command_name} killed after using its CPU time limit of "
+                                    f"{self.limits['cpu']} seconds\n")
+            if ticket is not None:
+                get_admission().release(ticket)
+            PROCESSES_RUNNING.dec(self.command_name, mode)
+            PHASE_SECONDS.observe(time.perf_counter() - started, self.command_name, "run")
+
+    async def run_command(self, command: list, on_output: Optional[OutputCallback] = None,
+                          max_output_bytes: Optional[int] = None) -> tuple[str, str]:
+        """
+        Execute command without blocking the event loop and return output results
+        Args:
+            command: Command to execute
+            on_output: Coroutine called with each chunk of stdout as it arrives
+            max_output_bytes: Cap on stdout kept in memory (default: max_output_bytes)
+        """
+        self.complete = False
+        collector = OutputCollector(max_output_bytes or self.max_output_bytes)
+        try:
+            async for chunk in self.stream_command(command):
+                collector.add(chunk)
+                if on_output:
+                    await on_output(chunk)
         except Exception as e:
-            return "", str(e)
+            return collector.text(), str(e)
+        self.complete = not collector.dropped and not self.timed_out
+        return collector.text(), self.stderr
 
-    async def run_with_sandbox(self, command: list, input_files: dict = None) -> tuple[str, str]:
+    def stage_input_files(self, command: list, scratch_dir: str) -> tuple[list, dict]:
         """
-        Execute command in Kali sandbox
+        Map local files referenced in the command into the sandbox scratch directory
+        Files under the read-only shared directory are referenced through its mount instead of being copied.
         Args:
             command: Command to execute
-            input_files: Dict of {local_path: container_path} for files to copy into container
+            scratch_dir: Directory inside the container holding input files
+        Returns:
+            The rewritten command and a {local_path: container_path} dict of files to copy
         """
-        kali_config = SandboxSettings(
-            image="kalilinux/kali-rolling",
+        staged_command = []
+        input_files = {}
+        for index, arg in enumerate(command):
+            if index > 0 and os.path.isfile(arg):
+                mounted = shared_path(arg)
+                if mounted is not None:
+                    staged_command.append(mounted)
+                    continue
+                container_path = f"{scratch_dir}/{len(input_files)}_{os.path.basename(arg)}"
+                input_files[arg] = container_path
+                arg = container_path
+            staged_command.append(arg)
+        return staged_command, input_files
+
+    def sandbox_settings(self) -> SandboxSettings:
+        """Sandbox configuration for this command"""
+        return SandboxSettings(
+            image=self.sandbox_image,
             memory_limit=self.memory_limit,
-            cpu_limit=1.0,
+            cpu_limit=self.cpus,
             network_enabled=self.network_enabled,
             timeout=self.timeout
         )
-        client = create_sandbox_client()
+
+    async def run_with_sandbox(self, command: list, input_files: dict = None,
+                               on_output: Optional[OutputCallback] = None,
+                               pooled: Optional[PooledContainer] = None) -> tuple[str, str]:
+        """
+        Execute command in Kali sandbox
+        Args:
+            command: Command to execute
+            input_files: Dict of {local_path: container_path} for files to copy into container
+            on_output: Coroutine called with each chunk of output as it arrives
+            pooled: Container the caller checked out and returns itself, e.g. for a batch of commands
+        """
+        self.complete = False
+        self.timed_out = False
+        self.returncode = None
         try:
-            await client.create(config=kali_config)
-            
+            ticket = await self.admit()
+        except AdmissionError as e:
+            return "", str(e)
+        pool = get_container_pool()
+        owned = pooled is None
+        healthy = True
+        collector = OutputCollector(self.max_output_bytes)
+        try:
+            if owned:
+                pooled = await pool.checkout(self.sandbox_settings())
             # 如果有输入文件，先复制到容器中
             if input_files:
-                for local_path, container_path in input_files.items():
-                    await client.copy_to_container(local_path, container_path)
+                await pool.upload(pooled, input_files)
             
             # 执行命令
-            cmd_str = " ".join(command)
-            stdout = await client.run_command(cmd_str)
-            return stdout, ""
+            status = {"stderr": [], "exit_code": None}
+            PROCESSES_RUNNING.inc(self.command_name, "sandbox")
+            try:
+                with PHASE_SECONDS.time(self.command_name, "exec"):
+                    # the argument list goes to the container as is, without a shell splitting it again
+                    chunks = iter_until(pooled.client.stream_command(list(command), status), self.deadline())
+                    async for chunk in iter_decoded(chunks, tool=self.command_name):
+                        collector.add(chunk)
+                        if on_output:
+                            await on_output(chunk)
+            finally:
+                PROCESSES_RUNNING.dec(self.command_name, "sandbox")
+            self.complete = not collector.dropped
+            self.returncode = status["exit_code"]
+            return collector.text(), b"".join(status["stderr"]).decode("utf-8", errors="replace")
+        except SandboxTimeoutError as e:
+            # retiring the container stops the command still running in it
+            healthy = False
+            self.timed_out = True
+            return collector.text(), f"{self.command_name} {e}"
+        except SandboxError as e:
+            healthy = False
+            return "", str(e)
         except Exception as e:
             return "", str(e)
         finally:
-            await client.cleanup()
+            if owned and pooled is not None:
+                await pool.checkin(pooled, healthy=healthy)
+            if ticket is not None:
+                get_admission().release(ticket)
 
-    async def safe_execute_kali_command(self, command: list, input_files: dict = None) -> tuple[str, str]:
+    async def safe_execute_kali_command(self, command: list, input_files: dict = None,
+                                        on_output: Optional[OutputCallback] = None) -> tuple[str, str]:
         """
         Safely execute Kali command
         Args:
             command: Command to execute
             input_files: Dict of {local_path: container_path} for files to copy into container
+            on_output: Coroutine called with each chunk of output as it arrives
         """
         try:
-            result = await self.run_with_sandbox(command, input_files)
+            result = await self.run_with_sandbox(command, input_files, on_output)
             return result
         except SandboxTimeoutError:
             return "", "Command execution timed out"
@@ -85,14 +419,59 @@ class CommandRunner:
         except Exception as e:
             return "", f"Unknown error: {str(e)}"
 
-    def execute(self, command: list, input_files: dict = None) -> tuple[str, str]:
+    async def execute(self, command: list, input_files: dict = None,
+                      on_output: Optional[OutputCallback] = None,
+                      use_cache: bool = True) -> tuple[str, str]:
         """
         Execute command with safety check
         Args:
             command: Command to execute
             input_files: Dict of {local_path: container_path} for files to copy into container
+            on_output: Coroutine called with each chunk of output as it arrives
+            use_cache: Reuse and store results in the result cache (cacheable runners only)
         """
-        # if self.IS_SAFE:
-        #     return await self.safe_execute_kali_command(command, input_files)
-        # else:
-        return self.run_command(command)  
\ No newline at end of file
+        cache_key = None
+        if self.cacheable and use_cache and self.use_cache and input_files is None:
+            cache = get_result_cache()
+            mode = f"sandbox:{self.sandbox_image}" if self.IS_SAFE else "direct"
+            with PHASE_SECONDS.time(self.command_name, "cache_lookup"):
+                cache_key = await cache.key_for(command, mode, require_files=self.cache_max_age is None)
+                cached = await cache.get(cache_key, self.cache_max_age) if cache_key else None
+            if cached is not None:
+                self.cached = True
+                CALLS.inc(self.command_name, "cache_hit")
+                if on_output and cached[0]:
+                    await on_output(cached[0])
+                return cached
+
+        async def run(publish: Optional[OutputCallback]) -> tuple[tuple[str, str], bool]:
+            if METRICS_ENABLED:
+                BYTES_IN.inc(self.command_name, amount=sum(
+                    os.path.getsize(arg) for arg in [*command[1:], *(input_files or {})] if os.path.isfile(arg)
+                ))
+            staged_command, staged_files = command, input_files
+            if self.IS_SAFE:
+                if staged_files is None:
+                    staged_command, staged_files = self.stage_input_files(
+                        command, get_container_pool().scratch_dir
+                    )
+                result = await self.safe_execute_kali_command(staged_command, staged_files, publish)
+            else:
+                result = await self.run_command(staged_command, publish)
+            if cache_key and self.complete:
+                await get_result_cache().put(cache_key, result)
+            return result, self.complete
+
+        with PHASE_SECONDS.time(self.command_name, "total"):
+            if not (self.coalesce and self.use_coalescing):
+                CALLS.inc(self.command_name, "executed")
+                result, _ = await run(on_output)
+                return result
+
+            mode = (f"sandbox:{self.sandbox_image}:{self.network_enabled}:{self.memory_limit}"
+                    if self.IS_SAFE else "direct")
+            key = flight_key(command, mode, input_files, self.max_output_bytes)
+            flights = get_single_flight()
+            CALLS.inc(self.command_name, "coalesced" if flights.joinable(key, on_output) else "executed")
+            result, self.complete = await flights.run(key, run, on_output)
+            return result
@@ -0,0 +1,52 @@
+"""
+Lazily imported actions, so the server can list its tools without loading every tool module
+"""
+import inspect
+import importlib
+from typing import Any, Callable, Optional
+
+
+class LazyAction:
+    """
+    An action function that is imported from its module on first use.
+
+    Calling it, or asking for its signature, imports the module; until
+    then only the module and function names are kept.
+    """
+
+    def __init__(self, module: str, name: str):
+        """
+        Initialize LazyAction
+        Args:
+            module: Dotted path of the actions module
+            name: Name of the action function in that module
+        """
+        self.module = module
+        self.__name__ = name
+        self.__qualname__ = name
+        self._function: Optional[Callable[..., Any]] = None
+
+    def resolve(self) -> Callable[..., Any]:
+        """Import the module and return the action function"""
+        if self._function is None:
+            self._function = getattr(importlib.import_module(self.module), self.__name__)
+        return self._function
+
+    @property
+    def __signature__(self) -> inspect.Signature:
+        return inspect.signature(self.resolve())
+
+    @property
+    def loaded(self) -> bool:
+        return self._function is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<LazyAction {self.module}.{self.__name__}{'' if self.loaded else ' (not loaded)'}>"
+
+
+def lazy_actions(module: str, *names: str) -> tuple:
+    """LazyAction for each function name of an actions module"""
+    return tuple(LazyAction(module, name) for name in names)
@@ -0,0 +1,573 @@
+"""
+Remote execution: worker agents that run tool processes on behalf of the MCP server
+
+The server connects to every agent listed in KALI_MCPS_REMOTE_WORKERS and
+speaks newline-delimited JSON with it:
+
+    server -> agent  {"type": "hello", "token", "version"}
+                     {"type": "run", "task", "command"}
+                     {"type": "signal", "task", "signal"}
+    agent -> server  {"type": "hello", "worker", "slots", "cpus", "shared_fs", "commands"} or {"type": "error"}
+                     {"type": "heartbeat", "running", "load"}
+                     {"type": "output", "task", "data"}
+                     {"type": "exit", "task", "returncode", "stderr"}
+
+Start an agent with:
+
+    KALI_MCPS_REMOTE_TOKEN=secret python -m src.kali_mcps.base.remote --listen 0.0.0.0:9701 --slots 8 \
+        --tls-cert agent.pem --tls-key agent.key
+
+Without a certificate the token and all traffic travel in cleartext.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import codecs
+import ssl
+import signal
+import asyncio
+import argparse
+import ipaddress
+from typing import Optional
+from src.metrics import QUEUE_WAIT_SECONDS, get_metrics
+
+PROTOCOL_VERSION = 1
+# host:port of each worker agent, comma separated; empty runs everything locally
+REMOTE_WORKERS = os.environ.get("KALI_MCPS_REMOTE_WORKERS", "")
+REMOTE_TOKEN = os.environ.get("KALI_MCPS_REMOTE_TOKEN", "")
+# CA bundle the server verifies agents' certificates with; setting it turns TLS on
+REMOTE_TLS_CA = os.environ.get("KALI_MCPS_REMOTE_TLS_CA", "")
+# connect to agents over TLS, verified with the system's CAs unless KALI_MCPS_REMOTE_TLS_CA is set
+REMOTE_TLS = os.environ.get("KALI_MCPS_REMOTE_TLS", "true" if REMOTE_TLS_CA else "false").lower() == "true"
+# certificate and key an agent serves TLS with
+REMOTE_TLS_CERT = os.environ.get("KALI_MCPS_REMOTE_TLS_CERT", "")
+REMOTE_TLS_KEY = os.environ.get("KALI_MCPS_REMOTE_TLS_KEY", "")
+HEARTBEAT_SECONDS = float(os.environ.get("KALI_MCPS_REMOTE_HEARTBEAT", "2"))
+# an agent that sent nothing, not even a heartbeat, for this long is considered lost
+WORKER_TIMEOUT = 3 * HEARTBEAT_SECONDS
+# extra workers a command is sent to when its worker is lost before it produced output
+REMOTE_RETRIES = int(os.environ.get("KALI_MCPS_REMOTE_RETRIES", "2"))
+# how long the first command waits for the agents to answer before running locally
+CONNECT_WAIT = 5.0
+# commands an agent runs unless started with --commands
+WORKER_COMMANDS = os.environ.get("KALI_MCPS_WORKER_COMMANDS", "nmap,tshark,traceroute")
+LINE_LIMIT = 16 * 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+
+class RemoteError(Exception):
+    """Raised when an agent refuses the connection"""
+    pass
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message).encode("utf-8") + b"\n"
+
+
+def client_ssl_context() -> Optional[ssl.SSLContext]:
+    """TLS context the server connects to agents with, or None for plain TCP"""
+    if not REMOTE_TLS:
+        return None
+    context = ssl.create_default_context(cafile=REMOTE_TLS_CA or None)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+def server_ssl_context(cert: str, key: str = "") -> Optional[ssl.SSLContext]:
+    """TLS context an agent listens with, or None for plain TCP when no certificate is given"""
+    if not cert:
+        return None
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(cert, key or None)
+    return context
+
+
+def _split_address(address: str) -> tuple[str, int]:
+    host, _, port = address.strip().rpartition(":")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+class RemoteProcess:
+    """
+    A command running on a worker agent.
+
+    Offers the part of asyncio.subprocess.Process that CommandRunner uses:
+    stdout and stderr readers, returncode, wait(), send_signal() and kill().
+    """
+
+    def __init__(self, executor: "RemoteExecutor", command: list, needs_files: bool):
+        self.executor = executor
+        self.command = command
+        self.needs_files = needs_files
+        self.task = uuid.uuid4().hex
+        self.stdout = asyncio.StreamReader(limit=LINE_LIMIT)
+        self.stderr = asyncio.StreamReader(limit=LINE_LIMIT)
+        self.returncode: Optional[int] = None
+        self.worker: Optional["WorkerConnection"] = None
+        self.attempts = 0
+        # bytes of output already handed to the caller; a lost run is only retried before any
+        self.delivered = 0
+        self.killed = False
+        self._exited = asyncio.Event()
+
+    def feed(self, data: str) -> None:
+        encoded = data.encode("utf-8")
+        self.delivered += len(encoded)
+        self.stdout.feed_data(encoded)
+
+    def finish(self, returncode: int, stderr: str = "") -> None:
+        if self._exited.is_set():
+            return
+        if self.worker is not None:
+            self.worker.release(self)
+        self.returncode = returncode
+        if stderr:
+            self.stderr.feed_data(stderr.encode("utf-8"))
+        self.stdout.feed_eof()
+        self.stderr.feed_eof()
+        self._exited.set()
+
+    async def wait(self) -> int:
+        await self._exited.wait()
+        return self.returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.returncode is None and self.worker is not None and self.worker.connected:
+            self.worker.send({"type": "signal", "task": self.task, "signal": int(sig)})
+
+    def kill(self) -> None:
+        self.killed = True
+        if self.worker is not None and self.worker.connected:
+            self.send_signal(signal.SIGKILL)
+        else:
+            self.finish(-signal.SIGKILL)
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+
+class WorkerConnection:
+    """The server's connection to one worker agent"""
+
+    def __init__(self, executor: "RemoteExecutor", address: str):
+        self.executor = executor
+        self.address = address
+        self.host, self.port = _split_address(address)
+        self.name = address
+        self.slots = 0
+        self.cpus = 1
+        self.load = 0.0
+        self.shared_fs = False
+        self.commands: set = set()
+        self.connected = False
+        self.error: Optional[str] = None
+        self.last_seen = 0.0
+        self.running: dict = {}
+        self.completed = 0
+        self.lost = 0
+        # set once the first connection attempt succeeded or failed
+        self.tried = asyncio.Event()
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    def accepts(self, process: RemoteProcess) -> bool:
+        return (self.connected and os.path.basename(process.command[0]) in self.commands
+                and (self.shared_fs or not process.needs_files))
+
+    @property
+    def free(self) -> int:
+        return self.slots - len(self.running)
+
+    def score(self) -> tuple:
+        """Lower is better: share of slots in use, then the host's load per CPU"""
+        return len(self.running) / max(self.slots, 1), self.load / max(self.cpus, 1)
+
+    def send(self, message: dict) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(_encode(message))
+
+    def assign(self, process: RemoteProcess) -> None:
+        process.worker = self
+        process.attempts += 1
+        self.running[process.task] = process
+        self.send({"type": "run", "task": process.task, "command": process.command})
+
+    def release(self, process: RemoteProcess) -> None:
+        if self.running.pop(process.task, None) is not None:
+            self.completed += 1
+            self.executor.notify()
+
+    async def serve(self) -> None:
+        """Connect, then handle the agent's messages until the connection is lost"""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT, ssl=self.executor.ssl_context),
+            WORKER_TIMEOUT
+        )
+        try:
+            writer.write(_encode({"type": "hello", "token": self.executor.token, "version": PROTOCOL_VERSION}))
+            hello = json.loads(await asyncio.wait_for(reader.readline(), WORKER_TIMEOUT) or b"{}")
+            if hello.get("type") != "hello":
+                raise RemoteError(hello.get("error") or "the agent closed the connection")
+            self.name = hello.get("worker") or self.address
+            self.slots = int(hello.get("slots", 1))
+            self.cpus = int(hello.get("cpus", 1))
+            self.shared_fs = bool(hello.get("shared_fs"))
+            self.commands = set(hello.get("commands", []))
+            self._writer = writer
+            self.connected = True
+            self.error = None
+            self.last_seen = time.monotonic()
+            self.tried.set()
+            self.executor.notify()
+
+            while True:
+                line = await asyncio.wait_for(reader.readline(), WORKER_TIMEOUT)
+                if not line:
+                    raise RemoteError("the agent closed the connection")
+                self.last_seen = time.monotonic()
+                message = json.loads(line)
+                kind = message.get("type")
+                if kind == "heartbeat":
+                    self.load = float(message.get("load", 0.0))
+                    continue
+                process = self.running.get(message.get("task"))
+                if process is None:
+                    continue
+                if kind == "output":
+                    process.feed(message["data"])
+                elif kind == "exit":
+                    process.finish(message.get("returncode", -1), message.get("stderr", ""))
+        finally:
+            self.connected = False
+            self._writer = None
+            writer.close()
+            self._fail_running()
+
+    def _fail_running(self) -> None:
+        running, self.running = list(self.running.values()), {}
+        if running:
+            self.lost += 1
+        for process in running:
+            process.worker = None
+            self.executor.retry(process, self)
+        self.executor.notify()
+
+
+class RemoteExecutor:
+    """
+    Runs commands on worker agents, picking the least loaded agent with a free slot.
+
+    Agents are connected on first use and reconnected in the background when
+    they go away. A command whose agent is lost before it produced output
+    is sent to another agent; commands run locally while no agent is reachable.
+    """
+
+    name = "remote"
+
+    def __init__(self, addresses: list, token: str = REMOTE_TOKEN, retries: int = REMOTE_RETRIES,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.token = token
+        self.ssl_context = ssl_context
+        self.retries = retries
+        self.workers = [WorkerConnection(self, address) for address in addresses]
+        self.dispatched = 0
+        self.retried = 0
+        self.failed = 0
+        self.local = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._tasks: list = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._changed = asyncio.Event()
+            self._tasks = [asyncio.ensure_future(self._maintain(worker)) for worker in self.workers]
+
+    async def _maintain(self, worker: WorkerConnection) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                await worker.serve()
+                backoff = 1.0
+            except asyncio.TimeoutError:
+                worker.error = f"no heartbeat for {WORKER_TIMEOUT:g} seconds"
+            except (OSError, ValueError, RemoteError) as e:
+                worker.error = str(e) or type(e).__name__
+            worker.tried.set()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    async def _choose(self, process: RemoteProcess) -> Optional[WorkerConnection]:
+        """The least loaded agent able to run the command, waiting for a free slot; None if there is none"""
+        while True:
+            eligible = [worker for worker in self.workers if worker.accepts(process)]
+            if not eligible:
+                return None
+            free = [worker for worker in eligible if worker.free > 0]
+            if free:
+                return min(free, key=WorkerConnection.score)
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def spawn(self, command: list):
+        """
+        Start a command on an agent
+        Returns:
+            A RemoteProcess, or a local asyncio process when no agent can run the command
+        """
+        self.start()
+        pending = [worker.tried.wait() for worker in self.workers if not worker.tried.is_set()]
+        if pending:
+            await asyncio.wait([asyncio.ensure_future(wait) for wait in pending], timeout=CONNECT_WAIT)
+        process = RemoteProcess(self, command, any(os.path.isfile(arg) for arg in command[1:]))
+        with QUEUE_WAIT_SECONDS.time("remote_workers"):
+            worker = await self._choose(process)
+        if worker is None:
+            self.local += 1
+            return await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        self.dispatched += 1
+        worker.assign(process)
+        return process
+
+    def retry(self, process: RemoteProcess, lost: WorkerConnection) -> None:
+        """Send a command whose agent went away to another agent, or fail it"""
+        if process.killed:
+            process.finish(-signal.SIGKILL)
+            return
+        reason = f"worker {lost.name} lost"
+        if process.delivered:
+            # the caller already has part of the output, a second run would repeat it
+            self.failed += 1
+            process.finish(-1, f"{reason} after {process.delivered} bytes of output")
+            return
+        if process.attempts > self.retries:
+            self.failed += 1
+            process.finish(-1, f"{reason}, giving up after {process.attempts} attempts")
+            return
+
+        async def resend():
+            worker = await self._choose(process)
+            if process.returncode is not None:
+                # killed while waiting for a slot
+                return
+            if worker is None:
+                self.failed += 1
+                process.finish(-1, f"{reason} and no other worker can run {process.command[0]}")
+                return
+            self.retried += 1
+            worker.assign(process)
+
+        asyncio.ensure_future(resend())
+
+    def stats(self) -> dict:
+        connected = [worker for worker in self.workers if worker.connected]
+        return {
+            "workers": len(self.workers),
+            "connected": len(connected),
+            "slots": sum(worker.slots for worker in connected),
+            "running": sum(len(worker.running) for worker in connected),
+            "dispatched": self.dispatched,
+            "retried": self.retried,
+            "failed": self.failed,
+            "local": self.local,
+        }
+
+    def describe(self) -> list:
+        """State of every agent"""
+        now = time.monotonic()
+        return [{
+            "address": worker.address,
+            "name": worker.name,
+            "connected": worker.connected,
+            "slots": worker.slots,
+            "running": len(worker.running),
+            "load": worker.load,
+            "cpus": worker.cpus,
+            "shared_fs": worker.shared_fs,
+            "commands": sorted(worker.commands),
+            "completed": worker.completed,
+            "lost": worker.lost,
+            "last_seen": round(now - worker.last_seen, 1) if worker.last_seen else None,
+            "error": worker.error,
+        } for worker in self.workers]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+_remote_executor: Optional[RemoteExecutor] = None
+
+
+def get_remote_executor() -> Optional[RemoteExecutor]:
+    """Return the process-wide remote executor, or None when no workers are configured"""
+    global _remote_executor
+    if _remote_executor is None and REMOTE_WORKERS.strip():
+        _remote_executor = RemoteExecutor([address for address in REMOTE_WORKERS.split(",") if address.strip()],
+                                          ssl_context=client_ssl_context())
+        get_metrics().register_stats("kali_mcps_remote", _remote_executor.stats)
+    return _remote_executor
+
+
+class WorkerAgent:
+    """
+    Runs commands for MCP servers that connect to it.
+
+    Each connection has its own processes; they are killed when the
+    connection drops, since nobody is left to read their output.
+    """
+
+    def __init__(self, name: str, slots: int, token: str, commands: set, shared_fs: bool = False):
+        self.name = name
+        self.slots = slots
+        self.token = token
+        self.commands = commands
+        self.shared_fs = shared_fs
+        self._slots = asyncio.Semaphore(slots)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        processes: dict = {}
+        tasks: set = set()
+
+        def send(message: dict) -> None:
+            if not writer.is_closing():
+                writer.write(_encode(message))
+
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), WORKER_TIMEOUT) or b"{}")
+            if not hmac.compare_digest(str(hello.get("token", "")), self.token):
+                send({"type": "error", "error": "invalid token"})
+                return
+            if hello.get("version") != PROTOCOL_VERSION:
+                send({"type": "error", "error": f"protocol version {hello.get('version')} is not supported"})
+                return
+            send({"type": "hello", "worker": self.name, "slots": self.slots, "cpus": os.cpu_count() or 1,
+                  "shared_fs": self.shared_fs, "commands": sorted(self.commands), "version": PROTOCOL_VERSION})
+
+            async def heartbeat():
+                while True:
+                    send({"type": "heartbeat", "running": len(processes), "load": os.getloadavg()[0]})
+                    await writer.drain()
+                    await asyncio.sleep(HEARTBEAT_SECONDS)
+
+            tasks.add(asyncio.ensure_future(heartbeat()))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("type") == "run":
+                    task = asyncio.ensure_future(self.run(message["task"], message["command"], processes, send,
+                                                          writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif message.get("type") == "signal" and message.get("task") in processes:
+                    try:
+                        processes[message["task"]].send_signal(message["signal"])
+                    except ProcessLookupError:
+                        pass
+        except (OSError, ValueError, asyncio.TimeoutError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def run(self, task: str, command: list, processes: dict, send, writer: asyncio.StreamWriter) -> None:
+        if not command or os.path.basename(command[0]) not in self.commands:
+            send({"type": "exit", "task": task, "returncode": 126,
+                  "stderr": f"{command[0] if command else 'empty command'} is not allowed on worker {self.name}"})
+            return
+        async with self._slots:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+            except OSError as e:
+                send({"type": "exit", "task": task, "returncode": 127, "stderr": str(e)})
+                return
+            processes[task] = process
+            stderr_task = asyncio.ensure_future(process.stderr.read())
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            try:
+                while True:
+                    data = await process.stdout.read(READ_CHUNK)
+                    if not data:
+                        break
+                    text = decoder.decode(data)
+                    if text:
+                        send({"type": "output", "task": task, "data": text})
+                        await writer.drain()
+                text = decoder.decode(b"", final=True)
+                if text:
+                    send({"type": "output", "task": task, "data": text})
+                stderr = (await stderr_task).decode("utf-8", errors="replace")
+                send({"type": "exit", "task": task, "returncode": await process.wait(), "stderr": stderr})
+            finally:
+                processes.pop(task, None)
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                if not stderr_task.done():
+                    stderr_task.cancel()
+
+
+async def serve_worker(host: str, port: int, agent: WorkerAgent,
+                       ssl_context: Optional[ssl.SSLContext] = None) -> None:
+    server = await asyncio.start_server(agent.handle, host, port, limit=LINE_LIMIT, ssl=ssl_context)
+    print(f"worker {agent.name} listening on {host}:{port}{' (TLS)' if ssl_context else ''} "
+          f"with {agent.slots} slots, commands: {', '.join(sorted(agent.commands))}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a kali_mcps worker agent")
+    parser.add_argument("--listen", default="127.0.0.1:9701", help="host:port to listen on")
+    parser.add_argument("--slots", type=int, default=os.cpu_count() or 1, help="commands run at once")
+    parser.add_argument("--name", default="", help="name reported to the server (default: host:port)")
+    parser.add_argument("--commands", default=WORKER_COMMANDS, help="comma separated commands allowed")
+    parser.add_argument("--shared-fs", action="store_true",
+                        help="the server's input files are reachable here under the same paths")
+    parser.add_argument("--tls-cert", default=REMOTE_TLS_CERT,
+                        help="certificate (PEM) to serve TLS with (default: KALI_MCPS_REMOTE_TLS_CERT)")
+    parser.add_argument("--tls-key", default=REMOTE_TLS_KEY,
+                        help="private key of the certificate, if not in the certificate file")
+    args = parser.parse_args()
+
+    host, port = _split_address(args.listen)
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = host == "localhost"
+    if not REMOTE_TOKEN and not loopback:
+        parser.error("set KALI_MCPS_REMOTE_TOKEN before listening on a non-loopback address")
+    try:
+        ssl_context = server_ssl_context(args.tls_cert, args.tls_key)
+    except (OSError, ssl.SSLError) as e:
+        parser.error(f"cannot load the TLS certificate: {e}")
+    if ssl_context is None and not loopback:
+        print("warning: listening without TLS, the token and all commands and output are sent in cleartext",
+              file=sys.stderr)
+    agent = WorkerAgent(args.name or f"{os.uname().nodename}:{port}", args.slots, REMOTE_TOKEN,
+                        {command.strip() for command in args.commands.split(",") if command.strip()},
+                        args.shared_fs)
+    try:
+        asyncio.run(serve_worker(host, port, agent, ssl_context))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Content-addressed cache for results of deterministic commands
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from src.metrics import get_metrics
+
+CACHE_DIR = os.environ.get(
+    "KALI_MCPS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "results")
+)
+
+
+class ResultCache:
+    """
+    Two-tier (memory LRU + disk) cache of (stdout, stderr) results.
+
+    Keys are derived from the command argv, the identity of every file the
+    command reads (inode, mtime, size) and the tool version, so a result is
+    reused only while the input file and the tool are unchanged. Results of
+    commands that depend on something else (the network) are looked up
+    with a maximum age instead.
+    """
+
+    def __init__(
+        self,
+        disk_dir: str = CACHE_DIR,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        disk_max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.disk_dir = disk_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None
+        self._evicting = False
+        self._versions: dict = {}
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    async def tool_version(self, tool: str) -> str:
+        """Return the first line of `tool --version`, probed once per process"""
+        if tool not in self._versions:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    tool, "--version",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await process.communicate()
+                self._versions[tool] = stdout.decode("utf-8", errors="replace").split("\n", 1)[0]
+            except Exception:
+                self._versions[tool] = ""
+        return self._versions[tool]
+
+    async def key_for(self, command: list, mode: str = "direct", require_files: bool = True) -> Optional[str]:
+        """
+        Build the cache key for a command
+        Args:
+            command: Command argv
+            mode: Execution mode, results from different modes never mix
+            require_files: Only cache commands that read a local file
+        Returns:
+            The key, or None if the command reads no local file and require_files is set
+        """
+        files = []
+        for arg in command[1:]:
+            try:
+                st = os.stat(arg)
+            except (OSError, ValueError):
+                continue
+            if os.path.isfile(arg):
+                files.append([arg, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size])
+        if not files and require_files:
+            return None
+        version = await self.tool_version(command[0]) if mode == "direct" else ""
+        material = json.dumps([command, files, version, mode])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, value: tuple, size: int, stored: float) -> None:
+        if size > self.memory_max_bytes // 4:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (value, size, stored)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.evictions += 1
+
+    async def get(self, key: str, max_age: Optional[float] = None) -> Optional[tuple[str, str]]:
+        """
+        Look a result up in memory, then on disk
+        Args:
+            key: Cache key
+            max_age: Ignore results stored more than this many seconds ago
+        """
+        oldest = time.time() - max_age if max_age is not None else None
+        if key in self._memory and (oldest is None or self._memory[key][2] >= oldest):
+            self._memory.move_to_end(key)
+            self.hits_memory += 1
+            return self._memory[key][0]
+
+        # entries can be megabytes of JSON, read them off the event loop
+        entry = await asyncio.to_thread(self._read_disk, key, oldest)
+        if entry is None:
+            self.misses += 1
+            return None
+        stdout, stderr, stored = entry
+        self.hits_disk += 1
+        self._remember(key, (stdout, stderr), len(stdout) + len(stderr), stored)
+        return stdout, stderr
+
+    def _read_disk(self, key: str, oldest: Optional[float]) -> Optional[tuple[str, str, float]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stdout, stderr, *stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # entries written before results carried their age count as expired
+        stored = stored[0] if stored else 0.0
+        if oldest is not None and stored < oldest:
+            return None
+        try:
+            os.utime(path)  # keep recently used entries away from eviction
+        except OSError:
+            pass
+        return stdout, stderr, stored
+
+    async def put(self, key: str, value: tuple[str, str]) -> None:
+        """Store a result in both tiers"""
+        stored = time.time()
+        self._remember(key, tuple(value), len(value[0]) + len(value[1]), stored)
+        size = await asyncio.to_thread(self._write_disk, key, value, stored)
+        if size is None:
+            return
+        self.stores += 1
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in await asyncio.to_thread(self._disk_entries))
+        else:
+            self._disk_bytes += size
+        if self._disk_bytes > self.disk_max_bytes and not self._evicting:
+            self._evicting = True
+            try:
+                self._disk_bytes, evicted = await asyncio.to_thread(self._evict_disk)
+                self.evictions += evicted
+            finally:
+                self._evicting = False
+
+    def _write_disk(self, key: str, value: tuple[str, str], stored: float) -> Optional[int]:
+        """Write an entry, returning its size in bytes or None if it could not be written"""
+        payload = json.dumps([*value, stored])
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            return None
+        return len(payload)
+
+    def _disk_entries(self) -> list:
+        entries = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict_disk(self) -> tuple[int, int]:
+        """
+        Remove least recently used files until the disk tier is at 90% of its budget
+        Returns:
+            (bytes left on disk, files removed)
+        """
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return total, evicted
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and tier sizes"""
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            memory_max_bytes=int(os.environ.get("KALI_MCPS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024))),
+            disk_max_bytes=int(os.environ.get("KALI_MCPS_CACHE_DISK_BYTES", str(512 * 1024 * 1024))),
+        )
+        get_metrics().register_stats("kali_mcps_result_cache", _result_cache.stats)
+    return _result_cache
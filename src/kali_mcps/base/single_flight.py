@@ -0,0 +1,167 @@
+"""
+Single-flight execution: identical concurrent commands share one process
+"""
+import os
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Optional
+from src.metrics import get_metrics
+
+# output replayed to callers joining a running command; a command that
+# streamed more than this only accepts callers that don't stream output
+REPLAY_BYTES = 16 * 1024 * 1024
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
+
+def flight_key(command: list, mode: str, input_files: Optional[dict] = None, max_output_bytes: int = 0) -> str:
+    """
+    Build the key under which identical invocations are coalesced
+    Args:
+        command: Command argv; paths are kept as given because tools echo them
+        mode: Execution mode, e.g. 'direct' or the sandbox profile
+        input_files: Files copied into the sandbox
+        max_output_bytes: Output cap of the runner, results with different caps differ
+    """
+    files = []
+    for arg in [*command[1:], *(input_files or {})]:
+        try:
+            st = os.stat(arg)
+        except (OSError, ValueError):
+            continue
+        files.append([arg, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size])
+    material = json.dumps([command, mode, sorted((input_files or {}).items()), files, max_output_bytes])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One running command and the callers waiting for it"""
+
+    def __init__(self, replay_bytes: int):
+        self.task: Optional[asyncio.Task] = None
+        self.callers = 0
+        self.cancelled = False
+        self.subscribers: list = []
+        self.replay: list = []
+        self.replay_size = 0
+        self.replay_bytes = replay_bytes
+        self.replay_complete = True
+        # held while a chunk is broadcast or a new caller catches up
+        self.lock = asyncio.Lock()
+
+    async def publish(self, chunk: str) -> None:
+        async with self.lock:
+            if self.replay_complete:
+                self.replay_size += len(chunk)
+                if self.replay_size <= self.replay_bytes:
+                    self.replay.append(chunk)
+                else:
+                    self.replay_complete = False
+                    self.replay = []
+            for subscriber in list(self.subscribers):
+                try:
+                    await subscriber(chunk)
+                except Exception:
+                    # a broken client must not stop the command for the others
+                    self.subscribers.remove(subscriber)
+
+    async def subscribe(self, on_output: OutputCallback) -> None:
+        async with self.lock:
+            for chunk in self.replay:
+                await on_output(chunk)
+            self.subscribers.append(on_output)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent invocations.
+
+    The first caller starts the command in a task of its own; callers
+    arriving with the same key while it runs join it, receive the output
+    streamed so far followed by the live output, and get the same result.
+    The command is only cancelled once every caller has gone away.
+    """
+
+    def __init__(self, replay_bytes: int = REPLAY_BYTES):
+        self.replay_bytes = replay_bytes
+        self._flights: dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def joinable(self, key: str, on_output: Optional[OutputCallback] = None) -> Optional[Flight]:
+        """Return the running flight a call with this key would join, if any"""
+        flight = self._flights.get(key)
+        if flight is None or flight.cancelled or flight.task.done():
+            return None
+        if on_output and not flight.replay_complete:
+            return None
+        return flight
+
+    async def run(self, key: str, start: Callable[[OutputCallback], Awaitable[Any]],
+                  on_output: Optional[OutputCallback] = None) -> Any:
+        """
+        Run start(publish) once for all concurrent callers with the same key
+        Args:
+            key: Key from flight_key()
+            start: Coroutine function running the command, called with the
+                callback that broadcasts its output
+            on_output: Coroutine called with each chunk of output
+        Returns:
+            The value returned by start
+        """
+        flight = self.joinable(key, on_output)
+        if flight is None:
+            flight = Flight(self.replay_bytes)
+
+            async def run_flight():
+                try:
+                    return await start(flight.publish)
+                finally:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(run_flight())
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.callers += 1
+        try:
+            if on_output:
+                await flight.subscribe(on_output)
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if on_output in flight.subscribers:
+                flight.subscribers.remove(on_output)
+            if flight.callers == 1:
+                flight.cancelled = True
+                flight.task.cancel()
+                # the last caller waits until the process is killed, as without coalescing
+                await asyncio.gather(flight.task, return_exceptions=True)
+            raise
+        finally:
+            flight.callers -= 1
+
+    def stats(self) -> dict:
+        """Return how many commands were started and how many calls joined one"""
+        calls = self.started + self.coalesced
+        return {
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / calls if calls else 0.0,
+            "in_flight": len(self._flights),
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight registry"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+        get_metrics().register_stats("kali_mcps_coalescing", _single_flight.stats)
+    return _single_flight
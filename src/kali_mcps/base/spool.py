@@ -0,0 +1,482 @@
+"""
+Output budgets: spool large tool output to disk and return a compact digest with a handle for paging
+"""
+import os
+import re
+import json
+import time
+import uuid
+import codecs
+import heapq
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Union
+from src.kali_mcps.base.kali_command import OutputCallback
+
+SPOOL_DIR = os.environ.get(
+    "KALI_MCPS_SPOOL_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "spool")
+)
+# spooled outputs are removed after this many seconds, oldest first once over the size cap
+SPOOL_TTL = int(os.environ.get("KALI_MCPS_SPOOL_TTL", str(24 * 3600)))
+SPOOL_MAX_BYTES = int(os.environ.get("KALI_MCPS_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+# a line offset is recorded every LINE_INDEX_STEP lines for paging by line
+LINE_INDEX_STEP = 1000
+TOP_N = 10
+# longer lines are cut in the head, tail and digest (never in the spool file)
+MAX_LINE = 64 * 1024
+
+
+@dataclass
+class OutputBudget:
+    """How much output a tool returns inline before it is spooled"""
+    max_bytes: int
+    max_lines: int
+
+
+DEFAULT_BUDGET = OutputBudget(
+    max_bytes=int(os.environ.get("KALI_MCPS_OUTPUT_BUDGET_BYTES", str(128 * 1024))),
+    max_lines=int(os.environ.get("KALI_MCPS_OUTPUT_BUDGET_LINES", "2000")),
+)
+# tools whose lines are long get a lower line budget
+TOOL_BUDGETS = {
+    "analyze_pcap": OutputBudget(DEFAULT_BUDGET.max_bytes, DEFAULT_BUDGET.max_lines // 2),
+}
+
+
+class Digest:
+    """Aggregates over every line of an output, kept in bounded memory"""
+
+    def feed(self, line: str) -> None:
+        pass
+
+    def result(self) -> dict:
+        return {}
+
+
+class DisassemblyDigest(Digest):
+    """Functions, instructions, most used mnemonics and call targets of `objdump -d`"""
+    FUNCTION = re.compile(r"^[0-9a-f]+ <(.+)>:$")
+    INSTRUCTION = re.compile(r"^\s+[0-9a-f]+:\t[0-9a-f ]+\t(\S+)")
+    CALL = re.compile(r"\bcall\w*\s+[0-9a-f]+ <([^>]+)>")
+
+    def __init__(self):
+        self.functions = 0
+        self.instructions = 0
+        self.mnemonics = Counter()
+        self.calls = Counter()
+        self.largest = []
+        self._function = None
+        self._size = 0
+
+    def _close_function(self) -> None:
+        if self._function is not None:
+            heapq.heappush(self.largest, (self._size, self._function))
+            if len(self.largest) > TOP_N:
+                heapq.heappop(self.largest)
+
+    def feed(self, line: str) -> None:
+        match = self.INSTRUCTION.match(line)
+        if match:
+            self.instructions += 1
+            self._size += 1
+            self.mnemonics[match.group(1)] += 1
+            call = self.CALL.search(line)
+            if call:
+                self.calls[call.group(1)] += 1
+            return
+        match = self.FUNCTION.match(line)
+        if match:
+            self._close_function()
+            self.functions += 1
+            self._function, self._size = match.group(1), 0
+
+    def result(self) -> dict:
+        self._close_function()
+        self._function = None
+        return {
+            "functions": self.functions,
+            "instructions": self.instructions,
+            "top_mnemonics": self.mnemonics.most_common(TOP_N),
+            "top_call_targets": self.calls.most_common(TOP_N),
+            "largest_functions": [(name, size) for size, name in sorted(self.largest, reverse=True)],
+        }
+
+
+class HeadersDigest(Digest):
+    """Sections and symbols of `objdump -x`"""
+    SECTION = re.compile(r"^\s+\d+ (\S+)\s+([0-9a-f]+) ")
+    SYMBOL = re.compile(r"^[0-9a-f]+ .{7} (\S+)\t([0-9a-f]+) +(.*)$")
+
+    def __init__(self):
+        self.sections = []
+        self.symbols = 0
+        self.symbols_by_section = Counter()
+        self.largest = []
+
+    def feed(self, line: str) -> None:
+        match = self.SYMBOL.match(line)
+        if match:
+            section, size, name = match.groups()
+            self.symbols += 1
+            self.symbols_by_section[section] += 1
+            heapq.heappush(self.largest, (int(size, 16), name))
+            if len(self.largest) > TOP_N:
+                heapq.heappop(self.largest)
+            return
+        match = self.SECTION.match(line)
+        if match and len(self.sections) < 256:
+            self.sections.append((match.group(1), int(match.group(2), 16)))
+
+    def result(self) -> dict:
+        return {
+            "sections": self.sections,
+            "symbols": self.symbols,
+            "symbols_by_section": self.symbols_by_section.most_common(TOP_N),
+            "largest_symbols": [(name, size) for size, name in sorted(self.largest, reverse=True)],
+        }
+
+
+class PacketDigest(Digest):
+    """Protocols, endpoints and sizes of tshark's one-line-per-packet output"""
+    PACKET = re.compile(r"^\s*\d+\s+[\d.]+\s+(\S+)\s+(?:→|->)\s+(\S+)\s+(\S+)\s+(\d+)")
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.protocols = Counter()
+        self.sources = Counter()
+        self.destinations = Counter()
+
+    def feed(self, line: str) -> None:
+        match = self.PACKET.match(line)
+        if not match:
+            return
+        source, destination, protocol, length = match.groups()
+        self.packets += 1
+        self.bytes += int(length)
+        self.protocols[protocol] += 1
+        # endpoint counters are capped so a scan of many hosts can't grow them without bound
+        if source in self.sources or len(self.sources) < 65536:
+            self.sources[source] += 1
+        if destination in self.destinations or len(self.destinations) < 65536:
+            self.destinations[destination] += 1
+
+    def result(self) -> dict:
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "top_protocols": self.protocols.most_common(TOP_N),
+            "top_sources": self.sources.most_common(TOP_N),
+            "top_destinations": self.destinations.most_common(TOP_N),
+        }
+
+
+DIGESTS = {
+    "disassemble": DisassemblyDigest,
+    "full_contents": HeadersDigest,
+    "analyze_pcap": PacketDigest,
+    "capture_live": PacketDigest,
+}
+
+
+class SpoolWriter:
+    """
+    Output sink writing every chunk to a spool file.
+
+    Keeps the head within the budget, the last lines, a sparse line index
+    and the tool's digest; memory use does not depend on the output size.
+    """
+
+    def __init__(self, spool: "Spool", tool: str, budget: OutputBudget,
+                 on_output: Optional[OutputCallback] = None):
+        self.spool = spool
+        self.tool = tool
+        self.budget = budget
+        self.on_output = on_output
+        self.handle = uuid.uuid4().hex[:16]
+        self.bytes = 0
+        self.lines = 0
+        self.head: list = []
+        self.head_bytes = 0
+        self.head_lines = 0
+        self.tail = deque(maxlen=max(1, budget.max_lines // 4))
+        self.line_index = [0]
+        self.digest = DIGESTS.get(tool, Digest)()
+        self.forwarded = 0
+        self._partial = ""
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.spool.directory, exist_ok=True)
+            self._file = open(self.spool.data_path(self.handle), "wb")
+        return self._file
+
+    def _line(self, line: str, end: int) -> None:
+        self.lines += 1
+        if self.lines % LINE_INDEX_STEP == 0:
+            self.line_index.append(end)
+        if self.head_bytes + len(line) <= self.budget.max_bytes // 2 and self.head_lines < self.budget.max_lines // 2:
+            self.head.append(line)
+            self.head_bytes += len(line)
+            self.head_lines += 1
+        self.tail.append(line[:1024])
+        self.digest.feed(line.rstrip("\n"))
+
+    def tail_text(self) -> str:
+        """The last lines, at most a quarter of the byte budget"""
+        lines = []
+        size = 0
+        for line in reversed(self.tail):
+            size += len(line)
+            if size > self.budget.max_bytes // 4:
+                break
+            lines.append(line)
+        return "".join(reversed(lines))
+
+    def within_budget(self) -> bool:
+        return self.bytes <= self.budget.max_bytes and self.lines <= self.budget.max_lines
+
+    async def __call__(self, chunk: str) -> None:
+        data = chunk.encode("utf-8")
+        start = self.bytes
+        self._open().write(data)
+        self.bytes += len(data)
+
+        ascii_only = chunk.isascii()
+        pieces = chunk.split("\n")
+        offset = start
+        for i, piece in enumerate(pieces[:-1]):
+            # byte offset just past each completed line
+            offset += (len(piece) if ascii_only else len(piece.encode("utf-8"))) + 1
+            self._line((self._partial + piece if i == 0 else piece) + "\n", offset)
+        if len(pieces) > 1:
+            self._partial = ""
+        self._partial = (self._partial + pieces[-1])[:MAX_LINE]
+
+        if self.on_output is None:
+            return
+        if self.forwarded + len(chunk) <= self.budget.max_bytes:
+            self.forwarded += len(chunk)
+            await self.on_output(chunk)
+        elif self.forwarded <= self.budget.max_bytes:
+            self.forwarded = self.budget.max_bytes + 1
+            await self.on_output(f"\n[output exceeds {self.budget.max_bytes} bytes; spooled as {self.handle}]\n")
+
+    def finish(self, stderr: str) -> dict:
+        """Close the spool file and record its metadata"""
+        if self._partial:
+            self._line(self._partial, self.bytes)
+            self._partial = ""
+        if self._file is not None:
+            self._file.close()
+        meta = {
+            "handle": self.handle,
+            "tool": self.tool,
+            "created": time.time(),
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "line_index": self.line_index,
+            "stderr": stderr,
+        }
+        self.spool.save_meta(meta)
+        return meta
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self.spool.remove(self.handle)
+
+
+class Spool:
+    """Directory of spooled outputs, paged by byte offset or line number"""
+
+    def __init__(self, directory: str = SPOOL_DIR, ttl: int = SPOOL_TTL, max_bytes: int = SPOOL_MAX_BYTES):
+        """
+        Initialize Spool
+        Args:
+            directory: Directory holding spooled outputs
+            ttl: Seconds a spooled output is kept
+            max_bytes: Total size of spooled outputs, oldest are removed first
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def data_path(self, handle: str) -> str:
+        return os.path.join(self.directory, f"{handle}.out")
+
+    def meta_path(self, handle: str) -> str:
+        return os.path.join(self.directory, f"{handle}.json")
+
+    def save_meta(self, meta: dict) -> None:
+        tmp_path = f"{self.meta_path(meta['handle'])}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path(meta["handle"]))
+
+    def meta(self, handle: str) -> Optional[dict]:
+        if not re.fullmatch(r"[0-9a-f]{16}", handle or ""):
+            return None
+        try:
+            with open(self.meta_path(handle), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, handle: str) -> None:
+        for path in (self.data_path(handle), self.meta_path(handle)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def writer(self, tool: str, on_output: Optional[OutputCallback] = None,
+               budget: Optional[OutputBudget] = None) -> SpoolWriter:
+        """Start spooling the output of a tool call"""
+        self.expire()
+        return SpoolWriter(self, tool, budget or TOOL_BUDGETS.get(tool, DEFAULT_BUDGET), on_output)
+
+    def expire(self) -> None:
+        """Remove outputs older than ttl, then the oldest ones beyond max_bytes"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        entries = []
+        now = time.time()
+        for name in names:
+            if not name.endswith(".out"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                self.remove(name[:-4])
+            else:
+                entries.append((st.st_mtime, st.st_size, name[:-4]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, handle in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(handle)
+            total -= size
+
+    def read(self, handle: str, offset: int = 0, length: int = 64 * 1024) -> Optional[dict]:
+        """
+        Read part of a spooled output
+        Args:
+            handle: Handle returned in the digest
+            offset: Byte offset to start from
+            length: Maximum number of bytes to read
+        Returns:
+            {"handle", "offset", "data", "next_offset", "total_bytes", "eof"}
+        """
+        meta = self.meta(handle)
+        if meta is None:
+            return None
+        offset = max(0, min(offset, meta["bytes"]))
+        with open(self.data_path(handle), "rb") as f:
+            f.seek(offset)
+            data = f.read(max(0, length))
+        # don't split a UTF-8 sequence, the rest is returned by the next read
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text = decoder.decode(data)
+        consumed = len(data) - len(decoder.getstate()[0])
+        return {
+            "handle": handle,
+            "offset": offset,
+            "data": text,
+            "next_offset": offset + consumed,
+            "total_bytes": meta["bytes"],
+            "eof": offset + consumed >= meta["bytes"],
+        }
+
+    def read_lines(self, handle: str, start: int = 0, count: int = 500) -> Optional[dict]:
+        """
+        Read lines of a spooled output
+        Args:
+            handle: Handle returned in the digest
+            start: Index of the first line, counted from 0
+            count: Maximum number of lines to read
+        Returns:
+            {"handle", "start", "lines", "next_line", "total_lines", "eof"}
+        """
+        meta = self.meta(handle)
+        if meta is None:
+            return None
+        start = max(0, min(start, meta["lines"]))
+        block = min(start // LINE_INDEX_STEP, len(meta["line_index"]) - 1)
+        lines = []
+        with open(self.data_path(handle), "rb") as f:
+            f.seek(meta["line_index"][block])
+            index = block * LINE_INDEX_STEP
+            for raw in f:
+                if index >= start + count:
+                    break
+                if index >= start:
+                    lines.append(raw.decode("utf-8", errors="replace"))
+                index += 1
+        return {
+            "handle": handle,
+            "start": start,
+            "lines": "".join(lines),
+            "next_line": start + len(lines),
+            "total_lines": meta["lines"],
+            "eof": start + len(lines) >= meta["lines"],
+        }
+
+
+_spool: Optional[Spool] = None
+
+
+def get_spool() -> Spool:
+    """Return the process-wide output spool"""
+    global _spool
+    if _spool is None:
+        _spool = Spool()
+    return _spool
+
+
+async def run_budgeted(tool: str, run: Callable[[OutputCallback], Awaitable[tuple[str, str]]],
+                       on_output: Optional[OutputCallback] = None,
+                       budget: Optional[OutputBudget] = None) -> Union[tuple[str, str], dict]:
+    """
+    Run a tool with an output budget
+    Args:
+        tool: Tool name, selects the budget and the digest
+        run: Coroutine function running the tool with an on_output callback
+        on_output: Coroutine receiving output up to the budget while the tool runs
+        budget: Overrides the tool's budget
+    Returns:
+        (stdout, stderr) when the output fits the budget, otherwise a digest
+        {"handle", "bytes", "lines", "head", "tail", "summary", "stderr"};
+        the full output is paged with Spool.read / Spool.read_lines
+    """
+    writer = get_spool().writer(tool, on_output, budget)
+    try:
+        stdout, stderr = await run(writer)
+    except BaseException:
+        writer.discard()
+        raise
+    if writer.bytes == 0 and stdout:
+        # the tool did not stream, spool what it returned
+        await writer(stdout)
+    if writer.within_budget():
+        writer.discard()
+        return stdout, stderr
+    meta = writer.finish(stderr)
+    return {
+        "handle": writer.handle,
+        "tool": tool,
+        "bytes": meta["bytes"],
+        "lines": meta["lines"],
+        "head": "".join(writer.head),
+        "tail": writer.tail_text(),
+        "summary": writer.digest.result(),
+        "stderr": stderr,
+        "paging": f"read_output(handle, offset={len(''.join(writer.head).encode('utf-8'))}) "
+                  f"or read_output_lines(handle, start={writer.head_lines}) returns the rest",
+    }
@@ -0,0 +1,302 @@
+"""
+Resource limits and accounting of tool processes run directly on the host
+"""
+import os
+import time
+import signal
+import asyncio
+from collections import deque
+from typing import Callable, Optional
+from src.metrics import CPU_SECONDS, IO_BYTES, PEAK_RSS_BYTES, PROCESSES_KILLED, get_metrics
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# limit CPU time and memory of direct processes to what their runner declares
+RLIMITS = os.environ.get("KALI_MCPS_RLIMITS", "true").lower() == "true"
+# finished runs kept for resource_usage
+MAX_RUNS = int(os.environ.get("KALI_MCPS_USAGE_RUNS", "200"))
+
+# running processes are sampled this often
+SAMPLE_SECONDS = 0.5
+# seconds of CPU between the soft limit (SIGXCPU) and the hard one (SIGKILL)
+CPU_GRACE = 5
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="ascii") as f:
+            return [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return []
+
+
+def _io(pid: int) -> tuple[int, int]:
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "read_bytes":
+                    read_bytes = int(value)
+                elif key == "write_bytes":
+                    write_bytes = int(value)
+    except (OSError, ValueError):
+        pass
+    return read_bytes, write_bytes
+
+
+def process_usage(pid: int) -> Optional[dict]:
+    """
+    Resources used so far by a process and its children
+    CPU time includes children the process already waited for; memory is
+    the process's own peak plus its children's current size.
+    Returns:
+        {"rss", "user", "system", "read_bytes", "write_bytes"} in bytes and
+        seconds, or None once the process is gone
+    """
+    usage = {"rss": 0, "user": 0.0, "system": 0.0, "read_bytes": 0, "write_bytes": 0}
+    pids = [pid]
+    seen = set()
+    while pids:
+        current = pids.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status", "r", encoding="ascii", errors="replace") as f:
+                status = f.read()
+            with open(f"/proc/{current}/stat", "r", encoding="ascii", errors="replace") as f:
+                stat = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            if current == pid:
+                return None
+            continue
+        key = "VmHWM:" if current == pid else "VmRSS:"
+        for line in status.splitlines():
+            if line.startswith(key):
+                usage["rss"] += int(line.split()[1]) * 1024
+                break
+        # utime, stime, then cutime, cstime of waited-for children
+        usage["user"] += (int(stat[11]) + int(stat[13])) / _CLOCK_TICKS
+        usage["system"] += (int(stat[12]) + int(stat[14])) / _CLOCK_TICKS
+        read_bytes, write_bytes = _io(current)
+        usage["read_bytes"] += read_bytes
+        usage["write_bytes"] += write_bytes
+        pids.extend(_children(current))
+    return usage
+
+
+def child_limits(cpu_seconds: Optional[float], memory: Optional[int]) -> tuple[Optional[Callable[[], None]], dict]:
+    """
+    Limit the CPU time and data segment of a process from its first instruction on
+    The limits are set in the child between fork and exec; children it starts inherit them.
+    Returns:
+        (function to pass as preexec_fn, or None if there is nothing to limit,
+         the limits set, {"cpu": seconds, "memory": bytes})
+    """
+    limits = {}
+    rlimits = []
+    if resource is None:
+        return None, limits
+
+    def allowed(which: int, hard: int) -> bool:
+        # an unprivileged child cannot raise its hard limit above ours
+        own = resource.getrlimit(which)[1]
+        return own == resource.RLIM_INFINITY or hard <= own
+
+    if cpu_seconds:
+        soft = max(1, int(cpu_seconds + 0.999))
+        if allowed(resource.RLIMIT_CPU, soft + CPU_GRACE):
+            rlimits.append((resource.RLIMIT_CPU, (soft, soft + CPU_GRACE)))
+            limits["cpu"] = soft
+    if memory and allowed(resource.RLIMIT_DATA, memory):
+        rlimits.append((resource.RLIMIT_DATA, (memory, memory)))
+        limits["memory"] = memory
+    if not rlimits:
+        return None, limits
+
+    def preexec() -> None:
+        for which, values in rlimits:
+            resource.setrlimit(which, values)
+    return preexec, limits
+
+
+def kill_group(pid: int) -> None:
+    """Kill a process group; only call while its leader has not been waited for, so the id is not reused"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ProcessMonitor:
+    """Resources used by one direct process, sampled while it runs"""
+
+    def __init__(self, tool: str, pid: int, limits: dict):
+        self.tool = tool
+        self.pid = pid
+        self.limits = limits
+        self.started = time.monotonic()
+        self.peak_rss = 0
+        self.user = 0.0
+        self.system = 0.0
+        self.read_bytes = 0
+        self.write_bytes = 0
+
+    @property
+    def cpu_seconds(self) -> float:
+        return self.user + self.system
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def sample(self) -> bool:
+        """Read the process's current use; False once it is gone"""
+        return self.update(process_usage(self.pid))
+
+    def update(self, usage: Optional[dict]) -> bool:
+        if usage is None:
+            return False
+        # children come and go, the totals only grow
+        self.peak_rss = max(self.peak_rss, usage["rss"])
+        self.user = max(self.user, usage["user"])
+        self.system = max(self.system, usage["system"])
+        self.read_bytes = max(self.read_bytes, usage["read_bytes"])
+        self.write_bytes = max(self.write_bytes, usage["write_bytes"])
+        return True
+
+
+class UsageTracker:
+    """
+    Samples the direct tool processes that are running and keeps the
+    resource use of the last finished runs.
+
+    Listeners (admission control) are called after every sampling round.
+    """
+
+    def __init__(self, max_runs: int = MAX_RUNS):
+        self.running: list = []
+        self.runs: deque = deque(maxlen=max_runs)
+        self.listeners: list = []
+        self.totals: dict = {}
+        self._sampler: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        self.listeners.append(listener)
+
+    def start(self, tool: str, pid: int, limits: Optional[dict] = None) -> ProcessMonitor:
+        """Start sampling a process"""
+        monitor = ProcessMonitor(tool, pid, limits or {})
+        self.running.append(monitor)
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.ensure_future(self._sample())
+        return monitor
+
+    async def _sample(self) -> None:
+        while self.running:
+            await asyncio.sleep(SAMPLE_SECONDS)
+            for monitor in list(self.running):
+                usage = await asyncio.to_thread(process_usage, monitor.pid)
+                # a process finished meanwhile was already recorded, and its pid may be reused
+                if monitor in self.running:
+                    monitor.update(usage)
+            for listener in self.listeners:
+                listener()
+
+    def finish(self, monitor: ProcessMonitor, returncode: Optional[int], killed: Optional[str] = None) -> dict:
+        """
+        Stop sampling a process and record what it used
+        Args:
+            returncode: Exit code, negative for the signal that ended it
+            killed: Why the server killed it ('timeout', 'cancelled'), if it did
+        Returns:
+            The run's resource use
+        """
+        if monitor in self.running:
+            self.running.remove(monitor)
+        # SIGXCPU at the soft limit, SIGKILL at the hard one
+        if killed is None and monitor.limits.get("cpu") and (
+                returncode == -signal.SIGXCPU
+                or returncode == -signal.SIGKILL and monitor.cpu_seconds >= monitor.limits["cpu"]):
+            killed = "cpu_limit"
+        run = {
+            "tool": monitor.tool,
+            "pid": monitor.pid,
+            "finished": round(time.time(), 3),
+            "wall_seconds": round(monitor.elapsed, 3),
+            "cpu_user": round(monitor.user, 3),
+            "cpu_system": round(monitor.system, 3),
+            "max_rss": monitor.peak_rss,
+            "read_bytes": monitor.read_bytes,
+            "write_bytes": monitor.write_bytes,
+            "returncode": returncode,
+            "killed": killed,
+            "limits": monitor.limits,
+        }
+        self.runs.append(run)
+        totals = self.totals.setdefault(monitor.tool, {
+            "runs": 0, "killed": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_rss": 0,
+            "read_bytes": 0, "write_bytes": 0,
+        })
+        totals["runs"] += 1
+        totals["killed"] += killed is not None
+        totals["wall_seconds"] += monitor.elapsed
+        totals["cpu_seconds"] += monitor.cpu_seconds
+        totals["max_rss"] = max(totals["max_rss"], monitor.peak_rss)
+        totals["read_bytes"] += monitor.read_bytes
+        totals["write_bytes"] += monitor.write_bytes
+
+        CPU_SECONDS.inc(monitor.tool, "user", amount=monitor.user)
+        CPU_SECONDS.inc(monitor.tool, "system", amount=monitor.system)
+        IO_BYTES.inc(monitor.tool, "read", amount=monitor.read_bytes)
+        IO_BYTES.inc(monitor.tool, "write", amount=monitor.write_bytes)
+        if monitor.peak_rss:
+            PEAK_RSS_BYTES.observe(monitor.peak_rss, monitor.tool)
+        if killed:
+            PROCESSES_KILLED.inc(monitor.tool, killed)
+        return run
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self.running),
+            "runs": sum(totals["runs"] for totals in self.totals.values()),
+            "killed": sum(totals["killed"] for totals in self.totals.values()),
+        }
+
+    def describe(self, tool: str = "", limit: int = 50) -> dict:
+        """Totals per tool, the running processes and the last finished runs, newest first"""
+        runs = [run for run in reversed(self.runs) if not tool or run["tool"] == tool][:limit]
+        return {
+            **self.stats(),
+            "rlimits": RLIMITS,
+            "tools": {
+                name: {**totals, "wall_seconds": round(totals["wall_seconds"], 3),
+                       "cpu_seconds": round(totals["cpu_seconds"], 3)}
+                for name, totals in sorted(self.totals.items()) if not tool or name == tool
+            },
+            "running_processes": [
+                {"tool": monitor.tool, "pid": monitor.pid, "running": round(monitor.elapsed, 3),
+                 "cpu_seconds": round(monitor.cpu_seconds, 3), "max_rss": monitor.peak_rss,
+                 "limits": monitor.limits}
+                for monitor in self.running if not tool or monitor.tool == tool
+            ],
+            "recent_runs": runs,
+        }
+
+
+_usage_tracker: Optional[UsageTracker] = None
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Return the process-wide usage tracker"""
+    global _usage_tracker
+    if _usage_tracker is None:
+        _usage_tracker = UsageTracker()
+        get_metrics().register_stats("kali_mcps_usage", _usage_tracker.stats)
+    return _usage_tracker
@@ -0,0 +1,76 @@
+"""
+Process pool shared by the in-process analyses (strings extraction, batch analysis)
+"""
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _watch_server(server_pid: int) -> None:
+    # workers block on their call queue forever once the server is gone, and
+    # through them the forkserver would keep a stdio server's stdout open
+    def watch():
+        while True:
+            time.sleep(1)
+            try:
+                os.kill(server_pid, 0)
+            except ProcessLookupError:
+                os._exit(0)
+
+    threading.Thread(target=watch, name="server-watch", daemon=True).start()
+
+
+def get_worker_pool() -> ProcessPoolExecutor:
+    """Get the process-wide pool of one worker process per core"""
+    global _pool
+    if _pool is not None and _pool._broken:
+        # a worker died (crash, OOM kill); the executor refuses all further work
+        _discard(_pool)
+    if _pool is None:
+        # forkserver children do not inherit the server's threads or event loop
+        _pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_watch_server,
+            initargs=(os.getpid(),),
+        )
+    return _pool
+
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_pool(function: Callable[..., Any], *args) -> Any:
+    """
+    Run function(*args) on the worker pool
+    A pool broken by a worker that died is replaced and the call retried once.
+    Raises:
+        BrokenProcessPool: The worker died again, e.g. the input crashes it
+    """
+    for attempt in range(2):
+        pool = get_worker_pool()
+        try:
+            return await asyncio.wrap_future(pool.submit(function, *args))
+        except BrokenProcessPool:
+            _discard(pool)
+            if attempt:
+                raise
+
+
+def shutdown_worker_pool() -> None:
+    """Stop the worker processes, if the pool was ever started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
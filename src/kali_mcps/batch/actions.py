@@ -0,0 +1,218 @@
+"""
+Batch analysis: symbols, sections, headers and strings of many files in one call
+"""
+import os
+import glob
+import json
+import time
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.base.elf import native_elf
+from src.kali_mcps.base.workers import run_in_pool
+from src.kali_mcps.batch.analyzer import ANALYSES, analyze_file
+from src.kali_mcps.strings.actions import native_strings
+from src.sandbox import get_container_pool, shared_path
+
+MAX_FILES = int(os.environ.get("KALI_MCPS_BATCH_MAX_FILES", "1000"))
+# output of a fallback tool kept per file and analysis
+TOOL_OUTPUT_BYTES = 64 * 1024
+
+# analysis -> command run when the file cannot be analyzed in-process
+TOOL_COMMANDS = {
+    "headers": ["objdump", "-f"],
+    "sections": ["objdump", "-h"],
+    "symbols": ["nm"],
+    "strings": ["strings"],
+}
+
+class BatchCommand(CommandRunner):
+    # every call has its own file, nothing to share between callers
+    coalesce = False
+
+    def __init__(self, command_name: str):
+        super().__init__(command_name, network_enabled=False, memory_limit="1g", timeout=120)
+        self.max_output_bytes = TOOL_OUTPUT_BYTES
+
+
+def find_files(path: str, recursive: bool = True, max_files: int = MAX_FILES) -> tuple[list, bool]:
+    """
+    Regular files under a directory or matching a glob pattern, symlinked duplicates removed
+    Returns:
+        The files in sorted order and whether the list was cut at max_files
+    """
+    if os.path.isdir(path):
+        if recursive:
+            candidates = (os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            candidates = (os.path.join(path, name) for name in os.listdir(path))
+    else:
+        candidates = glob.iglob(path, recursive=recursive)
+
+    files = []
+    seen = set()
+    # real files first, so a symlinked duplicate is reported under the file's own name
+    for candidate in sorted(candidates, key=lambda candidate: (os.path.islink(candidate), candidate)):
+        if not os.path.isfile(candidate):
+            continue
+        # firmware trees link many names (busybox applets) to the same binary
+        real = os.path.realpath(candidate)
+        if real in seen:
+            continue
+        seen.add(real)
+        if len(files) == max_files:
+            return files, True
+        files.append(candidate)
+    return files, False
+
+
+class ToolFallback:
+    """
+    Runs nm/objdump/strings for files the in-process analysis cannot handle.
+
+    In safe mode all commands of a batch run in one sandbox container that
+    is checked out on first use and returned by close().
+    """
+
+    def __init__(self, min_length: int):
+        self.min_length = min_length
+        self.safe = os.environ.get("IS_SAFE", "false").lower() == "true"
+        self.semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        self.commands = 0
+        self._pooled = None
+        self._lock = asyncio.Lock()
+
+    async def _container(self, runner: CommandRunner):
+        async with self._lock:
+            if self._pooled is None:
+                self._pooled = await get_container_pool().checkout(runner.sandbox_settings())
+            return self._pooled
+
+    async def run_tools(self, index: int, path: str, commands: list,
+                        max_output_bytes: int = TOOL_OUTPUT_BYTES) -> list:
+        """
+        Run commands whose last argument is path, uploading the file once in safe mode
+        Args:
+            max_output_bytes: Output of each command kept
+        Returns:
+            [(stdout, stderr, complete), ...] in the order of commands
+        """
+        results = []
+        container_path, input_files = path, None
+        if self.safe:
+            container_path = shared_path(path)
+            if container_path is None:
+                # unique per file, several files of a batch may share a name
+                container_path = f"{get_container_pool().scratch_dir}/batch_{index}_{os.path.basename(path)}"
+                input_files = {path: container_path}
+        for command in commands:
+            runner = BatchCommand(command[0])
+            runner.max_output_bytes = max_output_bytes
+            async with self.semaphore:
+                self.commands += 1
+                if not self.safe:
+                    stdout, stderr = await runner.run_command(command)
+                else:
+                    pooled = await self._container(runner)
+                    stdout, stderr = await runner.run_with_sandbox(
+                        [*command[:-1], container_path], input_files, pooled=pooled
+                    )
+                    # uploaded with the first command
+                    input_files = None
+            results.append((stdout, stderr, runner.complete))
+        return results
+
+    async def run(self, index: int, path: str, analyses: list) -> dict:
+        """Run the tools for the given analyses of one file; returns {analysis: {tool, output, error}}"""
+        commands = []
+        for analysis in analyses:
+            command = [*TOOL_COMMANDS[analysis], path]
+            if analysis == "strings":
+                command[1:1] = ["-n", str(self.min_length)]
+            commands.append(command)
+        outputs = await self.run_tools(index, path, commands)
+        return {
+            analysis: {"tool": " ".join(command[:-1]), "output": stdout, "error": stderr, "truncated": not complete}
+            for analysis, command, (stdout, stderr, complete) in zip(analyses, commands, outputs)
+        }
+
+    async def close(self) -> None:
+        if self._pooled is not None:
+            await get_container_pool().checkin(self._pooled)
+            self._pooled = None
+
+
+async def batch_analyze_action(path: str, analyses: Optional[list] = None, recursive: bool = True,
+                               max_files: int = MAX_FILES, min_length: int = 4, max_items: int = 200,
+                               on_output: Optional[OutputCallback] = None) -> dict:
+    """
+    Analyze every file under a directory or matching a glob
+    ELF headers, sections and symbols and strings are read in-process on a
+    pool of one worker process per core; files or options the in-process
+    readers do not handle fall back to objdump, nm and strings.
+    on_output receives one JSON line per file as soon as it is analyzed
+    Args:
+        path: Directory, file or glob pattern (e.g. 'rootfs/**/*.so')
+        analyses: Any of 'headers', 'sections', 'symbols', 'strings' (default: all)
+        recursive: Descend into subdirectories / let '**' match across directories
+        max_files: Maximum number of files analyzed
+        min_length: Minimum string length
+        max_items: Maximum sections, symbols and strings listed per file
+    """
+    analyses = list(analyses or ANALYSES)
+    unknown = [analysis for analysis in analyses if analysis not in ANALYSES]
+    if unknown:
+        return {"error": f"unknown analyses {', '.join(unknown)}, expected any of {', '.join(ANALYSES)}"}
+    started = time.perf_counter()
+    files, truncated = await asyncio.to_thread(find_files, path, recursive, max_files)
+
+    fallback = ToolFallback(min_length)
+
+    async def analyze(index: int, file: str) -> dict:
+        try:
+            result = await run_in_pool(
+                analyze_file, file, tuple(analyses), min_length, max_items, native_elf(), native_strings()
+            )
+        except (OSError, BrokenProcessPool) as e:
+            return {"path": file, "error": str(e)}
+        pending = result.pop("fallback")
+        if pending:
+            result.update(await fallback.run(index, file, pending))
+        return result
+
+    results = []
+    errors = 0
+    try:
+        tasks = [asyncio.ensure_future(analyze(index, file)) for index, file in enumerate(files)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                errors += bool(result.get("error") or result.get("errors"))
+                results.append(result)
+                if on_output:
+                    await on_output(json.dumps(result) + "\n")
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        await fallback.close()
+
+    results.sort(key=lambda result: result["path"])
+    return {
+        "summary": {
+            "path": path,
+            "files": len(files),
+            "truncated": truncated,
+            "analyses": analyses,
+            "errors": errors,
+            "tool_runs": fallback.commands,
+            "elapsed": round(time.perf_counter() - started, 3),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    # Test example
+    print(json.dumps(asyncio.run(batch_analyze_action("/usr/bin/*", ["headers", "sections"], max_files=20))["summary"]))
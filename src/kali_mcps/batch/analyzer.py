@@ -0,0 +1,124 @@
+"""
+Per-file analysis run on the batch worker processes
+"""
+import os
+import mmap
+from dataclasses import asdict
+from src.kali_mcps.base.elf import ELFFile, ELFFormatError
+from src.kali_mcps.strings.extractor import MIN_CHUNK_SIZE, scan_range
+from src.kali_mcps.symbols.extract import is_elf
+
+ANALYSES = ("headers", "sections", "symbols", "strings")
+ELF_ANALYSES = ("headers", "sections", "symbols")
+
+ELF_TYPES = {0: "NONE", 1: "REL", 2: "EXEC", 3: "DYN", 4: "CORE"}
+MACHINES = {
+    3: "i386", 8: "mips", 20: "powerpc", 21: "powerpc64", 40: "arm", 42: "superh",
+    62: "x86-64", 183: "aarch64", 243: "riscv",
+}
+
+
+def _headers(elf: ELFFile) -> dict:
+    header = elf.header
+    return {
+        "class": 64 if elf.is_64 else 32,
+        "endian": elf.endian,
+        "type": ELF_TYPES.get(header.type, header.type),
+        "machine": MACHINES.get(header.machine, header.machine),
+        "entry": header.entry,
+        "osabi": header.osabi,
+        "flags": header.flags,
+        "segments": len(elf.segments),
+        "sections": len(elf.sections),
+    }
+
+
+def _sections(elf: ELFFile, max_items: int) -> dict:
+    sections = [section for section in elf.sections if section.index and section.name]
+    return {"count": len(sections), "items": [asdict(section) for section in sections[:max_items]]}
+
+
+def _symbols(elf: ELFFile, max_items: int) -> dict:
+    symbols = [symbol for symbol in elf.symbols if symbol.name]
+    dynamic = [symbol for symbol in elf.dynamic_symbols if symbol.name]
+    undefined = sorted({symbol.name for symbol in (*symbols, *dynamic) if symbol.is_undefined})
+    defined = [symbol for symbol in symbols or dynamic if not symbol.is_undefined]
+    return {
+        "count": len(symbols),
+        "dynamic_count": len(dynamic),
+        "stripped": not symbols,
+        "defined": [asdict(symbol) for symbol in defined[:max_items]],
+        "undefined": undefined[:max_items],
+    }
+
+
+def _strings(path: str, size: int, min_length: int, max_items: int) -> dict:
+    count = 0
+    items = []
+    if size:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # scanned in ranges so a large file is never translated in one piece
+                for start in range(0, size, MIN_CHUNK_SIZE):
+                    found = scan_range(data, start, min(start + MIN_CHUNK_SIZE, size), ("s",), min_length)["s"]
+                    count += len(found)
+                    for offset, raw in found[:max(0, max_items - len(items))]:
+                        items.append({"offset": offset, "string": raw.decode("utf-8", errors="replace")})
+    return {"count": count, "items": items}
+
+
+def analyze_file(path: str, analyses: tuple, min_length: int = 4, max_items: int = 200,
+                 native_elf: bool = True, native_strings: bool = True) -> dict:
+    """
+    Analyze one file in-process
+    Args:
+        path: File to analyze
+        analyses: Names from ANALYSES
+        min_length: Minimum string length
+        max_items: Maximum sections, symbols and strings listed per file
+        native_elf: Parse ELF files in-process instead of leaving them to nm/objdump
+        native_strings: Extract strings in-process instead of leaving them to strings
+    Returns:
+        The results by analysis, plus "fallback": analyses the tools have to run
+    """
+    result = {"path": path, "size": os.path.getsize(path)}
+    fallback = []
+    elf = None
+    if any(analysis in ELF_ANALYSES for analysis in analyses):
+        # only the magic is read here, so this holds with native parsing off as well
+        result["format"] = "elf" if is_elf(path) else "other"
+        if native_elf and result["format"] == "elf":
+            try:
+                elf = ELFFile(path)
+            except ELFFormatError:
+                pass
+
+    try:
+        for analysis in analyses:
+            if analysis == "strings":
+                if native_strings:
+                    result["strings"] = _strings(path, result["size"], min_length, max_items)
+                else:
+                    fallback.append(analysis)
+                continue
+            if result["format"] == "other":
+                # headers, sections and symbols are only read from ELF files
+                continue
+            if elf is None:
+                # native parsing is off, or the reader rejected the file: objdump/nm may still read it
+                fallback.append(analysis)
+                continue
+            try:
+                if analysis == "headers":
+                    result["headers"] = _headers(elf)
+                elif analysis == "sections":
+                    result["sections"] = _sections(elf, max_items)
+                else:
+                    result["symbols"] = _symbols(elf, max_items)
+            except ELFFormatError as e:
+                result.setdefault("errors", {})[analysis] = str(e)
+    finally:
+        if elf is not None:
+            elf.close()
+    result["fallback"] = fallback
+    return result
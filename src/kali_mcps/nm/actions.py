@@ -1,65 +1,87 @@
 import asyncio
 from src.kali_mcps.base.kali_command import CommandRunner
+from src.kali_mcps.base.elf import try_native
+from src.kali_mcps.nm.native import render_nm
 
 class NmCommand(CommandRunner):
+    cacheable = True
+
     def __init__(self):
         super().__init__("nm", network_enabled=False, memory_limit="1g", timeout=120)
 
-def basic_symbols_action(target: str) -> tuple[str, str]:
+async def basic_symbols_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Basic symbol listing
     For example: nm /path/to/file
     """ 
+    result = await asyncio.to_thread(try_native, render_nm, target)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def dynamic_symbols_action(target: str) -> tuple[str, str]:
+async def dynamic_symbols_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Display dynamic symbols
     For example: nm -D /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_nm, target, dynamic=True)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", "-D", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def demangle_symbols_action(target: str) -> tuple[str, str]:
+async def demangle_symbols_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Demangle C++ symbols
     For example: nm -C /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_nm, target, demangle=True)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", "-C", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def numeric_sort_action(target: str) -> tuple[str, str]:
+async def numeric_sort_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Sort symbols numerically by address
     For example: nm -n /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_nm, target, numeric_sort=True)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", "-n", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def size_sort_action(target: str) -> tuple[str, str]:
+async def size_sort_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Sort symbols by size
     For example: nm -S /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_nm, target, print_size=True)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", "-S", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def undefined_symbols_action(target: str) -> tuple[str, str]:
+async def undefined_symbols_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Display only undefined symbols
     For example: nm -u /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_nm, target, undefined_only=True)
+    if result is not None:
+        return result
     cmd = NmCommand()
     command = ["nm", "-u", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
 if __name__ == "__main__":
     # Test example
     target_file = "/bin/ls"
-    print(basic_symbols_action(target_file))
+    print(asyncio.run(basic_symbols_action(target_file)))
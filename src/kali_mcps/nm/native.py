@@ -0,0 +1,121 @@
+"""
+nm-compatible listings rendered from the in-process ELF reader
+"""
+import os
+from src.kali_mcps.base.elf import (
+    ELFFile, ELFFormatError, Symbol, EM_386, EM_X86_64,
+    SHT_NOBITS, SHF_ALLOC, SHF_WRITE, SHF_EXECINSTR,
+    STB_LOCAL, STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE,
+    STT_OBJECT, STT_COMMON, STT_SECTION, STT_FILE, STT_GNU_IFUNC,
+)
+
+# machines the native binutils of the image understand
+SUPPORTED_MACHINES = {(64, EM_X86_64), (32, EM_386)}
+
+
+def check_supported(elf: ELFFile) -> None:
+    """Raise ELFFormatError unless the output can be reproduced exactly"""
+    if (elf.header.elf_class, elf.header.machine) not in SUPPORTED_MACHINES:
+        raise ELFFormatError("machine not handled natively")
+    # nm sorts with strcoll(); only the C locale collates bytewise
+    locale = os.environ.get("LC_ALL") or os.environ.get("LC_COLLATE") or os.environ.get("LANG") or "C"
+    if locale not in ("C", "POSIX") and not locale.startswith("C."):
+        raise ELFFormatError(f"locale {locale} collates differently")
+
+
+def is_debugging(symbol: Symbol) -> bool:
+    return symbol.type in (STT_SECTION, STT_FILE)
+
+
+def section_letter(elf: ELFFile, symbol: Symbol) -> str:
+    """Lower-case type letter derived from the flags of the symbol's section"""
+    section = elf.sections[symbol.shndx]
+    if section.name.startswith((".drectve", ".idata")):
+        return "i"
+    if section.name.startswith(".edata"):
+        return "e"
+    if section.name.startswith(".pdata"):
+        return "p"
+    if section.flags & SHF_EXECINSTR:
+        return "t"
+    has_contents = section.type != SHT_NOBITS
+    if section.flags & SHF_ALLOC and has_contents:
+        return "d" if section.flags & SHF_WRITE else "r"
+    if not has_contents:
+        return "b"
+    if not section.flags & SHF_ALLOC and section.name.startswith(
+        (".debug", ".gnu.debuglto_.debug_", ".gnu.linkonce.wi.", ".zdebug", ".line", ".stab", ".gdb_index")
+    ):
+        return "N"
+    if not section.flags & SHF_WRITE:
+        return "n"
+    return "?"
+
+
+def symbol_letter(elf: ELFFile, symbol: Symbol) -> str:
+    """Type letter as printed by nm"""
+    is_object = symbol.type in (STT_OBJECT, STT_COMMON)
+    if symbol.is_common:
+        return "C"
+    if symbol.is_undefined:
+        if symbol.bind == STB_WEAK:
+            return "v" if is_object else "w"
+        return "U"
+    if symbol.type == STT_GNU_IFUNC:
+        return "i"
+    if symbol.bind == STB_WEAK:
+        return "V" if is_object else "W"
+    if symbol.bind == STB_GNU_UNIQUE:
+        return "u"
+    if symbol.bind not in (STB_LOCAL, STB_GLOBAL):
+        return "?"
+    letter = "a" if symbol.is_absolute else section_letter(elf, symbol)
+    return letter.upper() if symbol.bind == STB_GLOBAL else letter
+
+
+def symbol_name(symbol: Symbol, dynamic: bool) -> str:
+    """Name with the @/@@ version suffix nm adds to dynamic symbols"""
+    if not dynamic or not symbol.version:
+        return symbol.name
+    at = "@" if symbol.version_hidden or symbol.is_undefined else "@@"
+    return f"{symbol.name}{at}{symbol.version}"
+
+
+def render_nm(elf: ELFFile, target: str, dynamic: bool = False, numeric_sort: bool = False,
+              print_size: bool = False, undefined_only: bool = False,
+              demangle: bool = False) -> tuple[str, str]:
+    """
+    Render the listing `nm [-D] [-n] [-S] [-u] [-C] target` would print
+    Returns:
+        (stdout, stderr) like CommandRunner.execute
+    """
+    check_supported(elf)
+    symbols = elf.dynamic_symbols if dynamic else elf.symbols
+    if not symbols:
+        return "", f"nm: {target}: no symbols\n"
+    if demangle and any(s.name.startswith(("_Z", "_GLOBAL_")) for s in symbols):
+        # only names the demangler leaves untouched can be rendered here
+        raise ELFFormatError("mangled names need the demangler")
+
+    symbols = [s for s in symbols if not is_debugging(s)]
+    if undefined_only:
+        symbols = [s for s in symbols if s.is_undefined]
+
+    encoded = {id(s): s.name.encode("utf-8", errors="surrogateescape") for s in symbols}
+    if numeric_sort:
+        symbols.sort(key=lambda s: (not s.is_undefined, 0 if s.is_undefined else s.value, encoded[id(s)]))
+    else:
+        symbols.sort(key=lambda s: encoded[id(s)])
+
+    width = 16 if elf.is_64 else 8
+    blank = " " * width
+    lines = []
+    for symbol in symbols:
+        letter = symbol_letter(elf, symbol)
+        if letter in ("U", "w", "v"):
+            value = blank
+        else:
+            value = f"{symbol.size if symbol.is_common else symbol.value:0{width}x}"
+        size = f"{symbol.size:0{width}x} " if print_size and symbol.size and letter not in ("U", "w", "v") else ""
+        lines.append(f"{value} {size}{letter} {symbol_name(symbol, dynamic)}\n")
+    return "".join(lines), ""
@@ -1,59 +1,206 @@
+import os
+import time
 import asyncio
-from src.kali_mcps.base.kali_command import CommandRunner
+from typing import Optional, Union
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.nmap.parser import render_host, render_text
+from src.kali_mcps.nmap.scheduler import get_scan_scheduler, expand_targets, compact_targets, split_targets
+from src.kali_mcps.nmap.store import get_scan_store
+
+ScanResult = Union[dict, tuple[str, str]]
+
+# how long a stored observation is reused by incremental scans, in seconds
+SCAN_TTL = int(os.environ.get("KALI_MCPS_SCAN_TTL", "3600"))
 
 class NmapCommand(CommandRunner):
+    remote = True
+    # the XML is consumed by the streaming parser, the raw text is not kept
+    max_output_bytes = 64 * 1024
+
     def __init__(self):
         super().__init__("nmap", 
                         network_enabled=True,  # nmap需要网络访问
                         memory_limit="2g",     # 需要更多内存
                         timeout=300)           # 需要更长的超时时间
 
-def basic_scan_action(target: str) -> tuple[str, str]:
+# scan type -> nmap options
+SCAN_OPTIONS = {
+    "basic": [],
+    "intense": ["-T4", "-A"],
+    "stealth": ["-sS"],
+    "quick": ["-T4", "-F"],
+    "vulnerability": ["-sV", "--script", "vuln"],
+    "discovery": ["-sn"],
+}
+
+async def scan_and_record(scan_type: str, target: str, shard_size: Optional[int] = None,
+                          on_output: Optional[OutputCallback] = None) -> tuple[dict, str]:
+    """Run a scan through the scheduler and record the result in the scan store"""
+    started = time.time()
+    report, stderr = await get_scan_scheduler().scan(NmapCommand, SCAN_OPTIONS[scan_type], target,
+                                                     shard_size=shard_size, on_output=on_output)
+    get_scan_store().record_run(scan_type, target, report, started)
+    return report, stderr
+
+async def incremental_scan(scan_type: str, target: str, ttl: int = SCAN_TTL,
+                           shard_size: Optional[int] = None,
+                           on_output: Optional[OutputCallback] = None) -> tuple[dict, str]:
+    """
+    Re-probe only hosts whose last observation is stale or that changed
+    A ping sweep (-sn) first finds the hosts that are up. Hosts scanned by
+    this scan type less than ttl seconds ago are reused from the store,
+    unless the sweep shows they came back up or their MAC address changed.
+    Raises:
+        ValueError: The target specification contains an nmap option
+    """
+    # checked here too, the fallback below passes the raw target on
+    split_targets(target)
+    try:
+        targets = expand_targets(target)
+    except ValueError:
+        return await scan_and_record(scan_type, target, shard_size, on_output)
+
+    started = time.monotonic()
+    store = get_scan_store()
+    previous = store.latest(targets, "discovery")
+    discovery, discovery_errors = await scan_and_record("discovery", target, shard_size)
+    up = {host["address"]: host for host in discovery["hosts"] if host.get("state") == "up"}
+    known = store.latest(list(up), scan_type)
+
+    now = time.time()
+    stale = []
+    reused = []
+    for address, host in up.items():
+        before = previous.get(address)
+        changed = before is not None and (
+            before[1].get("state") != "up" or before[1].get("mac") != host.get("mac")
+        )
+        last = known.get(address)
+        if last is not None and now - last[0] <= ttl and not changed:
+            reused.append(dict(last[1], observed=last[0]))
+        else:
+            stale.append(address)
+
+    hosts = list(reused)
+    errors = [discovery_errors] if discovery_errors else []
+    scan = discovery["scan"]
+    order = {address: index for index, address in enumerate(targets)}
+    if stale:
+        stale.sort(key=lambda address: order.get(address, len(order)))
+        report, stderr = await scan_and_record(scan_type, " ".join(compact_targets(stale)),
+                                               shard_size, on_output)
+        hosts.extend(report["hosts"])
+        scan = report["scan"]
+        if stderr:
+            errors.append(stderr)
+    if on_output:
+        for host in reused:
+            await on_output(render_host(host))
+
+    hosts.sort(key=lambda host: order.get(host.get("address"), len(order)))
+    summary = {
+        "up": len(up),
+        "down": len(targets) - len(up),
+        "total": len(targets),
+        "elapsed": round(time.monotonic() - started, 2),
+        "exit": "error" if errors else "success",
+        "rescanned": len(stale),
+        "reused": len(reused),
+    }
+    return {"scan": scan, "hosts": hosts, "summary": summary}, "\n".join(errors)
+
+async def run_scan(scan_type: str, target: str, format: str = "structured",
+                   shard_size: Optional[int] = None, incremental: bool = False,
+                   ttl: int = SCAN_TTL, on_output: Optional[OutputCallback] = None) -> ScanResult:
+    """
+    Run a scan through the scheduler, which shards large target ranges
+    Args:
+        scan_type: Key of SCAN_OPTIONS
+        target: nmap target specification
+        format: 'structured' for host/port records, 'text' for nmap-style text
+        shard_size: Addresses per nmap process (default: KALI_MCPS_NMAP_SHARD_SIZE)
+        incremental: Reuse stored results of hosts scanned within ttl seconds
+        ttl: Maximum age of reused results, in seconds
+        on_output: Coroutine called with each host rendered as text as soon as it is parsed
+    Returns:
+        {"scan", "hosts", "summary", "errors"} or (stdout, stderr) for format='text'
+    """
+    if scan_type not in SCAN_OPTIONS:
+        return "", f"unknown scan type {scan_type!r}, expected one of {', '.join(SCAN_OPTIONS)}"
+    if format not in ("structured", "text"):
+        return "", f"unknown format {format!r}, expected 'structured' or 'text'"
+    try:
+        split_targets(target)
+    except ValueError as e:
+        return "", str(e)
+    if incremental:
+        report, stderr = await incremental_scan(scan_type, target, ttl, shard_size, on_output)
+    else:
+        report, stderr = await scan_and_record(scan_type, target, shard_size, on_output)
+    if format == "text":
+        return render_text(report), stderr
+    if stderr:
+        report["errors"] = stderr
+    return report
+
+async def basic_scan_action(target: str, format: str = "structured", incremental: bool = False,
+                            ttl: int = SCAN_TTL) -> ScanResult:
     """
     Basic scan
     For example: nmap 192.168.1.1
     """
-    cmd = NmapCommand()
-    command = ["nmap", target]
-    return cmd.execute(command)
+    return await run_scan("basic", target, format, incremental=incremental, ttl=ttl)
 
-def intense_scan_action(target: str) -> tuple[str, str]:
+async def intense_scan_action(target: str, format: str = "structured", incremental: bool = False,
+                              ttl: int = SCAN_TTL) -> ScanResult:
     """
     Intense scan (-T4 -A)
     Includes: OS detection, version detection, script scanning, and traceroute
     """
-    cmd = NmapCommand()
-    command = ["nmap", "-T4", "-A", target]
-    return cmd.execute(command)
+    return await run_scan("intense", target, format, incremental=incremental, ttl=ttl)
 
-def stealth_scan_action(target: str) -> tuple[str, str]:
+async def stealth_scan_action(target: str, format: str = "structured", incremental: bool = False,
+                              ttl: int = SCAN_TTL) -> ScanResult:
     """
     SYN scan (-sS)
     Half-open scan, more stealthy
     Requires root privileges
     """
-    cmd = NmapCommand()
-    command = ["nmap", "-sS", target]
-    return cmd.execute(command)
+    return await run_scan("stealth", target, format, incremental=incremental, ttl=ttl)
 
-def quick_scan_action(target: str) -> tuple[str, str]:
+async def quick_scan_action(target: str, format: str = "structured", incremental: bool = False,
+                            ttl: int = SCAN_TTL) -> ScanResult:
     """
     Quick scan (-T4 -F)
     Only scans the most common ports
     """
-    cmd = NmapCommand()
-    command = ["nmap", "-T4", "-F", target]
-    return cmd.execute(command)
+    return await run_scan("quick", target, format, incremental=incremental, ttl=ttl)
 
-def vulnerability_scan_action(target: str) -> tuple[str, str]:
+async def vulnerability_scan_action(target: str, format: str = "structured", incremental: bool = False,
+                                    ttl: int = SCAN_TTL) -> ScanResult:
     """
     Vulnerability scan (-sV --script vuln)
     Uses vulnerability detection scripts
     """
-    cmd = NmapCommand()
-    command = ["nmap", "-sV", "--script", "vuln", target]
-    return cmd.execute(command)
+    return await run_scan("vulnerability", target, format, incremental=incremental, ttl=ttl)
+
+async def sharded_scan_action(target: str, scan_type: str = "quick", shard_size: int = 256,
+                              format: str = "structured", incremental: bool = False,
+                              ttl: int = SCAN_TTL,
+                              on_output: Optional[OutputCallback] = None) -> ScanResult:
+    """
+    Scan a large target range as shards on parallel nmap workers
+    For example: nmap -T4 -F 10.0.0.0/16, run as 256 scans of one /24 each
+    """
+    return await run_scan(scan_type, target, format, shard_size=shard_size,
+                          incremental=incremental, ttl=ttl, on_output=on_output)
+
+async def scan_history_action(address: str, limit: int = 20) -> list[dict]:
+    """
+    Stored observations of one host, newest first
+    """
+    return get_scan_store().history(address, limit)
 
 if __name__ == "__main__":
     # Test example
-    print(quick_scan_action("10.1.1.106"))
+    print(asyncio.run(quick_scan_action("10.1.1.106")))
@@ -0,0 +1,260 @@
+"""
+Incremental parser turning nmap XML output (-oX -) into compact records
+"""
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _compact(record: dict) -> dict:
+    """Drop empty fields so large sweeps stay small"""
+    return {key: value for key, value in record.items() if value not in (None, "", [], {})}
+
+
+def _scripts(elem: ET.Element) -> list:
+    return [
+        {"id": script.get("id"), "output": (script.get("output") or "").strip("\n").rstrip()}
+        for script in elem.findall("script")
+    ]
+
+
+def parse_port(elem: ET.Element) -> dict:
+    state = elem.find("state")
+    service = elem.find("service")
+    record = {
+        "port": _int(elem.get("portid")),
+        "protocol": elem.get("protocol"),
+        "state": state.get("state") if state is not None else None,
+        "reason": state.get("reason") if state is not None else None,
+    }
+    if service is not None:
+        record.update({
+            "service": service.get("name"),
+            "product": service.get("product"),
+            "version": service.get("version"),
+            "extrainfo": service.get("extrainfo"),
+            "tunnel": service.get("tunnel"),
+        })
+    record["scripts"] = _scripts(elem)
+    return _compact(record)
+
+
+def parse_host(elem: ET.Element) -> dict:
+    """Convert a <host> element into a host record"""
+    status = elem.find("status")
+    record = {"address": None, "mac": None, "vendor": None}
+    for address in elem.findall("address"):
+        if address.get("addrtype") == "mac":
+            record["mac"] = address.get("addr")
+            record["vendor"] = address.get("vendor")
+        elif record["address"] is None:
+            record["address"] = address.get("addr")
+    record["hostnames"] = [
+        hostname.get("name") for hostname in elem.findall("hostnames/hostname")
+        if hostname.get("type") == "user"
+    ] or [hostname.get("name") for hostname in elem.findall("hostnames/hostname")]
+    record["state"] = status.get("state") if status is not None else None
+    times = elem.find("times")
+    if times is not None and _int(times.get("srtt")) is not None:
+        record["latency"] = _int(times.get("srtt")) / 1e6
+    ports = elem.find("ports")
+    if ports is not None:
+        record["ports"] = [parse_port(port) for port in ports.findall("port")]
+        record["extraports"] = [
+            _compact({
+                "state": extra.get("state"),
+                "count": _int(extra.get("count")),
+                "reasons": ", ".join(r.get("reason", "") for r in extra.findall("extrareasons")),
+                "protocol": next((r.get("proto") for r in extra.findall("extrareasons") if r.get("proto")), None),
+            })
+            for extra in ports.findall("extraports")
+        ]
+    record["os"] = [
+        {"name": match.get("name"), "accuracy": _int(match.get("accuracy"))}
+        for match in elem.findall("os/osmatch")
+    ]
+    hostscript = elem.find("hostscript")
+    record["scripts"] = _scripts(hostscript) if hostscript is not None else []
+    return _compact(record)
+
+
+class NmapXmlParser:
+    """
+    Parse nmap XML output as it arrives.
+
+    Each <host> element is converted into a record and dropped from the
+    tree as soon as it is complete, so memory stays flat on large sweeps.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+        self.scan: dict = {}
+        self.hosts: list = []
+        self.summary: dict = {}
+        self.error: Optional[str] = None
+
+    def feed(self, data: str) -> list:
+        """
+        Feed a chunk of XML
+        Returns:
+            Host records completed by this chunk
+        """
+        if self.error:
+            return []
+        completed = []
+        try:
+            self._parser.feed(data)
+            for event, elem in self._parser.read_events():
+                if event == "start":
+                    if elem.tag == "nmaprun" and self._root is None:
+                        self._root = elem
+                        self.scan = _compact({
+                            "command": elem.get("args"),
+                            "version": elem.get("version"),
+                            "start": _int(elem.get("start")),
+                        })
+                    continue
+                if elem.tag == "host":
+                    host = parse_host(elem)
+                    self.hosts.append(host)
+                    completed.append(host)
+                elif elem.tag == "runstats":
+                    finished = elem.find("finished")
+                    hosts = elem.find("hosts")
+                    self.summary = _compact({
+                        "up": _int(hosts.get("up")) if hosts is not None else None,
+                        "down": _int(hosts.get("down")) if hosts is not None else None,
+                        "total": _int(hosts.get("total")) if hosts is not None else None,
+                        "elapsed": float(finished.get("elapsed", 0)) if finished is not None else None,
+                        "exit": finished.get("exit") if finished is not None else None,
+                        "error": finished.get("errormsg") if finished is not None else None,
+                    })
+                # finished direct children are not needed anymore
+                if self._root is not None and elem in self._root:
+                    self._root.remove(elem)
+        except ET.ParseError as e:
+            self.error = f"invalid nmap XML output: {e}"
+        return completed
+
+    @property
+    def finished(self) -> bool:
+        """True once nmap reported a successful end of the run"""
+        return self.summary.get("exit") == "success"
+
+    def report(self) -> dict:
+        """The structured report collected so far"""
+        return {"scan": self.scan, "hosts": self.hosts, "summary": self.summary}
+
+
+def parse_xml(data: str) -> dict:
+    """Parse a complete nmap XML document"""
+    parser = NmapXmlParser()
+    parser.feed(data)
+    return parser.report()
+
+
+def merge_reports(reports: list[dict], elapsed: float, command: Optional[str] = None) -> dict:
+    """
+    Merge the reports of several nmap runs into one
+    Args:
+        reports: Reports in target order
+        elapsed: Wall-clock time of the whole sweep
+        command: Command line describing the whole sweep
+    """
+    scan = dict(reports[0]["scan"]) if reports else {}
+    if command:
+        scan["command"] = command
+    summary = {"up": 0, "down": 0, "total": 0}
+    hosts = []
+    for report in reports:
+        hosts.extend(report["hosts"])
+        for key in summary:
+            summary[key] += report["summary"].get(key, 0)
+    summary["elapsed"] = round(elapsed, 2)
+    summary["exit"] = "success" if all(r["summary"].get("exit") == "success" for r in reports) else "error"
+    return {"scan": scan, "hosts": hosts, "summary": summary}
+
+
+def _port_line_fields(port: dict) -> list:
+    version = " ".join(port.get(key, "") for key in ("product", "version") if port.get(key))
+    if port.get("extrainfo"):
+        version = f"{version} ({port['extrainfo']})".strip()
+    service = port.get("service", "unknown")
+    if port.get("tunnel"):
+        service = f"{port['tunnel']}/{service}"
+    return [f"{port.get('port')}/{port.get('protocol')}", port.get("state", ""), service, version]
+
+
+def _script_lines(scripts: list) -> list:
+    lines = []
+    for script in scripts:
+        output = script["output"].split("\n") if script.get("output") else [""]
+        if len(output) == 1:
+            lines.append(f"|_{script['id']}: {output[0]}")
+            continue
+        lines.append(f"| {script['id']}: ")
+        lines.extend(f"|{line}" for line in output[:-1])
+        lines.append(f"|_{output[-1]}")
+    return lines
+
+
+def render_host(host: dict) -> str:
+    """Render one host record the way nmap's normal output shows it"""
+    name = host.get("address", "")
+    if host.get("hostnames"):
+        name = f"{host['hostnames'][0]} ({host.get('address', '')})"
+    lines = [f"Nmap scan report for {name}"]
+    if host.get("state") == "up":
+        latency = f" ({host['latency']:.2g}s latency)" if "latency" in host else ""
+        lines.append(f"Host is up{latency}.")
+    elif host.get("state"):
+        lines.append(f"Host is {host['state']}.")
+    for extra in host.get("extraports", []):
+        reasons = f" ({extra['reasons']})" if extra.get("reasons") else ""
+        protocol = f" {extra['protocol']}" if extra.get("protocol") else ""
+        lines.append(f"Not shown: {extra.get('count')} {extra.get('state')}{protocol} ports{reasons}")
+    ports = host.get("ports", [])
+    if ports:
+        rows = [["PORT", "STATE", "SERVICE", "VERSION"]] + [_port_line_fields(port) for port in ports]
+        show_version = any(row[3] for row in rows[1:])
+        columns = 4 if show_version else 3
+        widths = [max(len(row[i]) for row in rows) for i in range(columns - 1)]
+        for row, port in zip(rows, [None] + ports):
+            cells = [row[i].ljust(widths[i]) for i in range(columns - 1)] + [row[columns - 1]]
+            lines.append(" ".join(cells).rstrip())
+            if port:
+                lines.extend(_script_lines(port.get("scripts", [])))
+    elif host.get("state") == "up" and "extraports" in host:
+        lines.append("All scanned ports are filtered or closed.")
+    if host.get("mac"):
+        vendor = f" ({host['vendor']})" if host.get("vendor") else ""
+        lines.append(f"MAC Address: {host['mac']}{vendor}")
+    if host.get("os"):
+        lines.append("OS details: " + ", ".join(match["name"] for match in host["os"][:3]))
+    if host.get("scripts"):
+        lines.append("")
+        lines.append("Host script results:")
+        lines.extend(_script_lines(host["scripts"]))
+    return "\n".join(lines) + "\n\n"
+
+
+def render_text(report: dict) -> str:
+    """Render a structured report as nmap-style text"""
+    scan = report.get("scan", {})
+    summary = report.get("summary", {})
+    lines = [f"Starting Nmap {scan.get('version', '')} ( https://nmap.org )\n"]
+    lines.extend(render_host(host) for host in report.get("hosts", []))
+    total = summary.get("total", 0)
+    up = summary.get("up", 0)
+    lines.append(
+        f"Nmap done: {total} IP address{'' if total == 1 else 'es'} "
+        f"({up} host{'' if up == 1 else 's'} up) scanned in {summary.get('elapsed', 0):.2f} seconds\n"
+    )
+    return "".join(lines)
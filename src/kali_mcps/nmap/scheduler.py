@@ -0,0 +1,319 @@
+"""
+Split large nmap target ranges into shards and scan them on a bounded worker pool
+"""
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import ipaddress
+from dataclasses import dataclass
+from typing import Callable, Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.nmap.parser import NmapXmlParser, merge_reports, render_host
+from src.metrics import QUEUE_WAIT_SECONDS
+
+SCAN_DIR = os.environ.get(
+    "KALI_MCPS_SCAN_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "scans")
+)
+
+# refuse to expand target specifications beyond this many addresses
+MAX_TARGETS = 1 << 20
+
+
+def _expand_octet(spec: str) -> list[int]:
+    values = []
+    for part in spec.split(","):
+        if part == "*":
+            part = "0-255"
+        if "-" in part:
+            low, high = part.split("-", 1)
+            low = int(low) if low else 0
+            high = int(high) if high else 255
+        else:
+            low = high = int(part)
+        if not 0 <= low <= high <= 255:
+            raise ValueError(f"invalid octet range {spec!r}")
+        values.extend(range(low, high + 1))
+    return values
+
+
+def _expand_one(spec: str) -> list[str]:
+    """Expand a single nmap target specification into addresses"""
+    if "/" in spec:
+        try:
+            network = ipaddress.ip_network(spec, strict=False)
+        except ValueError:
+            raise ValueError(f"cannot shard {spec!r}: only IP networks can be expanded")
+        if network.num_addresses > MAX_TARGETS:
+            raise ValueError(f"{spec} has more than {MAX_TARGETS} addresses")
+        return [str(address) for address in network]
+
+    octets = spec.split(".")
+    if len(octets) == 4 and all(re.fullmatch(r"[\d,*-]+", octet) for octet in octets):
+        ranges = [_expand_octet(octet) for octet in octets]
+        total = len(ranges[0]) * len(ranges[1]) * len(ranges[2]) * len(ranges[3])
+        if total > MAX_TARGETS:
+            raise ValueError(f"{spec} has more than {MAX_TARGETS} addresses")
+        return [f"{a}.{b}.{c}.{d}" for a in ranges[0] for b in ranges[1] for c in ranges[2] for d in ranges[3]]
+
+    # host names and single IPv6 addresses are scanned as given
+    return [spec]
+
+
+def split_targets(target: str) -> list[str]:
+    """
+    Split a target specification into the arguments passed to nmap
+    Raises:
+        ValueError: A token starts with '-' and would be read as an nmap option
+    """
+    tokens = target.split()
+    options = [token for token in tokens if token.startswith("-")]
+    if options:
+        raise ValueError(f"invalid target {options[0]!r}: targets must not start with '-'")
+    return tokens
+
+
+def expand_targets(target: str) -> list[str]:
+    """
+    Expand CIDR blocks and octet ranges into individual targets
+    Args:
+        target: Whitespace or comma separated nmap target specifications,
+            e.g. "10.0.0.0/16", "192.168.1-3.1-254", "scanme.nmap.org"
+    Returns:
+        Targets in the order given, duplicates removed
+    """
+    seen = {}
+    for spec in re.split(r"\s+", target.strip()):
+        if not spec:
+            continue
+        # commas separate targets unless they are part of an octet list
+        specs = [spec] if re.fullmatch(r"[\d.,*-]+", spec) else spec.split(",")
+        for item in specs:
+            for address in _expand_one(item):
+                seen.setdefault(address, None)
+            if len(seen) > MAX_TARGETS:
+                raise ValueError(f"more than {MAX_TARGETS} targets")
+    return list(seen)
+
+
+def compact_targets(targets: list[str]) -> list[str]:
+    """Collapse runs of consecutive IPv4 addresses back into CIDR blocks"""
+    compacted = []
+    run = []
+
+    def flush():
+        if run:
+            compacted.extend(str(net) for net in ipaddress.summarize_address_range(run[0], run[-1]))
+            run.clear()
+
+    for target in targets:
+        try:
+            address = ipaddress.IPv4Address(target)
+        except ValueError:
+            flush()
+            compacted.append(target)
+            continue
+        if run and int(address) != int(run[-1]) + 1:
+            flush()
+        run.append(address)
+    flush()
+    return compacted
+
+
+@dataclass
+class Shard:
+    """A slice of the target list scanned by one nmap process"""
+    index: int
+    targets: list
+    hosts: int
+
+
+def shard_targets(targets: list[str], shard_size: int) -> list[Shard]:
+    """Split targets into shards of at most shard_size addresses"""
+    return [
+        Shard(index=i, targets=compact_targets(targets[start:start + shard_size]),
+              hosts=len(targets[start:start + shard_size]))
+        for i, start in enumerate(range(0, len(targets), shard_size))
+    ]
+
+
+class ScanScheduler:
+    """
+    Run nmap over sharded target lists with global limits.
+
+    All nmap processes started through the scheduler share one concurrency
+    limit, and the global packet rate is split evenly between the workers.
+    Finished shards are checkpointed to disk, so repeating a scan after a
+    failure only rescans the shards that did not complete.
+    """
+
+    def __init__(self, workers: int = 4, max_rate: float = 0, retries: int = 1,
+                 shard_size: int = 256, scan_dir: str = SCAN_DIR):
+        """
+        Initialize ScanScheduler
+        Args:
+            workers: Maximum number of nmap processes running at once
+            max_rate: Global packets per second across all workers (0: unlimited)
+            retries: Extra attempts for a failed shard before giving up
+            shard_size: Default number of addresses per shard
+            scan_dir: Directory holding per-scan shard checkpoints
+        """
+        self.workers = workers
+        self.max_rate = max_rate
+        self.retries = retries
+        self.shard_size = shard_size
+        self.scan_dir = scan_dir
+        self._slots = asyncio.Semaphore(workers)
+
+    def rate_options(self, options: list) -> list:
+        """Options capping the packet rate of one worker"""
+        if not self.max_rate or "--max-rate" in options:
+            return []
+        return ["--max-rate", f"{self.max_rate / self.workers:g}"]
+
+    def scan_id(self, options: list, targets: list) -> str:
+        material = json.dumps([options, targets])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+    def _load_checkpoint(self, path: str) -> Optional[tuple[dict, str]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                report, stderr = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return report, stderr
+
+    def _save_checkpoint(self, path: str, result: tuple[dict, str]) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(result), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    async def run_nmap(self, runner_factory: Callable[[], CommandRunner], options: list,
+                       targets: list, on_output: Optional[OutputCallback] = None) -> tuple[dict, str, bool]:
+        """
+        Run one nmap process once a worker slot is free, parsing its XML as it streams
+        Returns:
+            (report, stderr, completed)
+        """
+        command = ["nmap", "-oX", "-", *options, *self.rate_options(options), *targets]
+        parser = NmapXmlParser()
+
+        async def feed(chunk: str):
+            for host in parser.feed(chunk):
+                if on_output:
+                    await on_output(render_host(host))
+
+        with QUEUE_WAIT_SECONDS.time("nmap_workers"):
+            await self._slots.acquire()
+        try:
+            _, stderr = await runner_factory().execute(command, on_output=feed)
+        finally:
+            self._slots.release()
+        if parser.error:
+            stderr = f"{stderr}\n{parser.error}".strip()
+        return parser.report(), stderr, parser.finished
+
+    async def run_shard(self, runner_factory: Callable[[], CommandRunner], options: list,
+                        shard: Shard, on_output: Optional[OutputCallback] = None) -> tuple[dict, str, bool]:
+        """
+        Scan one shard, retrying on failure
+        Returns:
+            (report, stderr, completed)
+        """
+        for _ in range(self.retries + 1):
+            report, stderr, completed = await self.run_nmap(runner_factory, options, shard.targets, on_output)
+            if completed:
+                break
+        return report, stderr, completed
+
+    async def scan(self, runner_factory: Callable[[], CommandRunner], options: list, target: str,
+                   shard_size: Optional[int] = None,
+                   on_output: Optional[OutputCallback] = None) -> tuple[dict, str]:
+        """
+        Scan a target specification, sharding it when it covers many addresses
+        Args:
+            runner_factory: Returns the CommandRunner used for each nmap process
+            options: nmap options placed before the targets
+            target: nmap target specification
+            shard_size: Addresses per shard (default: the scheduler's shard_size)
+            on_output: Coroutine called with each host rendered as text as soon as it is parsed
+        Returns:
+            (report, stderr) with the merged structured report
+        Raises:
+            ValueError: The target specification contains an nmap option
+        """
+        shard_size = shard_size or self.shard_size
+        arguments = split_targets(target)
+        try:
+            targets = expand_targets(target)
+        except ValueError:
+            targets = None
+        if targets is None or len(targets) <= shard_size:
+            report, stderr, _ = await self.run_nmap(runner_factory, options, arguments, on_output)
+            return report, stderr
+
+        started = time.monotonic()
+        shards = shard_targets(targets, shard_size)
+        checkpoint_dir = os.path.join(self.scan_dir, self.scan_id(options, targets))
+        results: list = [None] * len(shards)
+
+        async def run(shard: Shard):
+            path = os.path.join(checkpoint_dir, f"{shard.index}.json")
+            result = self._load_checkpoint(path)
+            if result is not None:
+                results[shard.index] = (*result, True)
+                if on_output:
+                    for host in result[0]["hosts"]:
+                        await on_output(render_host(host))
+                return
+            report, stderr, completed = await self.run_shard(runner_factory, options, shard, on_output)
+            if completed:
+                self._save_checkpoint(path, (report, stderr))
+            results[shard.index] = (report, stderr, completed)
+
+        await asyncio.gather(*(run(shard) for shard in shards))
+
+        errors = []
+        failed = 0
+        for shard, (_, stderr, completed) in zip(shards, results):
+            if not completed:
+                failed += 1
+                errors.append(f"shard {shard.index} ({' '.join(shard.targets)}) failed "
+                              f"after {self.retries + 1} attempts")
+            if stderr.strip():
+                errors.append(f"[shard {shard.index}] {stderr.strip()}")
+        if failed:
+            errors.append(f"{failed} of {len(shards)} shards failed; "
+                          "repeat the same scan to rescan only those shards")
+        else:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+        report = merge_reports([report for report, _, completed in results if completed],
+                               time.monotonic() - started, " ".join(["nmap", *options, target]))
+        if failed:
+            report["summary"]["exit"] = "error"
+        return report, "\n".join(errors)
+
+
+_scan_scheduler: Optional[ScanScheduler] = None
+
+
+def get_scan_scheduler() -> ScanScheduler:
+    """Return the process-wide scan scheduler, configured from the environment"""
+    global _scan_scheduler
+    if _scan_scheduler is None:
+        _scan_scheduler = ScanScheduler(
+            workers=int(os.environ.get("KALI_MCPS_NMAP_WORKERS", str(os.cpu_count() or 4))),
+            max_rate=float(os.environ.get("KALI_MCPS_NMAP_MAX_RATE", "0")),
+            retries=int(os.environ.get("KALI_MCPS_NMAP_RETRIES", "1")),
+            shard_size=int(os.environ.get("KALI_MCPS_NMAP_SHARD_SIZE", "256")),
+        )
+    return _scan_scheduler
@@ -0,0 +1,175 @@
+"""
+SQLite store of nmap observations, indexed by host, port and time
+"""
+import os
+import json
+import time
+import sqlite3
+from typing import Optional
+
+SCAN_DB = os.environ.get(
+    "KALI_MCPS_SCAN_DB", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "scans.sqlite3")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    scan_type TEXT NOT NULL,
+    target TEXT NOT NULL,
+    command TEXT,
+    started REAL NOT NULL,
+    finished REAL NOT NULL,
+    hosts_up INTEGER,
+    exit TEXT
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    address TEXT NOT NULL,
+    scan_type TEXT NOT NULL,
+    state TEXT,
+    mac TEXT,
+    observed REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hosts_by_address ON hosts(address, scan_type, observed);
+CREATE TABLE IF NOT EXISTS ports (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    address TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    protocol TEXT NOT NULL,
+    state TEXT,
+    service TEXT,
+    product TEXT,
+    version TEXT,
+    observed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ports_by_address ON ports(address, port, protocol, observed);
+"""
+
+# SQLite limits the number of parameters per statement
+_BATCH = 500
+
+
+class ScanStore:
+    """
+    Record every nmap run and answer "what did we last see on this host" queries.
+
+    Host records are stored as the structured records returned by the nmap
+    actions; ports are additionally kept in their own table for queries
+    by port.
+    """
+
+    def __init__(self, path: str = SCAN_DB):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def record_run(self, scan_type: str, target: str, report: dict, started: float) -> int:
+        """
+        Store a scan report
+        Args:
+            scan_type: Scan type the report was produced by
+            target: Target specification as requested
+            report: Structured report of the nmap actions
+            started: Time the scan started
+        Returns:
+            The run id
+        """
+        finished = time.time()
+        summary = report.get("summary", {})
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (scan_type, target, command, started, finished, hosts_up, exit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scan_type, target, report.get("scan", {}).get("command"), started, finished,
+                 summary.get("up"), summary.get("exit")),
+            ).lastrowid
+            for host in report.get("hosts", []):
+                if not host.get("address"):
+                    continue
+                self.db.execute(
+                    "INSERT INTO hosts (run_id, address, scan_type, state, mac, observed, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, host["address"], scan_type, host.get("state"), host.get("mac"), finished,
+                     json.dumps(host)),
+                )
+                self.db.executemany(
+                    "INSERT INTO ports (run_id, address, port, protocol, state, service, product, version, observed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (run_id, host["address"], port.get("port"), port.get("protocol"), port.get("state"),
+                         port.get("service"), port.get("product"), port.get("version"), finished)
+                        for port in host.get("ports", [])
+                    ],
+                )
+        return run_id
+
+    def latest(self, addresses: list[str], scan_type: str) -> dict:
+        """
+        Most recent observation of each address by a scan type
+        Returns:
+            {address: (observed, host record)}
+        """
+        found = {}
+        for start in range(0, len(addresses), _BATCH):
+            batch = addresses[start:start + _BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.db.execute(
+                "SELECT address, observed, record FROM hosts AS h "
+                f"WHERE scan_type = ? AND address IN ({placeholders}) AND observed = ("
+                "  SELECT MAX(observed) FROM hosts WHERE address = h.address AND scan_type = h.scan_type)",
+                (scan_type, *batch),
+            )
+            for address, observed, record in rows:
+                found[address] = (observed, json.loads(record))
+        return found
+
+    def history(self, address: str, limit: int = 20) -> list[dict]:
+        """
+        Observations of one host, newest first
+        Returns:
+            [{"observed", "scan_type", "state", "ports": [...]}, ...]
+        """
+        rows = self.db.execute(
+            "SELECT run_id, scan_type, state, observed FROM hosts WHERE address = ? "
+            "ORDER BY observed DESC LIMIT ?",
+            (address, limit),
+        ).fetchall()
+        history = []
+        for run_id, scan_type, state, observed in rows:
+            ports = self.db.execute(
+                "SELECT port, protocol, state, service, product, version FROM ports "
+                "WHERE address = ? AND run_id = ? ORDER BY protocol, port",
+                (address, run_id),
+            )
+            history.append({
+                "observed": observed,
+                "scan_type": scan_type,
+                "state": state,
+                "ports": [
+                    {key: value for key, value in zip(
+                        ("port", "protocol", "state", "service", "product", "version"), row
+                    ) if value is not None}
+                    for row in ports
+                ],
+            })
+        return history
+
+
+_scan_store: Optional[ScanStore] = None
+
+
+def get_scan_store() -> ScanStore:
+    """Return the process-wide scan store"""
+    global _scan_store
+    if _scan_store is None:
+        _scan_store = ScanStore()
+    return _scan_store
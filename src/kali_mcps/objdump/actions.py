@@ -1,56 +1,128 @@
+import os
 import asyncio
-from src.kali_mcps.base.kali_command import CommandRunner
+from typing import Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.base.elf import ELFFormatError, open_elf, try_native
+from src.kali_mcps.objdump.native import render_file_headers, render_section_headers, render_symbol_table
+from src.kali_mcps.objdump.index import DisassemblyIndexError, get_disassembly_store
 
 class ObjdumpCommand(CommandRunner):
+    cacheable = True
+
     def __init__(self):
         super().__init__("objdump", network_enabled=False, memory_limit="1g", timeout=120)
 
-def file_headers_action(target: str) -> tuple[str, str]:
+async def file_headers_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Display file headers
     For example: objdump -f /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_file_headers, target)
+    if result is not None:
+        return result
     cmd = ObjdumpCommand()
     command = ["objdump", "-f", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def disassemble_action(target: str, section: str = ".text") -> tuple[str, str]:
+async def disassemble_action(target: str, section: str = ".text",
+                             on_output: Optional[OutputCallback] = None,
+                             use_cache: bool = True) -> tuple[str, str]:
     """
     Disassemble section (default: .text)
     For example: objdump -d -j .text /path/to/file
+    on_output receives the listing in chunks while objdump runs
     """
     cmd = ObjdumpCommand()
     command = ["objdump", "-d", "-j", section, target]
-    return cmd.execute(command)
+    return await cmd.execute(command, on_output=on_output, use_cache=use_cache)
+
+async def disassembly_lookup_action(target: str, function: str = "", start: str = "", end: str = "",
+                                    page: int = -1, section: str = ".text",
+                                    max_bytes: int = 256 * 1024) -> dict:
+    """
+    Read part of a section's disassembly from the disassembly index
+    The first lookup runs objdump -d -j <section> once and stores the
+    listing; later lookups of the same binary contents read only the
+    requested range. With no function, address or page, lists what is indexed
+    Args:
+        target: Binary file
+        function: Function (symbol) name
+        start: First address in hex, e.g. '0x401000'
+        end: Address the range stops before (default: end of the section)
+        page: Page number of the whole listing
+        section: Section to disassemble
+        max_bytes: Maximum listing returned for a function or address range
+    """
+    try:
+        index = await get_disassembly_store().open(target, section, ObjdumpCommand)
+        result = {"target": target, "section": section}
+        if function:
+            result.update(index.function(function, max_bytes))
+        elif start:
+            try:
+                start_address = int(start, 16)
+                end_address = int(end, 16) if end else None
+            except ValueError:
+                return {"error": f"addresses are hexadecimal, e.g. '0x401000', got {start!r} / {end!r}"}
+            result.update(index.range(start_address, end_address, max_bytes))
+        elif page >= 0:
+            result.update(index.page(page))
+        else:
+            result.update(index.summary())
+        return result
+    except DisassemblyIndexError as e:
+        return {"error": f"{target}: {e}"}
 
-def symbol_table_action(target: str) -> tuple[str, str]:
+async def symbol_table_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Display symbol table
     For example: objdump -t /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_symbol_table, target)
+    if result is not None:
+        return result
     cmd = ObjdumpCommand()
     command = ["objdump", "-t", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def section_headers_action(target: str) -> tuple[str, str]:
+async def section_headers_action(target: str, use_cache: bool = True) -> tuple[str, str]:
     """
     Display all section headers
     For example: objdump -h /path/to/file
     """
+    result = await asyncio.to_thread(try_native, render_section_headers, target)
+    if result is not None:
+        return result
     cmd = ObjdumpCommand()
     command = ["objdump", "-h", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, use_cache=use_cache)
 
-def full_contents_action(target: str) -> tuple[str, str]:
+async def full_contents_action(target: str, on_output: Optional[OutputCallback] = None,
+                               use_cache: bool = True) -> tuple[str, str]:
     """
     Display all information including headers and disassembly
     For example: objdump -x /path/to/file
+    on_output receives the listing in chunks while objdump runs
     """
     cmd = ObjdumpCommand()
     command = ["objdump", "-x", target]
-    return cmd.execute(command)
+    return await cmd.execute(command, on_output=on_output, use_cache=use_cache)
+
+async def elf_info_action(target: str, include_symbols: bool = False) -> dict:
+    """
+    Parsed ELF header, program headers and sections (and optionally symbols)
+    as structured data, read in-process without running objdump
+    """
+    if os.environ.get("IS_SAFE", "false").lower() == "true":
+        return {"error": "elf_info parses the file in the server process and is not available in safe mode "
+                         "(IS_SAFE=true); use file_headers, section_headers or symbol_table"}
+    try:
+        # parsing a large file would stall every other call on the event loop
+        return await asyncio.to_thread(lambda: open_elf(target).to_dict(include_symbols))
+    except ELFFormatError as e:
+        return {"error": f"{target}: {e}"}
 
 if __name__ == "__main__":
     # Test example
     target_file = "/bin/ls"
-    print(file_headers_action(target_file))
+    print(asyncio.run(file_headers_action(target_file)))
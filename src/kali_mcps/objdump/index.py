@@ -0,0 +1,340 @@
+"""
+On-disk disassembly listings, indexed by function and address for range reads
+"""
+import os
+import re
+import json
+import mmap
+import time
+import array
+import bisect
+import shutil
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Optional
+from src.kali_mcps.base.kali_command import CommandRunner
+from src.kali_mcps.base.result_cache import get_result_cache
+from src.sandbox import file_digest
+
+DISASM_DIR = os.environ.get(
+    "KALI_MCPS_DISASM_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "disasm")
+)
+FORMAT_VERSION = 1
+
+# an address checkpoint is recorded at least every this many bytes of listing,
+# so locating an address reads at most this much text
+CHECKPOINT_BYTES = 16 * 1024
+PAGE_BYTES = 64 * 1024
+
+_FUNCTION = re.compile(rb"^([0-9a-f]+) <(.+)>:$", re.M)
+_INSTRUCTION = re.compile(rb" *([0-9a-f]+):\t")
+
+
+class DisassemblyIndexError(Exception):
+    """Raised when a listing cannot be built or a lookup is invalid"""
+    pass
+
+
+class _Builder:
+    """Write objdump's listing to disk while recording functions and address checkpoints"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.offset = 0
+        self.partial = b""
+        self.next_checkpoint = 0
+        self.addresses = array.array("Q")
+        self.offsets = array.array("Q")
+        # name -> [[address, start, end], ...]; end is filled in by the next function
+        self.functions: dict = {}
+        self._open: Optional[list] = None
+
+    def _checkpoint(self, address: int, offset: int) -> None:
+        if not self.addresses or address > self.addresses[-1]:
+            self.addresses.append(address)
+            self.offsets.append(offset)
+
+    def feed(self, chunk: str) -> None:
+        data = self.partial + chunk.encode("utf-8")
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        # output read through a TTY ends its lines with \r\n, which _FUNCTION would not match
+        data = data[:end].replace(b"\r\n", b"\n")
+        if not data:
+            return
+        self.file.write(data)
+        base = self.offset
+
+        for match in _FUNCTION.finditer(data):
+            address = int(match.group(1), 16)
+            start = base + match.start()
+            if self._open is not None:
+                self._open[2] = start
+            self._open = [address, start, None]
+            self.functions.setdefault(match.group(2).decode("utf-8", errors="replace"), []).append(self._open)
+            self._checkpoint(address, start)
+
+        # the first instruction line after every CHECKPOINT_BYTES of listing
+        position = max(self.next_checkpoint - base, 0)
+        while position < len(data):
+            if position and data[position - 1] != 0x0A:
+                position = data.find(b"\n", position) + 1
+                continue
+            match = _INSTRUCTION.match(data, position)
+            if match:
+                self._checkpoint(int(match.group(1), 16), base + position)
+                position += CHECKPOINT_BYTES
+            else:
+                position = data.find(b"\n", position) + 1
+        self.next_checkpoint = base + position
+        self.offset += len(data)
+
+    def close(self) -> None:
+        if self.partial:
+            self.feed("\n")
+        if self._open is not None:
+            self._open[2] = self.offset
+        self.file.close()
+
+
+class DisassemblyIndex:
+    """
+    A stored listing with its function and address indexes.
+
+    The listing is memory-mapped; every lookup reads only the byte range
+    it returns plus at most CHECKPOINT_BYTES to find an address.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, "functions.json"), "r", encoding="utf-8") as f:
+            self.functions = json.load(f)
+        self.addresses = array.array("Q")
+        self.offsets = array.array("Q")
+        with open(os.path.join(directory, "checkpoints.bin"), "rb") as f:
+            count = self.meta["checkpoints"]
+            self.addresses.fromfile(f, count)
+            self.offsets.fromfile(f, count)
+        self.size = self.meta["size"]
+        self._file = open(os.path.join(directory, "listing.txt"), "rb")
+        self.listing = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    @property
+    def pages(self) -> int:
+        return -(-self.size // PAGE_BYTES)
+
+    def _line_start(self, offset: int) -> int:
+        """Offset of the first line starting at or after offset"""
+        if offset <= 0:
+            return 0
+        if offset >= self.size:
+            return self.size
+        newline = self.listing.rfind(b"\n", 0, offset)
+        if newline == offset - 1:
+            return offset
+        newline = self.listing.find(b"\n", offset)
+        return self.size if newline < 0 else newline + 1
+
+    def offset_of(self, address: int) -> int:
+        """Offset of the first instruction line at or after address"""
+        index = bisect.bisect_right(self.addresses, address) - 1
+        position = self.offsets[index] if index >= 0 else 0
+        while position < self.size:
+            match = _INSTRUCTION.match(self.listing, position)
+            if match and int(match.group(1), 16) >= address:
+                return position
+            newline = self.listing.find(b"\n", position)
+            if newline < 0:
+                break
+            position = newline + 1
+        return self.size
+
+    def read(self, start: int, end: int, max_bytes: int) -> tuple[str, bool, int]:
+        """Text between two offsets, cut at a line boundary after max_bytes"""
+        truncated = end - start > max_bytes
+        if truncated:
+            end = self._line_start(start + max_bytes)
+        return self.listing[start:end].decode("utf-8", errors="replace"), truncated, end
+
+    def next_address(self, offset: int) -> Optional[str]:
+        """Address of the first instruction line at or after offset, to continue a cut listing"""
+        position = offset
+        while position < self.size:
+            match = _INSTRUCTION.match(self.listing, position)
+            if match:
+                return f"0x{match.group(1).decode()}"
+            newline = self.listing.find(b"\n", position)
+            if newline < 0:
+                break
+            position = newline + 1
+        return None
+
+    def function(self, name: str, max_bytes: int) -> dict:
+        matches = self.functions.get(name)
+        if not matches:
+            similar = sorted(candidate for candidate in self.functions if name.lower() in candidate.lower())
+            raise DisassemblyIndexError(
+                f"no function {name!r} in {self.meta['section']}"
+                + (f"; similar: {', '.join(similar[:20])}" if similar else "")
+            )
+        address, start, end = matches[0]
+        text, truncated, stop = self.read(start, end, max_bytes)
+        result = {"function": name, "address": f"0x{address:x}", "listing": text, "truncated": truncated}
+        if truncated:
+            result["next_address"] = self.next_address(stop)
+        if len(matches) > 1:
+            result["other_addresses"] = [f"0x{other[0]:x}" for other in matches[1:]]
+        return result
+
+    def range(self, start_address: int, end_address: Optional[int], max_bytes: int) -> dict:
+        start = self.offset_of(start_address)
+        end = self.offset_of(end_address) if end_address is not None else self.size
+        text, truncated, stop = self.read(start, max(start, end), max_bytes)
+        result = {"start": f"0x{start_address:x}", "listing": text, "truncated": truncated}
+        if end_address is not None:
+            result["end"] = f"0x{end_address:x}"
+        if truncated:
+            result["next_address"] = self.next_address(stop)
+        return result
+
+    def page(self, number: int) -> dict:
+        if not 0 <= number < max(self.pages, 1):
+            raise DisassemblyIndexError(f"page {number} out of range, the listing has {self.pages} pages")
+        start = self._line_start(number * PAGE_BYTES)
+        end = self._line_start((number + 1) * PAGE_BYTES)
+        return {"page": number, "pages": self.pages,
+                "listing": self.listing[start:end].decode("utf-8", errors="replace")}
+
+    def summary(self, limit: int = 200) -> dict:
+        """What is indexed, and the first functions by address"""
+        first = sorted((entries[0][0], name) for name, entries in self.functions.items())[:limit]
+        return {
+            "size": self.size,
+            "pages": self.pages,
+            "page_bytes": PAGE_BYTES,
+            "functions": len(self.functions),
+            "first_functions": [{"name": name, "address": f"0x{address:x}"} for address, name in first],
+        }
+
+    def close(self) -> None:
+        if isinstance(self.listing, mmap.mmap):
+            self.listing.close()
+        self._file.close()
+
+
+class DisassemblyStore:
+    """
+    Disassembly listings on disk, keyed by the binary's sha256 and the section.
+
+    A listing is produced by objdump once and reused for every later
+    lookup of the same binary contents, whatever its path.
+    """
+
+    def __init__(self, directory: str = DISASM_DIR, max_open: int = 8):
+        self.directory = directory
+        self.max_open = max_open
+        self._open: OrderedDict = OrderedDict()
+        self._locks: dict = {}
+        self.builds = 0
+
+    async def key_for(self, path: str, section: str, mode: str) -> str:
+        digest = await asyncio.to_thread(file_digest, path)
+        version = await get_result_cache().tool_version("objdump") if mode == "direct" else ""
+        material = json.dumps([digest, section, version, mode, FORMAT_VERSION])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def open(self, path: str, section: str,
+                   runner_factory: Callable[[], CommandRunner]) -> DisassemblyIndex:
+        """
+        Return the index of a binary's section, disassembling it if needed
+        Args:
+            path: Binary file
+            section: Section disassembled, e.g. '.text'
+            runner_factory: Returns the CommandRunner that runs objdump
+        """
+        runner = runner_factory()
+        mode = f"sandbox:{runner.sandbox_image}" if runner.IS_SAFE else "direct"
+        try:
+            key = await self.key_for(path, section, mode)
+        except OSError as e:
+            raise DisassemblyIndexError(str(e))
+        if key in self._open:
+            self._open.move_to_end(key)
+            return self._open[key]
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key not in self._open:
+                directory = os.path.join(self.directory, key)
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    await self.build(path, section, directory, runner)
+                self._open[key] = await asyncio.to_thread(DisassemblyIndex, directory)
+                while len(self._open) > self.max_open:
+                    self._open.popitem(last=False)[1].close()
+        self._locks.pop(key, None)
+        return self._open[key]
+
+    async def build(self, path: str, section: str, directory: str, runner: CommandRunner) -> None:
+        """
+        Disassemble the section once, streaming the listing to disk
+        Raises:
+            DisassemblyIndexError: objdump timed out, failed or produced no listing; nothing is stored
+        """
+        tmp_directory = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        started = time.perf_counter()
+        builder = _Builder(os.path.join(tmp_directory, "listing.txt"))
+        # the listing goes to disk, only a little of it is kept in memory
+        runner.max_output_bytes = 64 * 1024
+        # the timeout and exit code of this very run decide whether the listing is complete
+        runner.use_coalescing = False
+
+        async def feed(chunk: str):
+            builder.feed(chunk)
+
+        try:
+            _, stderr = await runner.execute(["objdump", "-d", "-j", section, path], on_output=feed,
+                                             use_cache=False)
+        finally:
+            builder.close()
+        # a cut listing would answer every later lookup with part of the section
+        if runner.timed_out or runner.returncode:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            reason = "timed out" if runner.timed_out else f"exited with {runner.returncode}"
+            raise DisassemblyIndexError(stderr.strip() or f"objdump {reason}")
+        if not builder.offset or (stderr.strip() and not builder.functions):
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise DisassemblyIndexError(stderr.strip() or f"objdump produced no disassembly of {section}")
+
+        with open(os.path.join(tmp_directory, "checkpoints.bin"), "wb") as f:
+            builder.addresses.tofile(f)
+            builder.offsets.tofile(f)
+        with open(os.path.join(tmp_directory, "functions.json"), "w", encoding="utf-8") as f:
+            json.dump(builder.functions, f)
+        with open(os.path.join(tmp_directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "source": os.path.realpath(path),
+                "section": section,
+                "size": builder.offset,
+                "checkpoints": len(builder.addresses),
+                "functions": len(builder.functions),
+                "build_seconds": round(time.perf_counter() - started, 3),
+                "version": FORMAT_VERSION,
+            }, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        self.builds += 1
+
+
+_disassembly_store: Optional[DisassemblyStore] = None
+
+
+def get_disassembly_store() -> DisassemblyStore:
+    """Return the process-wide disassembly store"""
+    global _disassembly_store
+    if _disassembly_store is None:
+        _disassembly_store = DisassemblyStore()
+    return _disassembly_store
@@ -0,0 +1,248 @@
+"""
+objdump-compatible listings rendered from the in-process ELF reader
+"""
+from src.kali_mcps.base.elf import (
+    ELFFile, ELFFormatError, Section, Symbol, EM_386, EM_X86_64,
+    ET_REL, ET_EXEC, ET_DYN, PT_LOAD, PT_TLS,
+    SHT_NULL, SHT_SYMTAB, SHT_STRTAB, SHT_REL, SHT_RELA, SHT_NOBITS, SHT_GROUP, SHT_SYMTAB_SHNDX,
+    SHT_DYNSYM, SHF_ALLOC, SHF_WRITE, SHF_EXECINSTR, SHF_TLS, SHF_EXCLUDE,
+    STB_LOCAL, STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE,
+    STT_OBJECT, STT_FUNC, STT_SECTION, STT_FILE, STT_COMMON, STT_GNU_IFUNC,
+)
+
+# (class, machine): (bfd target name, architecture)
+TARGETS = {
+    (64, EM_X86_64): ("elf64-x86-64", "i386:x86-64"),
+    (32, EM_386): ("elf32-i386", "i386"),
+}
+
+# bfd file flags, in the order objdump prints them
+BFD_FLAGS = [
+    (0x01, "HAS_RELOC"),
+    (0x02, "EXEC_P"),
+    (0x04, "HAS_LINENO"),
+    (0x08, "HAS_DEBUG"),
+    (0x10, "HAS_SYMS"),
+    (0x20, "HAS_LOCALS"),
+    (0x40, "DYNAMIC"),
+    (0x80, "WP_TEXT"),
+    (0x100, "D_PAGED"),
+]
+
+VISIBILITY = {1: " .internal", 2: " .hidden", 3: " .protected"}
+
+
+def target_of(elf: ELFFile) -> tuple[str, str]:
+    target = TARGETS.get((elf.header.elf_class, elf.header.machine))
+    if target is None:
+        raise ELFFormatError("machine not handled natively")
+    return target
+
+
+def preamble(elf: ELFFile, target: str) -> str:
+    return f"\n{target}:     file format {target_of(elf)[0]}\n"
+
+
+def vma(elf: ELFFile, value: int) -> str:
+    return f"{value:016x}" if elf.is_64 else f"{value:08x}"
+
+
+def render_file_headers(elf: ELFFile, target: str) -> tuple[str, str]:
+    """Render `objdump -f target`"""
+    _, architecture = target_of(elf)
+    hdr = elf.header
+    flags = 0
+    if hdr.type == ET_REL and any(s.type in (SHT_REL, SHT_RELA) and s.info for s in elf.sections):
+        flags |= 0x01
+    if hdr.type == ET_EXEC:
+        flags |= 0x02
+    elif hdr.type == ET_DYN:
+        flags |= 0x40
+    if any(s.type in (SHT_SYMTAB, SHT_DYNSYM) for s in elf.sections):
+        flags |= 0x10
+    if hdr.phnum:
+        flags |= 0x100
+    names = ", ".join(name for bit, name in BFD_FLAGS if flags & bit)
+    output = (
+        preamble(elf, target)
+        + f"architecture: {architecture}, flags 0x{flags:08x}:\n"
+        + f"{names}\n"
+        + f"start address 0x{vma(elf, hdr.entry)}\n\n"
+    )
+    return output, ""
+
+
+def listed_sections(elf: ELFFile) -> list[tuple[Section, bool]]:
+    """
+    Sections objdump shows, each with whether relocations apply to it.
+    Symbol/string tables backing other tables and relocation sections
+    consumed by their target are not shown.
+    """
+    sections = elf.sections
+    symtab = next((s.index for s in sections if s.type == SHT_SYMTAB), 0)
+    dynsym = next((s.index for s in sections if s.type == SHT_DYNSYM), 0)
+    hidden = {0, elf.header.shstrndx}
+    if symtab:
+        hidden.add(symtab)
+        hidden.add(sections[symtab].link)
+    relocated = set()
+    for section in sections:
+        if section.type == SHT_GROUP:
+            raise ELFFormatError("section groups are not handled natively")
+        if section.type == SHT_SYMTAB_SHNDX:
+            hidden.add(section.index)
+        if section.type in (SHT_REL, SHT_RELA):
+            is_dynamic = elf.header.type in (ET_EXEC, ET_DYN) and section.flags & SHF_ALLOC
+            if (is_dynamic or not section.link or section.link != symtab or not section.info
+                    or section.info >= len(sections)
+                    or sections[section.info].type in (SHT_REL, SHT_RELA)):
+                continue
+            hidden.add(section.index)
+            relocated.add(section.info)
+    if dynsym:
+        hidden.discard(sections[dynsym].link)
+    return [(s, s.index in relocated) for s in sections if s.index not in hidden and s.type != SHT_NULL]
+
+
+def section_lma(elf: ELFFile, section: Section) -> int:
+    if not section.flags & SHF_ALLOC:
+        return section.addr
+    lma = section.addr
+    loads = section.type != SHT_NOBITS
+    for segment in elf.segments:
+        if not ((segment.type == PT_LOAD and not section.flags & SHF_TLS) or segment.type == PT_TLS):
+            continue
+        if not in_segment(section, segment):
+            continue
+        if loads:
+            lma = segment.paddr + section.offset - segment.offset
+        else:
+            lma = segment.paddr + section.addr - segment.vaddr
+        if segment.vaddr <= section.addr and section.addr + section.size <= segment.vaddr + segment.memsz:
+            break
+    return lma
+
+
+def in_segment(section: Section, segment) -> bool:
+    """ELF_SECTION_IN_SEGMENT for allocated sections"""
+    is_tbss = section.flags & SHF_TLS and section.type == SHT_NOBITS
+    if is_tbss and segment.type != PT_TLS:
+        return False
+    size = 0 if is_tbss else section.size
+    if section.type != SHT_NOBITS:
+        if section.offset < segment.offset:
+            return False
+        if section.offset - segment.offset + size > segment.filesz and size:
+            return False
+        if section.offset - segment.offset > segment.filesz:
+            return False
+    if section.addr < segment.vaddr:
+        return False
+    if section.addr - segment.vaddr + size > segment.memsz and size:
+        return False
+    return section.addr - segment.vaddr <= segment.memsz
+
+
+def section_flag_names(section: Section, relocated: bool) -> list[str]:
+    has_contents = section.type != SHT_NOBITS
+    alloc = bool(section.flags & SHF_ALLOC)
+    load = alloc and has_contents
+    code = bool(section.flags & SHF_EXECINSTR)
+    debugging = octets = False
+    if not alloc and section.name.startswith("."):
+        if section.name.startswith((".debug", ".gnu.debuglto_.debug_", ".gnu.linkonce.wi.", ".zdebug")):
+            debugging = octets = True
+        elif section.name.startswith((".gnu.build.attributes", ".note.gnu")):
+            octets = True
+        elif section.name.startswith((".line", ".stab")) or section.name == ".gdb_index":
+            debugging = True
+    names = [
+        (has_contents, "CONTENTS"),
+        (alloc, "ALLOC"),
+        (load, "LOAD"),
+        (relocated, "RELOC"),
+        (not section.flags & SHF_WRITE, "READONLY"),
+        (code, "CODE"),
+        (load and not code, "DATA"),
+        (debugging, "DEBUGGING"),
+        (bool(section.flags & SHF_EXCLUDE), "EXCLUDE"),
+        (octets, "OCTETS"),
+        (bool(section.flags & SHF_TLS), "THREAD_LOCAL"),
+    ]
+    if section.name.startswith(".gnu.linkonce"):
+        raise ELFFormatError("link-once sections are not handled natively")
+    return [name for enabled, name in names if enabled]
+
+
+def render_section_headers(elf: ELFFile, target: str) -> tuple[str, str]:
+    """Render `objdump -h target`"""
+    listed = listed_sections(elf)
+    if elf.is_64:
+        title = "Idx Name          Size      VMA               LMA               File off  Algn\n"
+    else:
+        title = "Idx Name          Size      VMA       LMA       File off  Algn\n"
+    lines = [preamble(elf, target), "\nSections:\n", title]
+    for index, (section, relocated) in enumerate(listed):
+        align = (section.addralign - 1).bit_length() if section.addralign else 0
+        lines.append(
+            f"{index:3d} {section.name:<13s} {section.size:08x}  {vma(elf, section.addr)}  "
+            f"{vma(elf, section_lma(elf, section))}  {section.offset:08x}  2**{align}\n"
+            f"                  {', '.join(section_flag_names(section, relocated))}\n"
+        )
+    return "".join(lines), ""
+
+
+def symbol_flags(symbol: Symbol) -> str:
+    """The seven flag columns of bfd_print_symbol_vandf"""
+    defined = not symbol.is_undefined and not symbol.is_common
+    is_local = symbol.bind == STB_LOCAL
+    is_global = symbol.bind == STB_GLOBAL and defined
+    if is_local:
+        scope = "!" if is_global else "l"
+    elif is_global:
+        scope = "g"
+    elif symbol.bind == STB_GNU_UNIQUE:
+        scope = "u"
+    else:
+        scope = " "
+    debugging = symbol.type in (STT_SECTION, STT_FILE)
+    if symbol.type == STT_FUNC:
+        kind = "F"
+    elif symbol.type == STT_FILE:
+        kind = "f"
+    elif symbol.type in (STT_OBJECT, STT_COMMON):
+        kind = "O"
+    else:
+        kind = " "
+    return (
+        scope
+        + ("w" if symbol.bind == STB_WEAK else " ")
+        + "  "
+        + ("i" if symbol.type == STT_GNU_IFUNC else " ")
+        + ("d" if debugging else " ")
+        + kind
+    )
+
+
+def render_symbol_table(elf: ELFFile, target: str) -> tuple[str, str]:
+    """Render `objdump -t target`"""
+    target_of(elf)
+    symbols = elf.symbols
+    lines = [preamble(elf, target), "\nSYMBOL TABLE:\n"]
+    if not symbols:
+        lines.append("no symbols\n")
+    has_versions = any(s.type == 0x6fffffff for s in elf.sections) and any(
+        s.type in (0x6ffffffd, 0x6ffffffe) for s in elf.sections
+    )
+    for symbol in symbols:
+        if symbol.other & ~0x3:
+            raise ELFFormatError("unusual st_other values are not handled natively")
+        value = symbol.size if symbol.is_common else symbol.value
+        other = symbol.value if symbol.is_common else symbol.size
+        version = "  " + " " * 11 if has_versions else ""
+        lines.append(
+            f"{vma(elf, value)} {symbol_flags(symbol)} {symbol.section}\t{vma(elf, other)}"
+            f"{version}{VISIBILITY.get(symbol.other & 0x3, '')} {symbol.name}\n"
+        )
+    lines.append("\n\n")
+    return "".join(lines), ""
@@ -1,39 +1,84 @@
 import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
 from src.kali_mcps.base.kali_command import CommandRunner
+from src.kali_mcps.base.result_cache import get_result_cache
+from src.kali_mcps.strings.extractor import ENCODINGS, RADIX_FORMATS, extract_strings, render_strings
+
+# set KALI_MCPS_NATIVE_STRINGS=false to always run GNU strings
+NATIVE_STRINGS = os.environ.get("KALI_MCPS_NATIVE_STRINGS", "true").lower() == "true"
+
+
+def native_strings() -> bool:
+    """Whether strings are extracted in the server; not in safe mode, where untrusted files are only read in the sandbox"""
+    return NATIVE_STRINGS and os.environ.get("IS_SAFE", "false").lower() != "true"
+
+ENCODING_NAMES = {"s": "7-bit", "S": "8-bit", "l": "16-bit little-endian", "b": "16-bit big-endian"}
 
 class StringsCommand(CommandRunner):
+    cacheable = True
+
     def __init__(self):
         super().__init__("strings", network_enabled=False, memory_limit="1g", timeout=120)
 
-def basic_strings_action(target: str, input_file: bytes = None) -> tuple[str, str]:
+async def run_strings(command: list, target: str, use_cache: bool, min_length: int = 4,
+                      radix: Optional[str] = None, encoding: str = "s") -> tuple[str, str]:
+    """
+    Run a strings query with the native extractor, falling back to GNU strings
+    for options or files it does not handle
+    """
+    cmd = StringsCommand()
+    native = (
+        native_strings()
+        and encoding in ENCODINGS
+        and (radix is None or radix in RADIX_FORMATS)
+        and min_length >= 1
+        and os.path.isfile(target)
+    )
+    if not native:
+        return await cmd.execute(command, use_cache=use_cache)
+
+    cache = get_result_cache()
+    cache_key = await cache.key_for(command, "native") if use_cache and cmd.use_cache else None
+    cached = await cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+    try:
+        found = await extract_strings(target, (encoding,), min_length)
+    except (OSError, ValueError, BrokenProcessPool):
+        return await cmd.execute(command, use_cache=use_cache)
+    result = (render_strings(found[encoding], radix), "")
+    if cache_key:
+        await cache.put(cache_key, result)
+    return result
+
+async def basic_strings_action(target: str, input_file: bytes = None, use_cache: bool = True) -> tuple[str, str]:
     """
     Basic strings analysis
     For example: strings /path/to/file
     """
-    cmd = StringsCommand()
     command = ["strings", target]
-    return cmd.execute(command, input_files={"input_file": "/tmp/input_file"})
+    return await run_strings(command, target, use_cache)
 
-def min_length_strings_action(target: str, length: int = 6) -> tuple[str, str]:
+async def min_length_strings_action(target: str, length: int = 6, use_cache: bool = True) -> tuple[str, str]:
     """
     Strings analysis with specified minimum length
     For example: strings -n 6 /path/to/file
     """
-    cmd = StringsCommand()
     command = ["strings", "-n", str(length), target]
-    return cmd.execute(command)
+    return await run_strings(command, target, use_cache, min_length=length)
 
-def offset_strings_action(target: str, format: str = "x") -> tuple[str, str]:
+async def offset_strings_action(target: str, format: str = "x", use_cache: bool = True) -> tuple[str, str]:
     """
     Strings analysis showing string offsets
     format can be: 'd' (decimal), 'o' (octal), 'x' (hexadecimal)
     For example: strings -t x /path/to/file
     """
-    cmd = StringsCommand()
     command = ["strings", "-t", format, target]
-    return cmd.execute(command)
+    return await run_strings(command, target, use_cache, radix=format)
 
-def encoding_strings_action(target: str, encoding: str = "S") -> tuple[str, str]:
+async def encoding_strings_action(target: str, encoding: str = "S", use_cache: bool = True) -> tuple[str, str]:
     """
     Strings analysis with specified character encoding
     encoding can be: 
@@ -43,12 +88,39 @@ def encoding_strings_action(target: str, encoding: str = "S") -> tuple[str, str]
     - 'l' = 16-bit little-endian
     For example: strings -e S /path/to/file
     """
-    cmd = StringsCommand()
     command = ["strings", "-e", encoding, target]
-    return cmd.execute(command)
+    return await run_strings(command, target, use_cache, encoding=encoding)
+
+async def all_encodings_strings_action(target: str, length: int = 4, format: str = "x") -> tuple[str, str]:
+    """
+    7-bit, 16-bit little-endian and 16-bit big-endian strings with offsets,
+    extracted in a single pass over the file
+    format can be: 'd' (decimal), 'o' (octal), 'x' (hexadecimal)
+    """
+    if format not in RADIX_FORMATS:
+        return "", f"strings: invalid radix {format!r}"
+    if length < 1:
+        return "", f"strings: invalid minimum string length {length}"
+    if not native_strings():
+        sections = []
+        for encoding in ("s", "l", "b"):
+            command = ["strings", "-t", format, "-n", str(length), "-e", encoding, target]
+            stdout, stderr = await run_strings(command, target, True, length, format, encoding)
+            if stderr.strip() and not stdout:
+                return "", stderr
+            sections.append(f"== {ENCODING_NAMES[encoding]} ==\n{stdout}")
+        return "\n".join(sections), ""
+    try:
+        found = await extract_strings(target, ("s", "l", "b"), length)
+    except (OSError, ValueError, BrokenProcessPool) as e:
+        return "", f"strings: {target}: {e}"
+    sections = [
+        f"== {ENCODING_NAMES[encoding]} ==\n{render_strings(found[encoding], format)}"
+        for encoding in ("s", "l", "b")
+    ]
+    return "\n".join(sections), ""
 
 if __name__ == "__main__":
     # Test example
     target_file = "/bin/ls"
-    input_file = bytes.fromhex("68656c6c6f20776f726c64")
-    print(basic_strings_action(target_file, {"input_file": input_file , "output_file": "/tmp/output_file"}))
+    print(asyncio.run(basic_strings_action(target_file)))
@@ -0,0 +1,167 @@
+"""
+Native strings extractor: one mmap, chunks scanned on a process pool through windows that overlap the
+neighbouring chunks, each string reported only by the chunk it starts in
+"""
+import os
+import re
+import mmap
+import asyncio
+from typing import Optional
+from src.kali_mcps.base.workers import run_in_pool
+
+# translation tables reducing every byte to P (printable), Z (NUL) or X;
+# a run of characters then becomes a literal the regex engine can search for
+_ASCII = bytes([9]) + bytes(range(0x20, 0x7f))
+_EIGHT_BIT = _ASCII + bytes(range(0x80, 0x100))
+
+
+def _table(printable: bytes) -> bytes:
+    table = bytearray(b"X" * 256)
+    for byte in printable:
+        table[byte] = ord("P")
+    table[0] = ord("Z")
+    return bytes(table)
+
+
+TABLES = {"ascii": _table(_ASCII), "8bit": _table(_EIGHT_BIT)}
+
+# encoding letter -> (one translated character, bytes per character, table)
+ENCODINGS = {
+    "s": (b"P", 1, "ascii"),
+    "S": (b"P", 1, "8bit"),
+    "l": (b"PZ", 2, "ascii"),
+    "b": (b"ZP", 2, "ascii"),
+    "L": (b"PZZZ", 4, "ascii"),
+    "B": (b"ZZZP", 4, "ascii"),
+}
+RADIX_FORMATS = {"d": "{:7d} ", "o": "{:7o} ", "x": "{:7x} "}
+
+# files below this size are scanned in-process
+PARALLEL_THRESHOLD = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+_EXTEND_BLOCK = 64 * 1024
+
+_patterns: dict = {}
+
+
+def _pattern(unit: bytes, min_length: int) -> "re.Pattern":
+    key = (unit, min_length)
+    if key not in _patterns:
+        # spelling out the minimum as a literal prefix lets re skip ahead with a fast search
+        _patterns[key] = re.compile(re.escape(unit * min_length) + b"(?:" + re.escape(unit) + b")*")
+    return _patterns[key]
+
+
+def _extend(data, position: int, encoding: str) -> int:
+    """Offset where a run of characters continuing at `position` ends"""
+    unit, width, table = ENCODINGS[encoding]
+    pattern = _pattern(unit, 0)
+    while True:
+        block = data[position:position + _EXTEND_BLOCK].translate(TABLES[table])
+        matched = pattern.match(block).end()
+        position += matched
+        if matched == 0 or matched < len(block) - width + 1:
+            return position
+
+
+def scan_range(data, start: int, end: int, encodings: tuple, min_length: int) -> dict:
+    """
+    Find the strings that start inside [start, end)
+    Args:
+        data: Buffer holding the whole file
+        start: First offset owned by this range
+        end: Offset where the next range begins
+        encodings: Encoding letters to scan for
+        min_length: Minimum number of characters per string
+    Returns:
+        {encoding: [(offset, raw bytes), ...]}
+    """
+    # a few bytes before the range to see whether a run started earlier, enough
+    # after it that a run starting near the end is long enough to match
+    base = max(0, start - 4)
+    stop = min(len(data), end + 4 * min_length)
+    translated = {}
+    results = {}
+    for encoding in encodings:
+        unit, width, table = ENCODINGS[encoding]
+        if table not in translated:
+            translated[table] = data[base:stop].translate(TABLES[table])
+        window = translated[table]
+        found = []
+        first = True
+        for match in _pattern(unit, min_length).finditer(window, start - base):
+            offset = base + match.start()
+            if offset >= end:
+                break
+            if first:
+                first = False
+                # a run that began in the previous range belongs to it
+                before = match.start() - width
+                if offset - width < start and before >= 0 and window[before:match.start()] == unit:
+                    continue
+            finish = base + match.end()
+            if match.end() + width > len(window) and finish < len(data):
+                finish = _extend(data, finish, encoding)
+            found.append((offset, _narrow(data[offset:finish], encoding)))
+        results[encoding] = found
+    return results
+
+
+def _narrow(raw: bytes, encoding: str) -> bytes:
+    """Keep the printable byte of each 16/32-bit character"""
+    _, width, _ = ENCODINGS[encoding]
+    if width == 1:
+        return raw
+    index = 0 if encoding in ("l", "L") else width - 1
+    return raw[index::width]
+
+
+def _scan_file_range(path: str, start: int, end: int, encodings: tuple, min_length: int) -> dict:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_range(data, start, end, encodings, min_length)
+
+
+async def extract_strings(path: str, encodings: tuple = ("s", "l", "b"), min_length: int = 4) -> dict:
+    """
+    Extract strings for several encodings in a single pass over the file
+    Args:
+        path: File to scan
+        encodings: Encoding letters as accepted by `strings -e`
+        min_length: Minimum number of characters per string
+    Returns:
+        {encoding: [(offset, raw bytes), ...]} in file order
+    """
+    for encoding in encodings:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"unsupported encoding {encoding!r}")
+    size = os.path.getsize(path)
+    if size == 0:
+        return {encoding: [] for encoding in encodings}
+
+    workers = os.cpu_count() or 1
+    if size < PARALLEL_THRESHOLD or workers == 1:
+        return await asyncio.to_thread(_scan_file_range, path, 0, size, encodings, min_length)
+
+    chunk_size = max(MIN_CHUNK_SIZE, -(-size // (workers * 4)))
+    futures = [
+        run_in_pool(_scan_file_range, path, start, min(start + chunk_size, size), encodings, min_length)
+        for start in range(0, size, chunk_size)
+    ]
+    merged = {encoding: [] for encoding in encodings}
+    for part in await asyncio.gather(*futures):
+        for encoding, found in part.items():
+            merged[encoding].extend(found)
+    return merged
+
+
+def render_strings(found: list, radix: Optional[str] = None) -> str:
+    """Format extracted strings exactly like GNU strings prints them"""
+    lines = []
+    prefix = RADIX_FORMATS[radix] if radix else None
+    for offset, raw in found:
+        if prefix:
+            lines.append(prefix.format(offset).encode("ascii"))
+        lines.append(raw)
+        lines.append(b"\n")
+    return b"".join(lines).decode("utf-8", errors="replace")
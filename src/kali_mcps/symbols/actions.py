@@ -0,0 +1,222 @@
+"""
+Cross-binary symbol index: which files export or import a symbol
+"""
+import os
+import json
+import time
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.base.elf import native_elf
+from src.kali_mcps.base.workers import run_in_pool
+from src.kali_mcps.batch.actions import ToolFallback, find_files
+from src.kali_mcps.symbols.extract import extract_symbols, parse_nm
+from src.kali_mcps.symbols.store import KINDS, MATCHES, get_symbol_store
+
+MAX_FILES = int(os.environ.get("KALI_MCPS_SYMBOL_MAX_FILES", "20000"))
+# files written to the index per transaction
+COMMIT_FILES = 64
+# nm output kept per file when the in-process reader cannot read it
+NM_OUTPUT_BYTES = 64 * 1024 * 1024
+# length of the mangled names passed to one c++filt run
+DEMANGLE_ARGV_BYTES = 64 * 1024
+
+
+class DemangleCommand(CommandRunner):
+    coalesce = False
+
+    def __init__(self):
+        super().__init__("c++filt", network_enabled=False, memory_limit="512m", timeout=120)
+
+
+async def demangle(names: list) -> dict:
+    """
+    Demangle C++ names with c++filt, passing them as arguments in chunks
+    Returns:
+        {mangled: demangled} for the names c++filt changed
+    """
+    demangled = {}
+    chunk, size = [], 0
+    chunks = []
+    for name in names:
+        if chunk and size + len(name) + 1 > DEMANGLE_ARGV_BYTES:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(name)
+        size += len(name) + 1
+    if chunk:
+        chunks.append(chunk)
+    for chunk in chunks:
+        runner = DemangleCommand()
+        stdout, _ = await runner.execute(["c++filt", *chunk], use_cache=False)
+        lines = stdout.splitlines()
+        # c++filt prints one line per argument; anything else means it did not run
+        if len(lines) != len(chunk):
+            continue
+        for name, line in zip(chunk, lines):
+            if line != name:
+                demangled[name] = line
+    return demangled
+
+
+def _compare_with_store(store, path: str, files: list, truncated: bool) -> tuple[dict, dict, list]:
+    """
+    Stat the files found and compare them with what the index holds, removing indexed files that are gone
+    Returns:
+        ({path: (size, mtime_ns)} of the files, the same for the indexed files, removed paths)
+    """
+    current = {}
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            continue
+        current[file] = (stat.st_size, stat.st_mtime_ns)
+
+    removed = []
+    if os.path.isdir(path):
+        known = store.known(os.path.abspath(path))
+        # a cut listing does not say which files are gone
+        if not truncated:
+            removed = [file for file in known if file not in current]
+            store.remove(removed)
+    else:
+        known = {file: entry for file in current if (entry := store.known(file).get(file))}
+    return current, known, removed
+
+
+async def index_symbols_action(path: str, recursive: bool = True, max_files: int = MAX_FILES,
+                               on_output: Optional[OutputCallback] = None) -> dict:
+    """
+    Index the defined and undefined symbols of every file under a directory
+    Symbol tables are read in-process on the worker pool, with nm for the
+    files the in-process reader cannot handle, and C++ names are demangled
+    with c++filt. Files whose size and modification time have not changed
+    since they were indexed are skipped; indexed files that are gone are
+    removed. on_output receives one JSON line per file indexed
+    Args:
+        path: Directory, file or glob pattern (e.g. 'rootfs/**/*.so')
+        recursive: Descend into subdirectories / let '**' match across directories
+        max_files: Maximum number of files looked at
+    """
+    started = time.perf_counter()
+    store = get_symbol_store()
+    files, truncated = await asyncio.to_thread(find_files, path, recursive, max_files)
+    files = [os.path.abspath(file) for file in files]
+
+    current, known, removed = await asyncio.to_thread(_compare_with_store, store, path, files, truncated)
+    changed = [file for file, entry in current.items() if known.get(file) != tuple(entry)]
+
+    fallback = ToolFallback(0)
+
+    async def extract(index: int, file: str) -> dict:
+        try:
+            result = await run_in_pool(extract_symbols, file, native_elf())
+        except (OSError, BrokenProcessPool) as e:
+            return {"path": file, "format": None, "symbols": [], "error": str(e)}
+        result["path"] = file
+        if result.pop("fallback", False):
+            found: dict = {}
+            outputs = await fallback.run_tools(
+                index, file, [["nm", "-P", "-D", file], ["nm", "-P", file]], NM_OUTPUT_BYTES
+            )
+            for dynamic, (stdout, _, _) in zip((True, False), outputs):
+                parse_nm(stdout, dynamic, found)
+            result["symbols"] = list(found.values())
+            if not found:
+                result["error"] = outputs[0][1].strip() or None
+        return result
+
+    summary = {"indexed": 0, "symbols": 0, "errors": 0}
+    pending = []
+
+    async def flush():
+        mangled = sorted({row[0] for result in pending for row in result["symbols"] if row[0].startswith("_Z")})
+        names = await demangle(mangled) if mangled else {}
+        rows = []
+        for result in pending:
+            symbols = [(name, names.get(name), version, defined, dynamic, sym_type, bind)
+                       for name, version, defined, dynamic, sym_type, bind in result["symbols"]]
+            size, mtime_ns = current[result["path"]]
+            rows.append((result["path"], size, mtime_ns, result["format"], result.get("error"), symbols))
+        summary["symbols"] += await asyncio.to_thread(store.replace, rows)
+        pending.clear()
+
+    try:
+        tasks = [asyncio.ensure_future(extract(index, file)) for index, file in enumerate(changed)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                summary["indexed"] += 1
+                summary["errors"] += bool(result.get("error"))
+                pending.append(result)
+                if on_output:
+                    await on_output(json.dumps({
+                        "path": result["path"],
+                        "format": result["format"],
+                        "defined": sum(1 for row in result["symbols"] if row[2]),
+                        "undefined": sum(1 for row in result["symbols"] if not row[2]),
+                        **({"error": result["error"]} if result.get("error") else {}),
+                    }) + "\n")
+                if len(pending) >= COMMIT_FILES:
+                    await flush()
+            if pending:
+                await flush()
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        await fallback.close()
+
+    return {
+        "summary": {
+            "path": path,
+            "files": len(current),
+            "indexed": summary["indexed"],
+            "unchanged": len(current) - len(changed),
+            "removed": len(removed),
+            "errors": summary["errors"],
+            "symbols": summary["symbols"],
+            "truncated": truncated,
+            "tool_runs": fallback.commands,
+            "elapsed": round(time.perf_counter() - started, 3),
+        },
+        "index": await asyncio.to_thread(store.stats),
+    }
+
+
+async def find_symbol_action(symbol: str, kind: str = "any", match: str = "exact", root: str = "",
+                             limit: int = 100) -> dict:
+    """
+    Look up which indexed files export or import a symbol
+    Args:
+        symbol: Symbol name, mangled or demangled (e.g. 'SSL_read' or 'std::terminate()')
+        kind: 'exports', 'imports' or 'any'
+        match: 'exact', 'prefix' or 'substring'
+        root: Only files under this directory
+        limit: Maximum files listed
+    """
+    if kind not in KINDS:
+        return {"error": f"unknown kind {kind}, expected one of {', '.join(KINDS)}"}
+    if match not in MATCHES:
+        return {"error": f"unknown match {match}, expected one of {', '.join(MATCHES)}"}
+    if not symbol:
+        return {"error": "symbol must not be empty"}
+    started = time.perf_counter()
+    result = await asyncio.to_thread(
+        get_symbol_store().query, symbol, kind, match, os.path.abspath(root) if root else "", limit
+    )
+    result["elapsed"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+async def symbol_index_stats_action() -> dict:
+    """Number of files and symbols in the symbol index"""
+    return await asyncio.to_thread(get_symbol_store().stats)
+
+
+if __name__ == "__main__":
+    # Test example
+    print(json.dumps(asyncio.run(index_symbols_action("/usr/lib/x86_64-linux-gnu", max_files=200))["summary"]))
+    print(json.dumps(asyncio.run(find_symbol_action("malloc", "imports", limit=5))))
@@ -0,0 +1,101 @@
+"""
+Symbol extraction run on the index worker processes
+"""
+from typing import Optional
+from src.kali_mcps.base.elf import (
+    ELFFile, ELFFormatError, STB_GLOBAL, STB_GNU_UNIQUE, STB_LOCAL, STB_WEAK, STT_COMMON, STT_FILE, STT_FUNC,
+    STT_GNU_IFUNC, STT_NOTYPE, STT_OBJECT, STT_SECTION, STT_TLS,
+)
+
+ELF_MAGIC = b"\x7fELF"
+
+TYPES = {STT_NOTYPE: "NOTYPE", STT_OBJECT: "OBJECT", STT_FUNC: "FUNC", STT_COMMON: "COMMON", STT_TLS: "TLS",
+         STT_GNU_IFUNC: "IFUNC"}
+BINDINGS = {STB_LOCAL: "LOCAL", STB_GLOBAL: "GLOBAL", STB_WEAK: "WEAK", STB_GNU_UNIQUE: "UNIQUE"}
+
+# nm symbol letters; lower case is local except for the undefined weak ones
+_NM_UNDEFINED = set("Uwv")
+_NM_WEAK = set("WwVv")
+_NM_FUNCTIONS = set("Tti")
+_NM_OBJECTS = set("DdBbRrGgSsVvCu")
+
+
+def is_elf(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == ELF_MAGIC
+    except OSError:
+        return False
+
+
+def _merge(found: dict, name: str, version: Optional[str], defined: bool, dynamic: bool,
+           sym_type: str, bind: str) -> None:
+    # a global symbol is usually in both .dynsym and .symtab; keep one row, marked dynamic
+    key = (name, defined)
+    if key in found:
+        if dynamic:
+            found[key] = found[key][:3] + (True,) + found[key][4:]
+        return
+    found[key] = (name, version or None, defined, dynamic, sym_type, bind)
+
+
+def extract_symbols(path: str, native: bool = True) -> dict:
+    """
+    Defined and undefined symbols of an ELF file, read in-process
+    Args:
+        native: Read the symbol tables here; if not, ELF files are left to nm
+    Returns:
+        {"format", "symbols": [(name, version, defined, dynamic, type, bind), ...]},
+        and "fallback": True when nm has to read the file
+    """
+    if not is_elf(path):
+        return {"format": "other", "symbols": []}
+    if not native:
+        return {"format": "elf", "symbols": [], "fallback": True}
+    try:
+        elf = ELFFile(path)
+    except ELFFormatError:
+        return {"format": "elf", "symbols": [], "fallback": True}
+    found: dict = {}
+    try:
+        for dynamic, table in ((True, elf.dynamic_symbols), (False, elf.symbols)):
+            for symbol in table:
+                if not symbol.name or symbol.type in (STT_SECTION, STT_FILE):
+                    continue
+                _merge(found, symbol.name, symbol.version, not symbol.is_undefined, dynamic,
+                       TYPES.get(symbol.type, str(symbol.type)), BINDINGS.get(symbol.bind, str(symbol.bind)))
+    except ELFFormatError:
+        return {"format": "elf", "symbols": [], "fallback": True}
+    finally:
+        elf.close()
+    return {"format": "elf", "symbols": list(found.values())}
+
+
+def parse_nm(output: str, dynamic: bool, found: Optional[dict] = None) -> dict:
+    """
+    Parse `nm -P` output into the rows extract_symbols returns
+    Returns:
+        {(name, defined): row}, merged into found if given
+    """
+    found = {} if found is None else found
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2 or len(fields[1]) != 1:
+            continue
+        name, letter = fields[0], fields[1]
+        version = None
+        if "@" in name:
+            name, _, version = name.partition("@")
+            version = version.lstrip("@")
+        defined = letter not in _NM_UNDEFINED
+        if letter in _NM_WEAK:
+            bind = "WEAK"
+        elif letter == "u":
+            bind = "UNIQUE"
+        elif letter.islower():
+            bind = "LOCAL"
+        else:
+            bind = "GLOBAL"
+        sym_type = "FUNC" if letter in _NM_FUNCTIONS else "OBJECT" if letter in _NM_OBJECTS else "NOTYPE"
+        _merge(found, name, version, defined, dynamic, sym_type, bind)
+    return found
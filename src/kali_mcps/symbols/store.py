@@ -0,0 +1,223 @@
+"""
+SQLite inverted index of the symbols every indexed file defines and imports
+"""
+import os
+import time
+import sqlite3
+import functools
+import threading
+from typing import Optional
+
+SYMBOL_DB = os.environ.get(
+    "KALI_MCPS_SYMBOL_DB", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "symbols.sqlite3")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT,
+    error TEXT,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    name TEXT NOT NULL,
+    demangled TEXT,
+    version TEXT,
+    defined INTEGER NOT NULL,
+    dynamic INTEGER NOT NULL,
+    type TEXT,
+    bind TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_by_name ON symbols(name);
+CREATE INDEX IF NOT EXISTS symbols_by_demangled ON symbols(demangled);
+CREATE INDEX IF NOT EXISTS symbols_by_file ON symbols(file_id);
+"""
+
+# SQLite limits the number of parameters per statement
+_BATCH = 500
+
+MATCHES = ("exact", "prefix", "substring")
+KINDS = ("any", "exports", "imports")
+
+
+def _serialized(method):
+    """Run a store method under the store's lock, the connection is shared by the threads calling it"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SymbolStore:
+    """
+    Symbols of indexed files, looked up by name or demangled name.
+
+    Each file is recorded with the size and modification time it had when
+    it was indexed, so re-indexing a tree only reads the files that changed.
+    The methods are blocking; the actions call them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = SYMBOL_DB):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # used from worker threads, one at a time
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    @_serialized
+    def known(self, root: str) -> dict:
+        """
+        Indexed files under a directory (or the file itself)
+        Returns:
+            {path: (size, mtime_ns)}
+        """
+        root = root.rstrip("/") or "/"
+        rows = self.db.execute(
+            # '0' follows '/', so the range covers exactly the paths below root
+            "SELECT path, size, mtime_ns FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+            (root, root.rstrip("/") + "/", root.rstrip("/") + "0"),
+        )
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    @_serialized
+    def replace(self, files: list) -> int:
+        """
+        Store the symbols of files, replacing what was indexed for them before
+        Args:
+            files: [(path, size, mtime_ns, format, error, [(name, demangled, version, defined,
+                dynamic, type, bind), ...]), ...]
+        Returns:
+            The number of symbols stored
+        """
+        stored = 0
+        now = time.time()
+        with self.db:
+            self._delete([path for path, *_ in files])
+            for path, size, mtime_ns, file_format, error, symbols in files:
+                file_id = self.db.execute(
+                    "INSERT INTO files (path, size, mtime_ns, format, error, indexed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, file_format, error, now),
+                ).lastrowid
+                self.db.executemany(
+                    "INSERT INTO symbols (file_id, name, demangled, version, defined, dynamic, type, bind) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(file_id, *symbol) for symbol in symbols],
+                )
+                stored += len(symbols)
+        return stored
+
+    def _delete(self, paths: list) -> None:
+        for start in range(0, len(paths), _BATCH):
+            batch = paths[start:start + _BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self.db.execute(
+                f"DELETE FROM symbols WHERE file_id IN (SELECT id FROM files WHERE path IN ({placeholders}))",
+                batch,
+            )
+            self.db.execute(f"DELETE FROM files WHERE path IN ({placeholders})", batch)
+
+    @_serialized
+    def remove(self, paths: list) -> None:
+        """Forget files that no longer exist"""
+        with self.db:
+            self._delete(paths)
+
+    @_serialized
+    def query(self, symbol: str, kind: str = "any", match: str = "exact", root: str = "",
+              limit: int = 100) -> dict:
+        """
+        Files that define or import a symbol
+        Args:
+            symbol: Symbol name, mangled or demangled
+            kind: 'exports' (defined, not local), 'imports' (undefined) or 'any'
+            match: 'exact', 'prefix' or 'substring'
+            root: Only files under this directory
+            limit: Maximum rows returned
+        Returns:
+            {"symbol", "total", "exports": [...], "imports": [...], "local": [...]}
+        """
+        conditions = []
+        params: list = []
+        if match == "exact":
+            conditions.append("(s.name = ? OR s.demangled = ?)")
+            params += [symbol, symbol]
+        elif match == "prefix":
+            upper = _upper_bound(symbol)
+            conditions.append("((s.name >= ? AND s.name < ?) OR (s.demangled >= ? AND s.demangled < ?))")
+            params += [symbol, upper, symbol, upper]
+        else:
+            conditions.append("(instr(s.name, ?) > 0 OR instr(s.demangled, ?) > 0)")
+            params += [symbol, symbol]
+        if kind == "exports":
+            conditions.append("s.defined = 1 AND s.bind != 'LOCAL'")
+        elif kind == "imports":
+            conditions.append("s.defined = 0")
+        if root:
+            root = root.rstrip("/")
+            conditions.append("(f.path = ? OR (f.path >= ? AND f.path < ?))")
+            params += [root, root + "/", root + "0"]
+        where = " AND ".join(conditions)
+
+        total = self.db.execute(
+            f"SELECT COUNT(*) FROM symbols AS s JOIN files AS f ON f.id = s.file_id WHERE {where}", params
+        ).fetchone()[0]
+        rows = self.db.execute(
+            "SELECT f.path, s.name, s.demangled, s.version, s.defined, s.dynamic, s.type, s.bind "
+            f"FROM symbols AS s JOIN files AS f ON f.id = s.file_id WHERE {where} "
+            "ORDER BY s.defined DESC, f.path, s.name LIMIT ?",
+            (*params, limit),
+        )
+        result = {"symbol": symbol, "total": total, "exports": [], "imports": [], "local": []}
+        for path, name, demangled, version, defined, dynamic, sym_type, bind in rows:
+            entry = {"path": path, "name": name, "type": sym_type, "bind": bind, "dynamic": bool(dynamic)}
+            if demangled:
+                entry["demangled"] = demangled
+            if version:
+                entry["version"] = version
+            if not defined:
+                result["imports"].append(entry)
+            elif bind == "LOCAL":
+                result["local"].append(entry)
+            else:
+                result["exports"].append(entry)
+        return result
+
+    @_serialized
+    def stats(self) -> dict:
+        """Number of files, ELF files, failures and symbols indexed"""
+        files, elf_files, errors = self.db.execute(
+            "SELECT COUNT(*), SUM(format = 'elf'), SUM(error IS NOT NULL) FROM files"
+        ).fetchone()
+        symbols = self.db.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+        return {"path": self.path, "files": files, "elf_files": elf_files or 0, "errors": errors or 0,
+                "symbols": symbols}
+
+
+_symbol_store: Optional[SymbolStore] = None
+
+
+def get_symbol_store() -> SymbolStore:
+    """Return the process-wide symbol store"""
+    global _symbol_store
+    if _symbol_store is None:
+        _symbol_store = SymbolStore()
+    return _symbol_store
@@ -1,18 +1,113 @@
+import os
+import json
+import time
 import asyncio
-from src.kali_mcps.base.kali_command import CommandRunner
+from typing import Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback
+from src.kali_mcps.nmap.scheduler import expand_targets, split_targets
+from src.kali_mcps.traceroute.parser import parse_traceroute, merge_paths
+from src.metrics import QUEUE_WAIT_SECONDS
+
+# how long a traced path is reused, in seconds
+TRACEROUTE_TTL = int(os.environ.get("KALI_MCPS_TRACEROUTE_TTL", "3600"))
+# traceroute processes running at once, across all calls
+TRACEROUTE_WORKERS = int(os.environ.get("KALI_MCPS_TRACEROUTE_WORKERS", "32"))
+# refuse to trace more destinations than this in one call
+MAX_TARGETS = int(os.environ.get("KALI_MCPS_TRACEROUTE_MAX_TARGETS", "4096"))
+
+_slots: Optional[asyncio.Semaphore] = None
 
 class TracerouteCommand(CommandRunner):
-    def __init__(self):
+    remote = True
+    def __init__(self, max_age: Optional[float] = None):
         super().__init__("traceroute", network_enabled=True, memory_limit="1g", timeout=120)
+        # paths change, so results are only cached by the multi-target mode, for max_age seconds
+        self.cacheable = max_age is not None
+        self.cache_max_age = max_age
 
-def traceroute_action(target: str):
+async def traceroute_action(target: str):
     """
     Traceroute to the target
     """
     cmd = TracerouteCommand()
     command = ["traceroute", target]
-    return cmd.execute(command)
+    return await cmd.execute(command)
+
+async def trace_path(target: str, max_hops: int, queries: int, ttl: int, use_cache: bool) -> dict:
+    """Trace one destination once a worker slot is free and parse its hops"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(TRACEROUTE_WORKERS)
+    cmd = TracerouteCommand(max_age=ttl)
+    command = ["traceroute", "-n", "-m", str(max_hops), "-q", str(queries), target]
+    with QUEUE_WAIT_SECONDS.time("traceroute_workers"):
+        await _slots.acquire()
+    try:
+        stdout, stderr = await cmd.execute(command, use_cache=use_cache)
+    finally:
+        _slots.release()
+    path = {"target": target, **parse_traceroute(stdout), "cached": cmd.cached}
+    if not path["hops"] and stderr.strip():
+        path["error"] = stderr.strip()
+    return path
+
+async def multi_traceroute_action(targets: list[str], max_hops: int = 30, queries: int = 3,
+                                  ttl: int = TRACEROUTE_TTL, use_cache: bool = True,
+                                  on_output: Optional[OutputCallback] = None) -> dict:
+    """
+    Traceroute to many destinations in parallel and merge the paths
+    For example: traceroute -n -m 30 -q 3 <target>, for every target, at most
+    KALI_MCPS_TRACEROUTE_WORKERS at once. Paths traced less than ttl seconds
+    ago are reused. on_output receives one JSON line per path as soon as it is traced
+    Args:
+        targets: Addresses, host names, CIDR blocks or octet ranges
+        max_hops: Maximum TTL probed
+        queries: Probes per hop
+        ttl: Maximum age in seconds of reused paths
+        use_cache: Reuse and store paths in the result cache
+    Returns:
+        {"summary", "paths", "graph"} where graph merges shared hops into single nodes
+    """
+    try:
+        destinations = expand_targets(" ".join(targets))
+        # checked after expansion, commas split further targets out of a token
+        split_targets(" ".join(destinations))
+    except ValueError as e:
+        return {"error": str(e)}
+    if len(destinations) > MAX_TARGETS:
+        return {"error": f"{len(destinations)} destinations, at most {MAX_TARGETS} can be traced in one call"}
+    started = time.monotonic()
+
+    paths = []
+    tasks = [asyncio.ensure_future(trace_path(target, max_hops, queries, ttl, use_cache))
+             for target in destinations]
+    try:
+        for next_path in asyncio.as_completed(tasks):
+            path = await next_path
+            paths.append(path)
+            if on_output:
+                await on_output(json.dumps(path) + "\n")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    order = {target: index for index, target in enumerate(destinations)}
+    paths.sort(key=lambda path: order[path["target"]])
+    graph = merge_paths(paths)
+    return {
+        "summary": {
+            "targets": len(destinations),
+            "reached": sum(path["reached"] for path in paths),
+            "errors": sum("error" in path for path in paths),
+            "cached": sum(path["cached"] for path in paths),
+            "nodes": len(graph["nodes"]),
+            "edges": len(graph["edges"]),
+            "elapsed": round(time.monotonic() - started, 2),
+        },
+        "paths": paths,
+        "graph": graph,
+    }
 
 
 if __name__ == "__main__":
-    print(traceroute_action("8.8.8.8"))
\ No newline at end of file
+    print(asyncio.run(traceroute_action("8.8.8.8")))
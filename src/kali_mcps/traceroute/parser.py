@@ -0,0 +1,155 @@
+"""
+Parse traceroute output into hop records and merge paths into one graph
+"""
+import re
+import math
+import ipaddress
+from typing import Optional
+
+SOURCE = "source"
+
+_HEADER = re.compile(r"traceroute(?:6)? to (\S+) \(([^)]+)\)")
+_HOP = re.compile(r"\s*(\d+)\s+(.*)")
+_RTT = re.compile(r"\d+(?:\.\d+)?$")
+
+
+def _is_address(token: str) -> bool:
+    try:
+        ipaddress.ip_address(token.split("%", 1)[0])
+    except ValueError:
+        return False
+    return True
+
+
+def parse_hop(text: str) -> list[dict]:
+    """
+    Parse the probes of one hop line, after the TTL
+    e.g. 'r1.example.net (192.0.2.1)  0.412 ms  0.398 ms 192.0.2.9 (192.0.2.9)  0.5 ms !H'
+    Returns:
+        One {"address", "host", "rtt"} per probe; address and rtt are None for a lost probe
+    """
+    probes = []
+    address = host = None
+    tokens = text.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "*":
+            probes.append({"address": None, "host": None, "rtt": None})
+        elif token.startswith("!"):
+            # !H, !N, !P, !X, !<code>: unreachable annotation of the last probe
+            if probes:
+                probes[-1]["flag"] = token
+        elif _RTT.match(token) and i + 1 < len(tokens) and tokens[i + 1] == "ms":
+            probes.append({"address": address, "host": host, "rtt": float(token)})
+            i += 1
+        elif i + 1 < len(tokens) and tokens[i + 1].startswith("(") and tokens[i + 1].endswith(")"):
+            host, address = token, tokens[i + 1][1:-1]
+            i += 1
+        elif _is_address(token):
+            host, address = None, token
+        i += 1
+    return probes
+
+
+def parse_traceroute(text: str) -> dict:
+    """
+    Parse the output of traceroute (with or without -n)
+    Returns:
+        {"destination", "address", "hops": [{"ttl", "probes"}], "reached"}
+    """
+    destination = address = None
+    hops = []
+    for line in text.splitlines():
+        header = _HEADER.search(line)
+        if header:
+            destination, address = header.groups()
+            continue
+        hop = _HOP.match(line)
+        if hop:
+            hops.append({"ttl": int(hop.group(1)), "probes": parse_hop(hop.group(2))})
+
+    reached = bool(hops) and address is not None and any(
+        probe["address"] == address for probe in hops[-1]["probes"]
+    )
+    return {"destination": destination, "address": address, "hops": hops, "reached": reached}
+
+
+def rtt_stats(rtts: list) -> Optional[dict]:
+    """min/avg/max/stdev of round trip times in ms, like ping's summary"""
+    if not rtts:
+        return None
+    avg = sum(rtts) / len(rtts)
+    return {
+        "count": len(rtts),
+        "min": min(rtts),
+        "avg": round(avg, 3),
+        "max": max(rtts),
+        "stdev": round(math.sqrt(sum((rtt - avg) ** 2 for rtt in rtts) / len(rtts)), 3),
+    }
+
+
+def merge_paths(paths: list[dict]) -> dict:
+    """
+    Merge the parsed paths to many destinations into one deduplicated graph
+    A router on the way to several destinations is a single node whose
+    RTT statistics cover every probe it answered. Hops that answered no
+    probe are kept as anonymous nodes, shared by paths that leave the same
+    known hop at the same TTL, so a silent router does not split the graph.
+    Args:
+        paths: Results of parse_traceroute, each with a "target"
+    Returns:
+        {"nodes": [{"id", "address", "host", "ttl", "destinations", "rtt"}],
+         "edges": [{"from", "to", "destinations"}]}
+    """
+    nodes: dict = {}
+    edges: dict = {}
+
+    def node(node_id: str, address: Optional[str], host: Optional[str]) -> dict:
+        if node_id not in nodes:
+            nodes[node_id] = {"id": node_id, "address": address, "host": host,
+                              "ttls": set(), "targets": set(), "rtts": []}
+        return nodes[node_id]
+
+    for path in paths:
+        target = path["target"]
+        previous = [SOURCE]
+        last_known = SOURCE
+        for hop in path["hops"]:
+            answered = {}
+            for probe in hop["probes"]:
+                if probe["address"] is None:
+                    continue
+                current = node(probe["address"], probe["address"], probe["host"])
+                if probe["rtt"] is not None:
+                    current["rtts"].append(probe["rtt"])
+                answered[probe["address"]] = current
+            if not answered:
+                anonymous = f"*{hop['ttl']}@{last_known}"
+                answered = {anonymous: node(anonymous, None, None)}
+            else:
+                last_known = next(iter(answered))
+            for node_id, current in answered.items():
+                current["ttls"].add(hop["ttl"])
+                current["targets"].add(target)
+                for parent in previous:
+                    edges.setdefault((parent, node_id), set()).add(target)
+            previous = list(answered)
+
+    return {
+        "nodes": [
+            {
+                "id": item["id"],
+                "address": item["address"],
+                "host": item["host"],
+                "ttl": sorted(item["ttls"]),
+                "destinations": len(item["targets"]),
+                "rtt": rtt_stats(item["rtts"]),
+            }
+            for item in nodes.values()
+        ],
+        "edges": [
+            {"from": parent, "to": child, "destinations": len(targets)}
+            for (parent, child), targets in edges.items()
+        ],
+    }
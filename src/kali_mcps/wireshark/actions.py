@@ -1,40 +1,159 @@
+import os
 import asyncio
-from src.kali_mcps.base.kali_command import CommandRunner
+from typing import Callable, Optional
+from src.kali_mcps.base.kali_command import CommandRunner, OutputCallback, OutputCollector
+from src.kali_mcps.wireshark import columnar
+from src.kali_mcps.wireshark.capture import CaptureError, get_capture_manager
+from src.kali_mcps.wireshark.columnar import PcapColumns, PcapStoreError, get_pcap_store
+
+# set KALI_MCPS_PCAP_STORE=false to run tshark for every pcap query
+PCAP_STORE = os.environ.get("KALI_MCPS_PCAP_STORE", "true").lower() == "true"
+# packets rendered from the store per chunk of streamed output
+RENDER_ROWS = 1000
 
 class TsharkCommand(CommandRunner):
+    remote = True
     def __init__(self):
         super().__init__("tshark", 
                         network_enabled=True,  # 需要网络访问
                         memory_limit="2g",     # 需要更多内存
                         timeout=300)           # 需要更长的超时时间
 
-def capture_live_action(interface: str, duration: int = 30, filter: str = "") -> tuple[str, str]:
+async def from_store(pcap_file: str, render: Callable[[PcapColumns], str]) -> Optional[tuple[str, str]]:
+    """
+    Answer a pcap query from the columnar store
+    Returns:
+        (stdout, stderr), or None if tshark has to answer the query itself
+    """
+    if not PCAP_STORE:
+        return None
+    try:
+        cols = await get_pcap_store().open(pcap_file, TsharkCommand)
+        return await asyncio.to_thread(render, cols), ""
+    except PcapStoreError:
+        return None
+
+async def packets_from_store(pcap_file: str, display_filter: str = "",
+                             on_output: Optional[OutputCallback] = None) -> Optional[tuple[str, str]]:
+    """
+    Packet summaries from the columnar store, rendered and forwarded RENDER_ROWS packets at a time
+    Rendering stops once the output budget of TsharkCommand is used up.
+    Returns:
+        (stdout, stderr), or None if tshark has to answer the query itself
+    """
+    if not PCAP_STORE:
+        return None
+    try:
+        cols = await get_pcap_store().open(pcap_file, TsharkCommand)
+        rows = await asyncio.to_thread(columnar.select, cols, display_filter)
+    except PcapStoreError:
+        return None
+    collector = OutputCollector(TsharkCommand.max_output_bytes)
+    omitted = 0
+    for start in range(0, len(rows), RENDER_ROWS):
+        batch = rows[start:start + RENDER_ROWS]
+        text = await asyncio.to_thread(columnar.render_packets, cols, batch)
+        room = collector.max_bytes - collector.kept
+        collector.add(text)
+        data = text.encode("utf-8")
+        if len(data) > room:
+            # only what fits into the budget goes to the client
+            text = data[:room].decode("utf-8", errors="ignore")
+        if on_output and text:
+            await on_output(text)
+        if collector.dropped:
+            omitted = len(rows) - start - len(batch)
+            break
+    output = collector.text()
+    if omitted:
+        output += f"[{omitted} more packets not rendered]\n"
+    return output, ""
+
+async def capture_live_action(interface: str, duration: int = 30, filter: str = "",
+                              on_output: Optional[OutputCallback] = None) -> tuple[str, str]:
     """
     Capture live traffic from network interface
     For example: tshark -i eth0 -a duration:30 -f "port 80"
+    on_output receives decoded packets while the capture runs
     """
     cmd = TsharkCommand()
+    cmd.timeout = max(cmd.timeout, duration + 60)
     command = ["tshark", "-i", interface, "-a", f"duration:{duration}"]
     if filter:
         command.extend(["-f", filter])
-    return cmd.execute(command)
+    return await cmd.execute(command, on_output=on_output)
+
+async def start_capture_action(interface: str, filter: str = "", duration: int = 0,
+                               ring_file_kb: int = 16 * 1024, ring_files: int = 8) -> dict:
+    """
+    Start a live capture into a ring buffer and return its id right away
+    For example: tshark -i eth0 -w ring.pcapng -b filesize:16384 -b files:8 -P -T fields ...
+    At most ring_files * ring_file_kb KiB are kept on disk; statistics are
+    updated per packet while the capture runs
+    """
+    try:
+        session = await get_capture_manager().start(interface, filter, duration, ring_file_kb, ring_files)
+    except CaptureError as e:
+        return {"error": str(e)}
+    return session.status()
 
-def analyze_pcap_action(pcap_file: str, display_filter: str = "") -> tuple[str, str]:
+async def poll_capture_action(capture_id: str, limit: int = 10) -> dict:
+    """
+    State and rolling statistics of a capture: packet and byte totals and
+    rates, top talkers and protocol mix
+    """
+    try:
+        return get_capture_manager().get(capture_id).status(limit)
+    except CaptureError as e:
+        return {"error": str(e)}
+
+async def snapshot_capture_action(capture_id: str) -> dict:
+    """
+    Copy the ring files captured so far, e.g. for analyze_pcap or query_pcap,
+    while the capture keeps running
+    """
+    try:
+        return await get_capture_manager().get(capture_id).snapshot()
+    except CaptureError as e:
+        return {"error": str(e)}
+
+async def stop_capture_action(capture_id: str, keep_files: bool = True) -> dict:
+    """
+    Stop a capture and return its final statistics and ring files
+    """
+    manager = get_capture_manager()
+    try:
+        session = await manager.stop(capture_id, keep_files)
+    except CaptureError as e:
+        return {"error": str(e)}
+    files = await session.ring() if keep_files else []
+    return {**session.status(), "files": files}
+
+async def analyze_pcap_action(pcap_file: str, display_filter: str = "",
+                              on_output: Optional[OutputCallback] = None) -> tuple[str, str]:
     """
     Analyze existing pcap file
     For example: tshark -r file.pcap -Y "http"
+    on_output receives decoded packets while tshark runs
     """
+    result = await packets_from_store(pcap_file, display_filter, on_output)
+    if result is not None:
+        return result
+
     cmd = TsharkCommand()
     command = ["tshark", "-r", pcap_file]
     if display_filter:
         command.extend(["-Y", display_filter])
-    return cmd.execute(command)
+    return await cmd.execute(command, on_output=on_output)
 
-def extract_http_action(pcap_file: str) -> tuple[str, str]:
+async def extract_http_action(pcap_file: str) -> tuple[str, str]:
     """
     Extract HTTP objects from pcap file
     For example: tshark -r file.pcap -Y "http" -T fields -e http.request.method -e http.request.uri
     """
+    result = await from_store(pcap_file, columnar.render_http_requests)
+    if result is not None:
+        return result
     cmd = TsharkCommand()
     command = [
         "tshark", "-r", pcap_file,
@@ -43,36 +162,59 @@ def extract_http_action(pcap_file: str) -> tuple[str, str]:
         "-e", "http.request.method",
         "-e", "http.request.uri"
     ]
-    return cmd.execute(command)
+    return await cmd.execute(command)
 
-def protocol_hierarchy_action(pcap_file: str) -> tuple[str, str]:
+async def protocol_hierarchy_action(pcap_file: str) -> tuple[str, str]:
     """
     Show protocol hierarchy statistics
     For example: tshark -r file.pcap -q -z io,phs
     """
+    result = await from_store(pcap_file, columnar.render_protocol_hierarchy)
+    if result is not None:
+        return result
     cmd = TsharkCommand()
     command = ["tshark", "-r", pcap_file, "-q", "-z", "io,phs"]
-    return cmd.execute(command)
+    return await cmd.execute(command)
 
-def conversation_statistics_action(pcap_file: str) -> tuple[str, str]:
+async def conversation_statistics_action(pcap_file: str) -> tuple[str, str]:
     """
     Show conversation statistics
     For example: tshark -r file.pcap -q -z conv,ip
     """
+    result = await from_store(pcap_file, columnar.render_ip_conversations)
+    if result is not None:
+        return result
     cmd = TsharkCommand()
     command = ["tshark", "-r", pcap_file, "-q", "-z", "conv,ip"]
-    return cmd.execute(command)
+    return await cmd.execute(command)
 
-def expert_info_action(pcap_file: str) -> tuple[str, str]:
+async def expert_info_action(pcap_file: str) -> tuple[str, str]:
     """
     Show expert information (errors, warnings, notes)
     For example: tshark -r file.pcap -q -z expert
     """
+    result = await from_store(pcap_file, columnar.render_expert_info)
+    if result is not None:
+        return result
     cmd = TsharkCommand()
     command = ["tshark", "-r", pcap_file, "-q", "-z", "expert"]
-    return cmd.execute(command)
+    return await cmd.execute(command)
+
+async def query_pcap_action(pcap_file: str, display_filter: str = "", group_by: str = "",
+                            limit: int = 50) -> dict:
+    """
+    Filter and aggregate packets from the columnar store
+    display_filter supports protocol names, ip.src/ip.dst/ip.addr (with CIDR),
+    tcp/udp ports, frame.len and http.request.method/uri with and/or/not
+    For example: query_pcap_action("file.pcap", "tcp.port == 443", group_by="ip.dst")
+    """
+    try:
+        cols = await get_pcap_store().open(pcap_file, TsharkCommand)
+        return await asyncio.to_thread(columnar.query, cols, display_filter, group_by, limit)
+    except PcapStoreError as e:
+        return {"error": str(e)}
 
 if __name__ == "__main__":
     # Test example
     pcap_file = "capture.pcap"
-    print(protocol_hierarchy_action(pcap_file))
+    print(asyncio.run(protocol_hierarchy_action(pcap_file)))
@@ -0,0 +1,392 @@
+"""
+Long-running live captures into an on-disk ring buffer, with rolling statistics
+"""
+import os
+import time
+import uuid
+import shutil
+import signal
+import asyncio
+from collections import deque
+from typing import Optional
+from src.kali_mcps.base.kali_command import CommandRunner
+from src.sandbox import PooledContainer, get_container_pool
+
+CAPTURE_DIR = os.environ.get(
+    "KALI_MCPS_CAPTURE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "captures")
+)
+# captures running at once
+MAX_CAPTURES = int(os.environ.get("KALI_MCPS_MAX_CAPTURES", "4"))
+# stopped captures whose state and statistics are still kept for polling
+MAX_FINISHED = 32
+# seconds to wait for tshark to close its ring file after SIGINT
+STOP_GRACE = 10
+
+SEPARATOR = "\x1e"
+# frame.protocols is named the same in every tshark version, unlike the protocol column
+FIELDS = ("frame.time_epoch", "frame.len", "ip.src", "ip.dst", "ipv6.src", "ipv6.dst", "frame.protocols")
+# layers that name no protocol of their own
+_GENERIC_LAYERS = {"data", "ethertype", "eth", "sll", "frame"}
+
+
+class CaptureError(Exception):
+    """Raised when a capture cannot be started or does not exist"""
+    pass
+
+
+class CaptureCommand(CommandRunner):
+    # a capture belongs to the session that started it
+    coalesce = False
+    # packets go straight into the statistics, the text itself is not kept
+    max_output_bytes = 64 * 1024
+
+    def __init__(self):
+        super().__init__("tshark", network_enabled=True, memory_limit="2g", timeout=300)
+
+
+class TopCounter:
+    """
+    Packet and byte counters per key in bounded memory.
+
+    Keeps at most 2 * capacity keys; beyond that only the capacity keys
+    with the most bytes survive, so the largest entries are exact unless
+    a key was pruned and came back, in which case it restarts from zero.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self.pruned = 0
+
+    def add(self, key: str, length: int) -> None:
+        counts = self.counts.get(key)
+        if counts is None:
+            if len(self.counts) >= 2 * self.capacity:
+                self._prune()
+            counts = self.counts[key] = [0, 0]
+        counts[0] += 1
+        counts[1] += length
+
+    def _prune(self) -> None:
+        kept = sorted(self.counts.items(), key=lambda item: item[1][1], reverse=True)[:self.capacity]
+        self.pruned += len(self.counts) - len(kept)
+        self.counts = dict(kept)
+
+    def top(self, limit: int) -> list:
+        """The limit keys with the most bytes, as (key, packets, bytes)"""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [(key, packets, size) for key, (packets, size) in ranked]
+
+
+class RollingStats:
+    """
+    Capture statistics updated per packet in constant memory
+
+    Totals, per-second packet and byte counts over the last window
+    seconds, top talkers by address and the protocol mix.
+    """
+
+    def __init__(self, window: int = 60, capacity: int = 1024):
+        self.window = window
+        self.packets = 0
+        self.bytes = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        # [second, packets, bytes], oldest first
+        self.seconds: deque = deque(maxlen=window)
+        self.talkers = TopCounter(capacity)
+        self.protocols = TopCounter(capacity)
+        self.malformed = 0
+        self._partial = ""
+
+    def add(self, timestamp: float, length: int, addresses: tuple, protocol: str) -> None:
+        self.packets += 1
+        self.bytes += length
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+        second = int(timestamp)
+        if self.seconds and self.seconds[-1][0] == second:
+            self.seconds[-1][1] += 1
+            self.seconds[-1][2] += length
+        elif not self.seconds or second > self.seconds[-1][0]:
+            self.seconds.append([second, 1, length])
+        for address in addresses:
+            self.talkers.add(address, length)
+        self.protocols.add(protocol, length)
+
+    def feed(self, chunk: str) -> None:
+        """Add the packets of a chunk of tshark field output"""
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            values = line.rstrip("\r").split(SEPARATOR)
+            if len(values) != len(FIELDS):
+                # tshark's own messages share the output in the sandbox
+                continue
+            timestamp, length, ip_src, ip_dst, ip6_src, ip6_dst, stack = values
+            try:
+                timestamp, length = float(timestamp), int(length)
+            except ValueError:
+                self.malformed += 1
+                continue
+            addresses = tuple(address for address in {ip_src or ip6_src, ip_dst or ip6_dst} if address)
+            self.add(timestamp, length, addresses, protocol_of(stack))
+
+    def snapshot(self, limit: int = 10) -> dict:
+        """Totals, rates and the top talkers and protocols"""
+        duration = (self.last - self.first) if self.packets else 0.0
+        # the current second is still filling up
+        recent = list(self.seconds)[:-1] if len(self.seconds) > 1 else list(self.seconds)
+        span = (recent[-1][0] - recent[0][0] + 1) if recent else 0
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "duration": round(duration, 3),
+            "rate": {
+                "window": span,
+                "packets_per_second": round(sum(item[1] for item in recent) / span, 2) if span else 0.0,
+                "bytes_per_second": round(sum(item[2] for item in recent) / span, 2) if span else 0.0,
+                "average_packets_per_second": round(self.packets / duration, 2) if duration else 0.0,
+                "average_bytes_per_second": round(self.bytes / duration, 2) if duration else 0.0,
+            },
+            "top_talkers": [{"address": address, "packets": packets, "bytes": size}
+                            for address, packets, size in self.talkers.top(limit)],
+            "protocols": [{"protocol": protocol, "packets": packets, "bytes": size}
+                          for protocol, packets, size in self.protocols.top(limit)],
+        }
+
+
+def protocol_of(stack: str) -> str:
+    """Highest named layer of a frame.protocols stack, e.g. 'eth:ethertype:ip:tcp:tls' -> 'tls'"""
+    layers = [layer for layer in stack.split(":") if layer and layer not in _GENERIC_LAYERS]
+    return layers[-1] if layers else "other"
+
+
+class CaptureSession:
+    """
+    One tshark process writing a ring buffer of capture files.
+
+    tshark keeps at most ring_files files of ring_file_kb KiB each and
+    prints the fields of every packet, which feed the rolling statistics.
+    In safe mode the capture runs in a sandbox container held for the
+    lifetime of the session; its ring files are copied out on snapshot
+    and stop.
+    """
+
+    def __init__(self, interface: str, capture_filter: str = "", duration: int = 0,
+                 ring_file_kb: int = 16 * 1024, ring_files: int = 8, capture_dir: str = CAPTURE_DIR):
+        """
+        Initialize CaptureSession
+        Args:
+            interface: Interface to capture on
+            capture_filter: Capture (BPF) filter
+            duration: Stop after this many seconds (0: run until stopped)
+            ring_file_kb: Size of one ring buffer file in KiB
+            ring_files: Number of ring buffer files kept
+            capture_dir: Directory holding the capture directories
+        """
+        self.id = uuid.uuid4().hex[:16]
+        self.interface = interface
+        self.capture_filter = capture_filter
+        self.duration = duration
+        self.ring_file_kb = ring_file_kb
+        self.ring_files = ring_files
+        self.directory = os.path.join(capture_dir, self.id)
+        self.stats = RollingStats()
+        self.state = "starting"
+        self.error = ""
+        self.started = time.time()
+        self.stopped: Optional[float] = None
+        self.snapshots = 0
+        self._runner = CaptureCommand()
+        # tshark stops itself after the duration; an open-ended capture runs until stopped
+        self._runner.timeout = duration + 60 if duration else 0
+        self._pooled: Optional[PooledContainer] = None
+        self._remote_dir: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def command(self, ring_dir: str) -> list:
+        command = ["tshark", "-i", self.interface, "-l", "-n",
+                   "-w", f"{ring_dir}/ring.pcapng",
+                   "-b", f"filesize:{self.ring_file_kb}", "-b", f"files:{self.ring_files}",
+                   "-P", "-T", "fields", "-E", f"separator={SEPARATOR}", "-E", "occurrence=f"]
+        for field in FIELDS:
+            command += ["-e", field]
+        if self.duration:
+            command += ["-a", f"duration:{self.duration}"]
+        if self.capture_filter:
+            command += ["-f", self.capture_filter]
+        return command
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        async def feed(chunk: str):
+            self.stats.feed(chunk)
+
+        if self._runner.IS_SAFE:
+            pool = get_container_pool()
+            self._pooled = await pool.checkout(self._runner.sandbox_settings())
+            self._remote_dir = f"{pool.scratch_dir}/capture_{self.id}"
+            await self._pooled.client.run_command(["mkdir", "-p", self._remote_dir])
+            run = self._runner.run_with_sandbox(self.command(self._remote_dir), on_output=feed,
+                                                pooled=self._pooled)
+        else:
+            run = self._runner.run_command(self.command(self.directory), on_output=feed)
+        self._task = asyncio.ensure_future(run)
+        self._task.add_done_callback(self._finished)
+        self.state = "running"
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self.stopped = self.stopped or time.time()
+        if task.cancelled():
+            self.state = "stopped"
+            return
+        _, stderr = task.result()
+        returncode = getattr(self._runner, "returncode", None)
+        if returncode is None:
+            # tshark could not be started, or the sandbox failed
+            failed = bool(stderr.strip())
+        else:
+            # SIGINT from stop() is not a failure
+            failed = returncode != 0 and not self._stopping
+        if failed:
+            self.error = stderr.strip()
+        self.state = "failed" if failed else "stopped"
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def ring(self) -> list:
+        """Ring files in capture order, copied out of the sandbox first in safe mode"""
+        if self._pooled is not None and self._remote_dir is not None:
+            listing = await self._pooled.client.run_command(["ls", "-1", self._remote_dir])
+            names = [name.strip() for name in listing.splitlines() if name.strip().endswith(".pcapng")]
+            await self._pooled.client.copy_files_from_container(
+                {f"{self._remote_dir}/{name}": os.path.join(self.directory, name) for name in names}
+            )
+            # files tshark rotated away in the container are gone there as well
+            for name in set(os.listdir(self.directory)) - set(names):
+                if name.endswith(".pcapng"):
+                    os.remove(os.path.join(self.directory, name))
+        # ring file names carry a sequence number, so name order is capture order
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".pcapng")
+        )
+
+    async def snapshot(self) -> dict:
+        """Copy the current ring files to a directory of their own, e.g. for analyze_pcap"""
+        files = await self.ring()
+        self.snapshots += 1
+        destination = os.path.join(self.directory, "snapshots", str(self.snapshots))
+
+        def copy() -> list:
+            os.makedirs(destination, exist_ok=True)
+            copied = []
+            for path in files:
+                target = os.path.join(destination, os.path.basename(path))
+                try:
+                    shutil.copyfile(path, target)
+                except FileNotFoundError:
+                    # rotated away while copying
+                    continue
+                copied.append(target)
+            return copied
+
+        return {**self.status(), "files": await asyncio.to_thread(copy)}
+
+    async def stop(self) -> None:
+        """Stop tshark so it closes its ring file, then release the sandbox container"""
+        if self.running:
+            self._stopping = True
+            if self._pooled is not None:
+                try:
+                    await self._pooled.client.run_command(["pkill", "-INT", "-f", self._remote_dir])
+                except Exception:
+                    pass
+            elif getattr(self._runner, "process", None) is not None and self._runner.process.returncode is None:
+                self._runner.process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), STOP_GRACE)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            except Exception:
+                pass
+        if self._pooled is not None:
+            try:
+                await self.ring()
+            except Exception as e:
+                self.error = self.error or f"ring files not copied: {e}"
+            await get_container_pool().checkin(self._pooled)
+            self._pooled = None
+
+    def status(self, limit: int = 10) -> dict:
+        return {
+            "capture_id": self.id,
+            "interface": self.interface,
+            "filter": self.capture_filter,
+            "state": self.state,
+            "started": self.started,
+            "elapsed": round((self.stopped or time.time()) - self.started, 2),
+            "ring": {"directory": self.directory, "file_kb": self.ring_file_kb, "files": self.ring_files},
+            "stats": self.stats.snapshot(limit),
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+class CaptureManager:
+    """Running and recently stopped captures of this process"""
+
+    def __init__(self, max_captures: int = MAX_CAPTURES, capture_dir: str = CAPTURE_DIR):
+        self.max_captures = max_captures
+        self.capture_dir = capture_dir
+        self.sessions: dict = {}
+
+    async def start(self, interface: str, capture_filter: str = "", duration: int = 0,
+                    ring_file_kb: int = 16 * 1024, ring_files: int = 8) -> CaptureSession:
+        running = sum(session.running for session in self.sessions.values())
+        if running >= self.max_captures:
+            raise CaptureError(f"{running} captures are running, stop one first (limit {self.max_captures})")
+        if ring_file_kb <= 0 or ring_files <= 0:
+            raise CaptureError("ring_file_kb and ring_files must be positive")
+        session = CaptureSession(interface, capture_filter, duration, ring_file_kb, ring_files, self.capture_dir)
+        await session.start()
+        self.sessions[session.id] = session
+        self._forget_finished()
+        return session
+
+    def get(self, capture_id: str) -> CaptureSession:
+        if capture_id not in self.sessions:
+            raise CaptureError(f"unknown capture {capture_id}")
+        return self.sessions[capture_id]
+
+    async def stop(self, capture_id: str, keep_files: bool = True) -> CaptureSession:
+        session = self.get(capture_id)
+        await session.stop()
+        if not keep_files:
+            await asyncio.to_thread(shutil.rmtree, session.directory, True)
+        return session
+
+    async def stop_all(self) -> None:
+        await asyncio.gather(*(session.stop() for session in self.sessions.values() if session.running),
+                             return_exceptions=True)
+
+    def _forget_finished(self) -> None:
+        finished = sorted((session for session in self.sessions.values() if not session.running),
+                          key=lambda session: session.stopped or 0)
+        for session in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            del self.sessions[session.id]
+
+
+_capture_manager: Optional[CaptureManager] = None
+
+
+def get_capture_manager() -> CaptureManager:
+    """Return the process-wide capture manager"""
+    global _capture_manager
+    if _capture_manager is None:
+        _capture_manager = CaptureManager()
+    return _capture_manager
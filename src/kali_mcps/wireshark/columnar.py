@@ -0,0 +1,800 @@
+"""
+Columnar, memory-mapped packet store for answering repeated queries on one capture
+
+A capture is dissected once with `tshark -T fields`; every field becomes a
+numpy column on disk (strings are dictionary-encoded), and later queries
+run as vectorized operations over the memory-mapped columns.
+"""
+import os
+import re
+import json
+import shutil
+import asyncio
+import hashlib
+import ipaddress
+from collections import OrderedDict
+from typing import Callable, Optional
+import numpy as np
+from src.kali_mcps.base.kali_command import CommandRunner
+
+PCAP_STORE_DIR = os.environ.get(
+    "KALI_MCPS_PCAP_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kali_mcps", "pcap")
+)
+# ingested captures are evicted, least recently used first, beyond this many bytes
+PCAP_STORE_MAX_BYTES = int(os.environ.get("KALI_MCPS_PCAP_STORE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+FORMAT_VERSION = 1
+
+# control characters that do not appear in dissected field values
+SEPARATOR = "\x1e"
+AGGREGATOR = "\x1f"
+
+# column -> tshark field; Wireshark 4.2 renamed the column fields
+FIELDS = {
+    "number": "frame.number",
+    "time": "frame.time_relative",
+    "length": "frame.len",
+    "stack": "frame.protocols",
+    "ip_src": "ip.src",
+    "ip_dst": "ip.dst",
+    "ip6_src": "ipv6.src",
+    "ip6_dst": "ipv6.dst",
+    "tcp_srcport": "tcp.srcport",
+    "tcp_dstport": "tcp.dstport",
+    "udp_srcport": "udp.srcport",
+    "udp_dstport": "udp.dstport",
+    "source": "_ws.col.def_src",
+    "destination": "_ws.col.def_dst",
+    "protocol": "_ws.col.protocol",
+    "info": "_ws.col.info",
+    "http_method": "http.request.method",
+    "http_uri": "http.request.uri",
+    "expert_severity": "_ws.expert.severity",
+    "expert_group": "_ws.expert.group",
+    "expert_message": "_ws.expert.message",
+}
+LEGACY_FIELDS = dict(FIELDS, **{
+    "source": "_ws.col.Source",
+    "destination": "_ws.col.Destination",
+    "protocol": "_ws.col.Protocol",
+    "info": "_ws.col.Info",
+})
+
+DICTIONARY_COLUMNS = ("stack", "src", "dst", "source", "destination", "protocol", "http_method", "http_uri")
+# column -> type on disk
+COLUMN_TYPES = dict({
+    "number": np.int64,
+    "time": np.float64,
+    "length": np.int64,
+    "transport": np.int8,
+    "src_port": np.int32,
+    "dst_port": np.int32,
+    "info_offsets": np.int64,
+    "expert_row": np.int64,
+    "expert_severity": np.int32,
+    "expert_group": np.int32,
+    "expert_message": np.int32,
+}, **{name: np.int32 for name in DICTIONARY_COLUMNS})
+# packets buffered in memory while ingesting before they are appended to the column files
+CHUNK_ROWS = 64 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# expert info severities and groups (epan/proto.h)
+SEVERITIES = {0x00100000: "Comment", 0x00200000: "Chat", 0x00400000: "Note",
+              0x00600000: "Warning", 0x00800000: "Error"}
+SEVERITY_LABELS = [("Error", "Errors"), ("Warning", "Warns"), ("Note", "Notes"),
+                   ("Chat", "Chats"), ("Comment", "Comments")]
+GROUPS = {
+    0x01000000: "Checksum", 0x02000000: "Sequence", 0x03000000: "Response code",
+    0x04000000: "Request code", 0x05000000: "Undecoded", 0x06000000: "Reassemble",
+    0x07000000: "Malformed", 0x08000000: "Debug", 0x09000000: "Protocol",
+    0x0a000000: "Security", 0x0b000000: "Comment", 0x0c000000: "Decryption",
+    0x0d000000: "Assumption", 0x0e000000: "Deprecated",
+}
+
+
+class PcapStoreError(Exception):
+    """The capture could not be ingested or the query cannot be answered from the store"""
+
+
+def _named(value: str, names: dict) -> str:
+    try:
+        return names.get(int(value, 0), value)
+    except ValueError:
+        return value
+
+
+def _int_or(value: str, default: int = -1) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+class _Dictionary:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.values = [""]
+        self.codes = {"": 0}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Ingester:
+    """
+    Turn `tshark -T fields` lines into column files
+
+    Rows are buffered for CHUNK_ROWS packets at a time and then appended to
+    raw column files in the target directory, so memory stays bounded by the
+    chunk size and the string dictionaries; `write` turns them into .npy files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pending = ""
+        self.rows = 0
+        self.dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+        self.expert_dictionary = _Dictionary()
+        self.buffers = {name: [] for name in COLUMN_TYPES}
+        self.counts = {name: 0 for name in COLUMN_TYPES}
+        self.info = bytearray()
+        self.info_size = 0
+        self.buffers["info_offsets"].append(0)
+        # left over by an ingestion that did not finish
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        self._files = {name: open(os.path.join(directory, f"{name}.raw"), "wb") for name in COLUMN_TYPES}
+        self._files["info"] = open(os.path.join(directory, "info.bin"), "wb")
+
+    def feed(self, chunk: str) -> None:
+        lines = (self.pending + chunk).split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self._row(line)
+
+    def close(self) -> None:
+        if self.pending:
+            self._row(self.pending)
+            self.pending = ""
+
+    def _row(self, line: str) -> None:
+        values = line.rstrip("\r").split(SEPARATOR)
+        if len(values) != len(FIELDS):
+            return  # not a field line, e.g. a warning mixed into the stream
+        row = dict(zip(FIELDS, values))
+        first = {name: value.split(AGGREGATOR, 1)[0] for name, value in row.items()}
+        columns = self.buffers
+        columns["number"].append(_int_or(first["number"], self.rows + 1))
+        try:
+            columns["time"].append(float(first["time"] or 0))
+        except ValueError:
+            columns["time"].append(0.0)
+        columns["length"].append(_int_or(first["length"], 0))
+        if first["tcp_srcport"]:
+            transport, src_port, dst_port = 1, first["tcp_srcport"], first["tcp_dstport"]
+        elif first["udp_srcport"]:
+            transport, src_port, dst_port = 2, first["udp_srcport"], first["udp_dstport"]
+        else:
+            transport, src_port, dst_port = 0, "", ""
+        columns["transport"].append(transport)
+        columns["src_port"].append(_int_or(src_port))
+        columns["dst_port"].append(_int_or(dst_port))
+
+        strings = {
+            "stack": first["stack"],
+            "src": first["ip_src"] or first["ip6_src"],
+            "dst": first["ip_dst"] or first["ip6_dst"],
+            "source": first["source"],
+            "destination": first["destination"],
+            "protocol": first["protocol"],
+            "http_method": row["http_method"].replace(AGGREGATOR, ","),
+            "http_uri": row["http_uri"].replace(AGGREGATOR, ","),
+        }
+        for name, value in strings.items():
+            columns[name].append(self.dictionaries[name].code(value))
+        self.info += row["info"].replace(AGGREGATOR, ",").encode("utf-8")
+        columns["info_offsets"].append(self.info_size + len(self.info))
+
+        if row["expert_message"]:
+            items = zip(row["expert_severity"].split(AGGREGATOR), row["expert_group"].split(AGGREGATOR),
+                        row["expert_message"].split(AGGREGATOR))
+            for severity, group, message in items:
+                columns["expert_row"].append(self.rows)
+                columns["expert_severity"].append(self.expert_dictionary.code(_named(severity, SEVERITIES)))
+                columns["expert_group"].append(self.expert_dictionary.code(_named(group, GROUPS)))
+                columns["expert_message"].append(self.expert_dictionary.code(message))
+        self.rows += 1
+        if self.rows % CHUNK_ROWS == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the buffered rows to the column files"""
+        for name, values in self.buffers.items():
+            if values:
+                np.asarray(values, dtype=COLUMN_TYPES[name]).tofile(self._files[name])
+                self.counts[name] += len(values)
+                values.clear()
+        self._files["info"].write(self.info)
+        self.info_size += len(self.info)
+        self.info = bytearray()
+
+    def discard(self) -> None:
+        """Close the column files and remove the directory"""
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, meta: dict) -> None:
+        """Complete the column files and write the dictionaries and metadata"""
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        for name, dtype in COLUMN_TYPES.items():
+            raw = os.path.join(self.directory, f"{name}.raw")
+            header = {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False,
+                      "shape": (self.counts[name],)}
+            with open(raw, "rb") as source, open(os.path.join(self.directory, f"{name}.npy"), "wb") as f:
+                np.lib.format.write_array_header_1_0(f, header)
+                shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+            os.remove(raw)
+        dictionaries = {name: d.values for name, d in self.dictionaries.items()}
+        dictionaries["expert"] = self.expert_dictionary.values
+        with open(os.path.join(self.directory, "dictionaries.json"), "w", encoding="utf-8") as f:
+            json.dump(dictionaries, f)
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(meta, packets=self.rows, version=FORMAT_VERSION), f)
+
+
+class PcapColumns:
+    """Read-only view of an ingested capture"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, "dictionaries.json"), "r", encoding="utf-8") as f:
+            self.dictionaries = json.load(f)
+        self.packets = self.meta["packets"]
+        self._columns = {}
+        self._info = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def strings(self, name: str, rows: np.ndarray) -> list[str]:
+        """Decode a dictionary-encoded column for the given rows"""
+        values = self.dictionaries[name]
+        return [values[code] for code in self[name][rows]]
+
+    def codes_where(self, name: str, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Codes of the dictionary entries the predicate accepts"""
+        return np.array([code for code, value in enumerate(self.dictionaries[name]) if predicate(value)],
+                        dtype=np.int32)
+
+    def info(self, rows: np.ndarray) -> list[str]:
+        if self._info is None:
+            path = os.path.join(self.directory, "info.bin")
+            self._info = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+        offsets = self["info_offsets"]
+        return [bytes(self._info[offsets[row]:offsets[row + 1]]).decode("utf-8", errors="replace") for row in rows]
+
+
+# display filters ---------------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(\(|\)|&&|\|\||!=|==|>=|<=|>|<|!|"[^"]*"|[^\s()!=<>&|"]+)')
+_OPERATORS = {"==": "==", "eq": "==", "!=": "!=", "ne": "!=", ">": ">", "gt": ">",
+              "<": "<", "lt": "<", ">=": ">=", "ge": ">=", "<=": "<=", "le": "<="}
+_ADDRESS_FIELDS = {"ip.src": ("src",), "ip.dst": ("dst",), "ip.addr": ("src", "dst"),
+                   "ipv6.src": ("src",), "ipv6.dst": ("dst",), "ipv6.addr": ("src", "dst")}
+_PORT_FIELDS = {"tcp.srcport": (1, ("src_port",)), "tcp.dstport": (1, ("dst_port",)),
+                "tcp.port": (1, ("src_port", "dst_port")), "udp.srcport": (2, ("src_port",)),
+                "udp.dstport": (2, ("dst_port",)), "udp.port": (2, ("src_port", "dst_port"))}
+_NUMERIC_FIELDS = {"frame.len": "length", "frame.number": "number", "frame.time_relative": "time"}
+_STRING_FIELDS = {"http.request.method": "http_method", "http.request.uri": "http_uri",
+                  "_ws.col.protocol": "protocol", "_ws.col.Protocol": "protocol"}
+_PROTOCOL = re.compile(r"[a-z][a-z0-9_-]*")
+
+Predicate = Callable[[PcapColumns], np.ndarray]
+
+
+def _compare(column: np.ndarray, op: str, value) -> np.ndarray:
+    if op == "==":
+        return column == value
+    if op == "!=":
+        return column != value
+    if op == ">":
+        return column > value
+    if op == "<":
+        return column < value
+    if op == ">=":
+        return column >= value
+    return column <= value
+
+
+class _FilterParser:
+    """Recursive descent parser for the subset of display filter syntax the store can answer"""
+
+    def __init__(self, expression: str):
+        self.tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = _TOKEN.match(expression, position)
+            if not match or not match.group(1):
+                raise PcapStoreError(f"cannot parse filter near {expression[position:]!r}")
+            self.tokens.append(match.group(1))
+            position = match.end()
+            while position < len(expression) and expression[position].isspace():
+                position += 1
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise PcapStoreError("unexpected end of filter")
+        self.position += 1
+        return token
+
+    def parse(self) -> Predicate:
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise PcapStoreError(f"unexpected {self.peek()!r} in filter")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        left = self.parse_and()
+        while self.peek() in ("or", "||"):
+            self.take()
+            left = (lambda a, b: lambda cols: a(cols) | b(cols))(left, self.parse_and())
+        return left
+
+    def parse_and(self) -> Predicate:
+        left = self.parse_not()
+        while self.peek() in ("and", "&&"):
+            self.take()
+            left = (lambda a, b: lambda cols: a(cols) & b(cols))(left, self.parse_not())
+        return left
+
+    def parse_not(self) -> Predicate:
+        if self.peek() in ("not", "!"):
+            self.take()
+            inner = self.parse_not()
+            return lambda cols: ~inner(cols)
+        if self.peek() == "(":
+            self.take()
+            inner = self.parse_or()
+            if self.take() != ")":
+                raise PcapStoreError("unbalanced parentheses in filter")
+            return inner
+        return self.parse_term()
+
+    def parse_term(self) -> Predicate:
+        field = self.take()
+        if self.peek() not in _OPERATORS:
+            if field in _PORT_FIELDS or field in _ADDRESS_FIELDS or field in _NUMERIC_FIELDS or field in _STRING_FIELDS:
+                raise PcapStoreError(f"field {field} without comparison")
+            if not _PROTOCOL.fullmatch(field):
+                raise PcapStoreError(f"unsupported filter term {field!r}")
+            return lambda cols: np.isin(cols["stack"], cols.codes_where("stack", lambda s: field in s.split(":")))
+        op = _OPERATORS[self.take()]
+        value = self.take().strip('"')
+
+        if field in _ADDRESS_FIELDS:
+            if op not in ("==", "!="):
+                raise PcapStoreError(f"unsupported operator {op} for {field}")
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                raise PcapStoreError(f"invalid address {value!r}")
+
+            def in_network(address: str) -> bool:
+                try:
+                    return ipaddress.ip_address(address) in network
+                except ValueError:
+                    return False
+
+            def address_match(cols: PcapColumns) -> np.ndarray:
+                mask = np.zeros(cols.packets, dtype=bool)
+                present = np.zeros(cols.packets, dtype=bool)
+                for column in _ADDRESS_FIELDS[field]:
+                    mask |= np.isin(cols[column], cols.codes_where(column, in_network))
+                    # code 0 is the empty string: frames without an IP layer
+                    present |= cols[column] != 0
+                return mask if op == "==" else ~mask & present
+            return address_match
+
+        if field in _PORT_FIELDS:
+            transport, columns = _PORT_FIELDS[field]
+            number = _int_or(value, None)
+            if number is None:
+                raise PcapStoreError(f"invalid port {value!r}")
+
+            def port_match(cols: PcapColumns) -> np.ndarray:
+                mask = np.zeros(cols.packets, dtype=bool)
+                for column in columns:
+                    mask |= _compare(cols[column], op, number)
+                return mask & (cols["transport"] == transport)
+            return port_match
+
+        if field in _NUMERIC_FIELDS:
+            try:
+                number = float(value)
+            except ValueError:
+                raise PcapStoreError(f"invalid number {value!r}")
+            column = _NUMERIC_FIELDS[field]
+            return lambda cols: _compare(cols[column], op, number)
+
+        if field in _STRING_FIELDS:
+            if op not in ("==", "!="):
+                raise PcapStoreError(f"unsupported operator {op} for {field}")
+            column = _STRING_FIELDS[field]
+
+            def string_match(cols: PcapColumns) -> np.ndarray:
+                mask = np.isin(cols[column], cols.codes_where(column, lambda s: value in s.split(",")))
+                return mask if op == "==" else ~mask & (cols[column] != 0)
+            return string_match
+
+        raise PcapStoreError(f"field {field} is not stored")
+
+
+def compile_filter(expression: str) -> Optional[Predicate]:
+    """
+    Compile a display filter into a vectorized predicate
+    Supports protocol names, ip/ipv6 addresses (with CIDR), tcp/udp ports,
+    frame.len/number/time_relative and HTTP method/URI, combined with
+    and/or/not and parentheses. Raises PcapStoreError for anything else.
+    """
+    if not expression.strip():
+        return None
+    return _FilterParser(expression).parse()
+
+
+def select(cols: PcapColumns, display_filter: str = "") -> np.ndarray:
+    """Row indices matching a display filter"""
+    predicate = compile_filter(display_filter)
+    if predicate is None:
+        return np.arange(cols.packets)
+    return np.flatnonzero(predicate(cols))
+
+
+# renderers ---------------------------------------------------------------
+
+def render_packets(cols: PcapColumns, rows: np.ndarray) -> str:
+    """One summary line per packet, laid out like tshark's default output"""
+    numbers = cols["number"][rows]
+    times = cols["time"][rows]
+    lengths = cols["length"][rows]
+    sources = cols.strings("source", rows)
+    destinations = cols.strings("destination", rows)
+    protocols = cols.strings("protocol", rows)
+    infos = cols.info(rows)
+    lines = []
+    for i in range(len(rows)):
+        lines.append(f"{numbers[i]:>5} {times[i]:>10.9f} {sources[i]:>12} → {destinations[i]:<12} "
+                     f"{protocols[i]} {lengths[i]} {infos[i]}\n")
+    return "".join(lines)
+
+
+def render_http_requests(cols: PcapColumns) -> str:
+    """`tshark -Y http -T fields -e http.request.method -e http.request.uri`"""
+    rows = select(cols, "http")
+    methods = cols.strings("http_method", rows)
+    uris = cols.strings("http_uri", rows)
+    return "".join(f"{method}\t{uri}\n" for method, uri in zip(methods, uris))
+
+
+def render_protocol_hierarchy(cols: PcapColumns) -> str:
+    """`tshark -q -z io,phs`"""
+    stacks = cols["stack"]
+    lengths = cols["length"]
+    counts = np.bincount(stacks, minlength=len(cols.dictionaries["stack"]))
+    sizes = np.bincount(stacks, weights=lengths, minlength=len(cols.dictionaries["stack"]))
+    # order of first appearance of every protocol path
+    _, first = np.unique(stacks, return_index=True)
+    tree: "OrderedDict[tuple, list]" = OrderedDict()
+    for code in np.asarray(stacks)[np.sort(first)]:
+        path = ("frame",) + tuple(p for p in cols.dictionaries["stack"][code].split(":") if p)
+        for depth in range(1, len(path) + 1):
+            node = tree.setdefault(path[:depth], [0, 0])
+            node[0] += int(counts[code])
+            node[1] += int(sizes[code])
+
+    # depth-first, children in order of first appearance
+    position = {path: i for i, path in enumerate(tree)}
+    lines = ["", "=" * 67, "Protocol Hierarchy Statistics", "Filter: ", ""]
+    for path in sorted(tree, key=lambda p: [position[p[:i]] for i in range(1, len(p) + 1)]):
+        frames, size = tree[path]
+        name = "  " * (len(path) - 1) + path[-1]
+        lines.append(f"{name:<40} frames:{frames} bytes:{size}")
+    lines.append("=" * 67)
+    return "\n".join(lines) + "\n"
+
+
+def render_ip_conversations(cols: PcapColumns) -> str:
+    """`tshark -q -z conv,ip`"""
+    src = np.asarray(cols["src"])
+    dst = np.asarray(cols["dst"])
+    addresses = cols.dictionaries["src"], cols.dictionaries["dst"]
+    # the src and dst dictionaries differ, map both onto one code space
+    names = sorted(set(addresses[0]) | set(addresses[1]))
+    index = {name: i for i, name in enumerate(names)}
+    is_v4 = np.array([":" not in name and name != "" for name in names])
+    src = np.array([index[a] for a in addresses[0]], dtype=np.int64)[src]
+    dst = np.array([index[a] for a in addresses[1]], dtype=np.int64)[dst]
+    rows = np.flatnonzero(is_v4[src] & is_v4[dst])
+    src, dst = src[rows], dst[rows]
+    lengths = np.asarray(cols["length"])[rows]
+    times = np.asarray(cols["time"])[rows]
+
+    lines = ["=" * 80, "IPv4 Conversations", "Filter:<No Filter>",
+             " " * 47 + "|       <-      | |       ->      | |     Total     |    Relative    |   Duration   |",
+             " " * 47 + "| Frames  Bytes | | Frames  Bytes | | Frames  Bytes |      Start     |              |"]
+    if len(rows):
+        low, high = np.minimum(src, dst), np.maximum(src, dst)
+        keys = low * len(names) + high
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        # A is the source of the first packet of a conversation
+        a = src[first]
+        forward = src == a[inverse]
+        frames_ab = np.bincount(inverse, weights=forward, minlength=len(unique))
+        frames_ba = np.bincount(inverse, weights=~forward, minlength=len(unique))
+        bytes_ab = np.bincount(inverse, weights=lengths * forward, minlength=len(unique))
+        bytes_ba = np.bincount(inverse, weights=lengths * ~forward, minlength=len(unique))
+        start = times[first]
+        end = np.full(len(unique), -np.inf)
+        np.maximum.at(end, inverse, times)
+        order = np.lexsort((-(bytes_ab + bytes_ba), -(frames_ab + frames_ba)))
+        for i in order:
+            b = high[first[i]] if a[i] == low[first[i]] else low[first[i]]
+            lines.append(
+                f"{names[a[i]]:<20} <-> {names[b]:<20}  {int(frames_ba[i]):>6} {int(bytes_ba[i]):>9} bytes"
+                f"  {int(frames_ab[i]):>6} {int(bytes_ab[i]):>9} bytes"
+                f"  {int(frames_ab[i] + frames_ba[i]):>6} {int(bytes_ab[i] + bytes_ba[i]):>9} bytes"
+                f"  {start[i]:>14.9f}  {end[i] - start[i]:>12.4f}"
+            )
+    lines.append("=" * 80)
+    return "\n".join(lines) + "\n"
+
+
+def render_expert_info(cols: PcapColumns) -> str:
+    """`tshark -q -z expert`"""
+    names = cols.dictionaries["expert"]
+    rows = np.asarray(cols["expert_row"])
+    severity = np.asarray(cols["expert_severity"])
+    group = np.asarray(cols["expert_group"])
+    message = np.asarray(cols["expert_message"])
+    protocols = np.asarray(cols["protocol"])[rows] if len(rows) else np.zeros(0, np.int32)
+    protocol_names = cols.dictionaries["protocol"]
+
+    lines = []
+    for level, label in SEVERITY_LABELS:
+        selected = np.flatnonzero(severity == names.index(level)) if level in names else np.zeros(0, np.int64)
+        if not len(selected):
+            continue
+        keys = np.stack([group[selected], protocols[selected], message[selected]], axis=1)
+        unique, counts = np.unique(keys, axis=0, return_counts=True)
+        title = f"{label} ({len(selected)})"
+        lines += ["", title, "=" * len(title), "   Frequency      Group           Protocol  Summary"]
+        for i in np.argsort(-counts, kind="stable"):
+            g, p, m = unique[i]
+            lines.append(f"   {counts[i]:>9}  {names[g]:>14}  {protocol_names[p]:>14}  {names[m]}")
+    return "\n".join(lines) + "\n"
+
+
+GROUP_COLUMNS = {
+    "ip.src": "src", "ip.dst": "dst", "protocol": "protocol",
+    "http.request.method": "http_method", "http.request.uri": "http_uri",
+    "src_port": "src_port", "dst_port": "dst_port",
+}
+
+
+def query(cols: PcapColumns, display_filter: str = "", group_by: str = "", limit: int = 50) -> dict:
+    """
+    Filter and aggregate packets
+    Args:
+        cols: Ingested capture
+        display_filter: Filter in the subset of display filter syntax compile_filter accepts
+        group_by: One of GROUP_COLUMNS to count packets and bytes per value
+        limit: Maximum number of packets or groups returned
+    """
+    rows = select(cols, display_filter)
+    lengths = np.asarray(cols["length"])[rows]
+    result = {"packets": int(len(rows)), "bytes": int(lengths.sum())}
+    if group_by:
+        if group_by not in GROUP_COLUMNS:
+            raise PcapStoreError(f"cannot group by {group_by!r}, expected one of {', '.join(GROUP_COLUMNS)}")
+        column = GROUP_COLUMNS[group_by]
+        values = np.asarray(cols[column])[rows]
+        unique, inverse = np.unique(values, return_inverse=True)
+        packets = np.bincount(inverse, minlength=len(unique))
+        size = np.bincount(inverse, weights=lengths, minlength=len(unique))
+        labels = cols.dictionaries[column] if column in cols.dictionaries else None
+        groups = []
+        for i in np.argsort(-packets, kind="stable")[:limit]:
+            value = labels[unique[i]] if labels is not None else int(unique[i])
+            groups.append({"value": value, "packets": int(packets[i]), "bytes": int(size[i])})
+        result["groups"] = groups
+        return result
+
+    shown = rows[:limit]
+    numbers, times = cols["number"][shown], cols["time"][shown]
+    sources, destinations = cols.strings("source", shown), cols.strings("destination", shown)
+    protocols, infos = cols.strings("protocol", shown), cols.info(shown)
+    result["rows"] = [
+        {"number": int(numbers[i]), "time": float(times[i]), "source": sources[i],
+         "destination": destinations[i], "protocol": protocols[i], "length": int(lengths[i]), "info": infos[i]}
+        for i in range(len(shown))
+    ]
+    return result
+
+
+# store -------------------------------------------------------------------
+
+class PcapStore:
+    """
+    Ingested captures on disk, keyed by the identity of the capture file.
+
+    A capture is ingested on first use and reused for as long as the file
+    keeps its inode, size and modification time. Once the store holds more
+    than max_bytes, the captures used least recently are removed.
+    """
+
+    def __init__(self, directory: str = PCAP_STORE_DIR, max_open: int = 8,
+                 max_bytes: int = PCAP_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self._open: OrderedDict = OrderedDict()
+        self._locks: dict = {}
+        self.ingestions = 0
+        self.evictions = 0
+
+    def key_for(self, path: str) -> str:
+        st = os.stat(path)
+        material = json.dumps([os.path.realpath(path), st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size,
+                               FORMAT_VERSION])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def open(self, path: str, runner_factory: Callable[[], CommandRunner]) -> PcapColumns:
+        """
+        Return the columns of a capture, ingesting it with tshark if needed
+        Args:
+            path: Capture file
+            runner_factory: Returns the CommandRunner that runs tshark
+        """
+        try:
+            key = self.key_for(path)
+        except OSError as e:
+            raise PcapStoreError(str(e))
+        directory = os.path.join(self.directory, key)
+        if key in self._open:
+            self._open.move_to_end(key)
+            self._touch(directory)
+            return self._open[key]
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key not in self._open:
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    await self.ingest(path, directory, runner_factory)
+                    await asyncio.to_thread(self.evict, key)
+                else:
+                    self._touch(directory)
+                self._open[key] = PcapColumns(directory)
+                while len(self._open) > self.max_open:
+                    self._open.popitem(last=False)
+        self._locks.pop(key, None)
+        return self._open[key]
+
+    @staticmethod
+    def _touch(directory: str) -> None:
+        # the modification time of meta.json records the last use
+        try:
+            os.utime(os.path.join(directory, "meta.json"))
+        except OSError:
+            pass
+
+    def _entries(self) -> list:
+        """(last use, bytes, key) of every ingested capture"""
+        entries = []
+        try:
+            keys = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for key in keys:
+            directory = os.path.join(self.directory, key)
+            try:
+                used = os.stat(os.path.join(directory, "meta.json")).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+            except OSError:
+                continue
+            entries.append((used, size, key))
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used captures until the store is at 90% of max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for _, size, key in entries:
+            if total <= target:
+                break
+            if key == keep:
+                continue
+            # queries still holding the columns keep their memory maps
+            self._open.pop(key, None)
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    async def ingest(self, path: str, directory: str, runner_factory: Callable[[], CommandRunner]) -> None:
+        """
+        Dissect the capture once and write its columns
+        Raises:
+            PcapStoreError: tshark timed out, failed or produced no packets; nothing is stored
+        """
+        stderr = ""
+        tmp_directory = f"{directory}.{os.getpid()}.tmp"
+        ingester = None
+        try:
+            for fields in (FIELDS, LEGACY_FIELDS):
+                if ingester is not None:
+                    ingester.discard()
+                ingester = _Ingester(tmp_directory)
+                runner = runner_factory()
+                # rows go straight into the column files, the text itself is not kept
+                runner.max_output_bytes = 64 * 1024
+                # the timeout and exit code of this very run decide whether the store is complete
+                runner.use_coalescing = False
+                command = ["tshark", "-r", path, "-T", "fields",
+                           "-E", f"separator={SEPARATOR}", "-E", f"aggregator={AGGREGATOR}",
+                           "-E", "occurrence=a", "-E", "quote=n"]
+                for field in fields.values():
+                    command += ["-e", field]
+
+                async def feed(chunk: str, ingester=ingester):
+                    ingester.feed(chunk)
+
+                _, stderr = await runner.execute(command, on_output=feed)
+                ingester.close()
+                # a cut dissection would answer every later query with part of the capture
+                if runner.timed_out:
+                    raise PcapStoreError(stderr.strip() or "tshark timed out")
+                if runner.returncode:
+                    # older tshark rejects the renamed column fields, try the legacy ones
+                    stderr = stderr.strip() or f"tshark exited with {runner.returncode}"
+                    continue
+                if ingester.rows or not stderr.strip():
+                    break
+            else:
+                raise PcapStoreError(stderr.strip() or "tshark produced no packets")
+            await asyncio.to_thread(ingester.write, {"source": os.path.realpath(path)})
+        except BaseException:
+            if ingester is not None:
+                ingester.discard()
+            raise
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        self.ingestions += 1
+
+
+_pcap_store: Optional[PcapStore] = None
+
+
+def get_pcap_store() -> PcapStore:
+    """Return the process-wide pcap store"""
+    global _pcap_store
+    if _pcap_store is None:
+        _pcap_store = PcapStore()
+    return _pcap_store
@@ -1,268 +1,477 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 from pydantic import BaseModel, Field
 import os
-from src.kali_mcps.nmap.actions import basic_scan_action, intense_scan_action, stealth_scan_action, quick_scan_action, vulnerability_scan_action
-from src.kali_mcps.nm.actions import basic_symbols_action, dynamic_symbols_action, demangle_symbols_action, numeric_sort_action, size_sort_action, undefined_symbols_action
-from src.kali_mcps.objdump.actions import file_headers_action, disassemble_action, symbol_table_action, section_headers_action, full_contents_action
-from src.kali_mcps.strings.actions import basic_strings_action, min_length_strings_action, offset_strings_action, encoding_strings_action
-from src.kali_mcps.wireshark.actions import capture_live_action, analyze_pcap_action, extract_http_action, protocol_hierarchy_action, conversation_statistics_action, expert_info_action
-from src.kali_mcps.traceroute.actions import traceroute_action
-mcp = FastMCP("kali-tools")
+import sys
+from src.kali_mcps.base.lazy import lazy_actions
+from src.kali_mcps.base.result_cache import get_result_cache
+from src.kali_mcps.base.single_flight import get_single_flight
+from src.kali_mcps.base.spool import get_spool, run_budgeted
+from src.kali_mcps.base.jobs import get_job_queue
+from src.kali_mcps.base.workers import shutdown_worker_pool
+from src.kali_mcps.base.remote import get_remote_executor
+from src.kali_mcps.base.admission import get_admission
+from src.kali_mcps.base.usage import get_usage_tracker
+from src.metrics import get_metrics, start_http_server
+from contextlib import asynccontextmanager
+
+# action modules (and numpy, the Docker SDK, ...) are imported on the first call of one of their tools
+basic_scan_action, intense_scan_action, stealth_scan_action, quick_scan_action, vulnerability_scan_action, sharded_scan_action, scan_history_action = lazy_actions(
+    "src.kali_mcps.nmap.actions", "basic_scan_action", "intense_scan_action", "stealth_scan_action", "quick_scan_action",
+    "vulnerability_scan_action", "sharded_scan_action", "scan_history_action")
+basic_symbols_action, dynamic_symbols_action, demangle_symbols_action, numeric_sort_action, size_sort_action, undefined_symbols_action = lazy_actions(
+    "src.kali_mcps.nm.actions", "basic_symbols_action", "dynamic_symbols_action", "demangle_symbols_action",
+    "numeric_sort_action", "size_sort_action", "undefined_symbols_action")
+file_headers_action, disassemble_action, symbol_table_action, section_headers_action, full_contents_action, elf_info_action, disassembly_lookup_action = lazy_actions(
+    "src.kali_mcps.objdump.actions", "file_headers_action", "disassemble_action", "symbol_table_action",
+    "section_headers_action", "full_contents_action", "elf_info_action", "disassembly_lookup_action")
+basic_strings_action, min_length_strings_action, offset_strings_action, encoding_strings_action, all_encodings_strings_action = lazy_actions(
+    "src.kali_mcps.strings.actions", "basic_strings_action", "min_length_strings_action", "offset_strings_action",
+    "encoding_strings_action", "all_encodings_strings_action")
+capture_live_action, analyze_pcap_action, extract_http_action, protocol_hierarchy_action, conversation_statistics_action, expert_info_action, query_pcap_action = lazy_actions(
+    "src.kali_mcps.wireshark.actions", "capture_live_action", "analyze_pcap_action", "extract_http_action",
+    "protocol_hierarchy_action", "conversation_statistics_action", "expert_info_action", "query_pcap_action")
+start_capture_action, poll_capture_action, snapshot_capture_action, stop_capture_action = lazy_actions(
+    "src.kali_mcps.wireshark.actions", "start_capture_action", "poll_capture_action", "snapshot_capture_action",
+    "stop_capture_action")
+traceroute_action, multi_traceroute_action = lazy_actions(
+    "src.kali_mcps.traceroute.actions", "traceroute_action", "multi_traceroute_action")
+batch_analyze_action, = lazy_actions("src.kali_mcps.batch.actions", "batch_analyze_action")
+index_symbols_action, find_symbol_action, symbol_index_stats_action = lazy_actions(
+    "src.kali_mcps.symbols.actions", "index_symbols_action", "find_symbol_action", "symbol_index_stats_action")
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Run the background job workers for the lifetime of the server"""
+    jobs = get_job_queue()
+    await jobs.start()
+    metrics_server = None
+    if os.environ.get("KALI_MCPS_METRICS_PORT"):
+        metrics_server = await start_http_server(int(os.environ["KALI_MCPS_METRICS_PORT"]),
+                                                 os.environ.get("KALI_MCPS_METRICS_HOST", "127.0.0.1"))
+    try:
+        yield
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await jobs.stop()
+        # captures only exist if the capture module was loaded by one of its tools
+        if "src.kali_mcps.wireshark.capture" in sys.modules:
+            await sys.modules["src.kali_mcps.wireshark.capture"].get_capture_manager().stop_all()
+        shutdown_worker_pool()
+        if get_remote_executor() is not None:
+            await get_remote_executor().close()
+
+
+mcp = FastMCP("kali-tools", lifespan=lifespan)
 
 
 IS_SAFE = os.environ.get("IS_SAFE", "false").lower() == "true"  # is safe mode, if true, the command will be executed in the sandbox
 
+
+def stream_to_client(ctx: Context):
+    """Build an on_output callback that forwards partial output as MCP notifications"""
+    received = 0
+
+    async def forward(chunk: str):
+        nonlocal received
+        received += len(chunk)
+        await ctx.report_progress(received)
+        await ctx.info(chunk)
+
+    return forward
+
 # nmap start
 @mcp.tool()
-def basic_scan(target: str):
+async def basic_scan(target: str, format: str = "structured", incremental: bool = False, ttl: int = 3600):
     """Perform a basic network scan using nmap.
 
     Args:
         target (str): The target IP address or hostname to scan.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
 
     Returns:
-        str: The output results of the basic scan.
+        dict: The hosts, ports and summary of the basic scan (or text for format='text').
     """
-    return basic_scan_action(target)
+    return await basic_scan_action(target, format, incremental, ttl)
 
 @mcp.tool()
-def intense_scan(target: str):
+async def intense_scan(target: str, format: str = "structured", incremental: bool = False, ttl: int = 3600):
     """Perform an intense network scan using nmap.
 
     Args:
         target (str): The target IP address or hostname to scan.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
 
     Returns:
-        str: The output results of the intense scan.
+        dict: The hosts, ports and summary of the intense scan (or text for format='text').
     """
-    return intense_scan_action(target)
+    return await intense_scan_action(target, format, incremental, ttl)
 
 @mcp.tool()
-def stealth_scan(target: str):
+async def stealth_scan(target: str, format: str = "structured", incremental: bool = False, ttl: int = 3600):
     """Perform a stealth network scan using nmap.
 
     Args:
         target (str): The target IP address or hostname to scan.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
 
     Returns:
-        str: The output results of the stealth scan.
+        dict: The hosts, ports and summary of the stealth scan (or text for format='text').
     """
-    return stealth_scan_action(target)
+    return await stealth_scan_action(target, format, incremental, ttl)
 
 @mcp.tool()
-def quick_scan(target: str):
+async def quick_scan(target: str, format: str = "structured", incremental: bool = False, ttl: int = 3600):
     """Perform a quick network scan using nmap.
 
     Args:
         target (str): The target IP address or hostname to scan.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
 
     Returns:
-        str: The output results of the quick scan.
+        dict: The hosts, ports and summary of the quick scan (or text for format='text').
     """
-    return quick_scan_action(target)
+    return await quick_scan_action(target, format, incremental, ttl)
 
 @mcp.tool()
-def vulnerability_scan(target: str):
+async def vulnerability_scan(target: str, format: str = "structured", incremental: bool = False, ttl: int = 3600):
     """Perform a vulnerability scan using nmap.
 
     Args:
         target (str): The target IP address or hostname to scan.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
+
+    Returns:
+        dict: The hosts, ports and summary of the vulnerability scan (or text for format='text').
+    """
+    return await vulnerability_scan_action(target, format, incremental, ttl)
+
+@mcp.tool()
+async def sharded_scan(target: str, ctx: Context, scan_type: str = "quick", shard_size: int = 256,
+                       format: str = "structured", incremental: bool = False, ttl: int = 3600):
+    """Scan a large target range (e.g. a /16) as shards on parallel nmap workers.
+
+    Args:
+        target (str): Target specification: CIDR blocks, octet ranges or host names.
+        scan_type (str): One of 'basic', 'intense', 'stealth', 'quick', 'vulnerability'.
+        shard_size (int): Number of addresses scanned by each nmap process.
+        format (str): 'structured' for host, port, service and script records,
+            'text' for nmap-style text.
+        incremental (bool): Reuse stored results for hosts scanned less than ttl
+            seconds ago that a ping sweep shows unchanged.
+        ttl (int): Maximum age in seconds of reused results.
+
+    Returns:
+        dict: The merged report of all shards; failed shards are listed under
+        errors and only those are rescanned when the same scan is repeated.
+    """
+    return await sharded_scan_action(target, scan_type, shard_size, format, incremental, ttl,
+                                     on_output=stream_to_client(ctx))
+
+@mcp.tool()
+async def scan_history(address: str, limit: int = 20):
+    """Show what earlier nmap scans observed on a host.
+
+    Args:
+        address (str): The IP address of the host.
+        limit (int): Maximum number of observations to return.
 
     Returns:
-        str: The output results of the vulnerability scan.
+        list: Observations, newest first, with scan type, host state and ports.
     """
-    return vulnerability_scan_action(target)
+    return await scan_history_action(address, limit)
 # nmap end
 
 # nm start
 @mcp.tool()
-def basic_symbols(target: str):
+async def basic_symbols(target: str, use_cache: bool = True):
     """Perform a basic symbol listing using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the basic symbol listing.
     """
-    return basic_symbols_action(target)
+    return await basic_symbols_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def dynamic_symbols(target: str):
+async def dynamic_symbols(target: str, use_cache: bool = True):
     """Perform a dynamic symbol listing using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the dynamic symbol listing.
     """
-    return dynamic_symbols_action(target)
+    return await dynamic_symbols_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def demangle_symbols(target: str):
+async def demangle_symbols(target: str, use_cache: bool = True):
     """Perform a demangling of symbols using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the demangling of symbols.
     """
-    return demangle_symbols_action(target)
+    return await demangle_symbols_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def numeric_sort(target: str):
+async def numeric_sort(target: str, use_cache: bool = True):
     """Perform a numeric sort of symbols using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the numeric sort of symbols.
     """
-    return numeric_sort_action(target)
+    return await numeric_sort_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def size_sort(target: str):
+async def size_sort(target: str, use_cache: bool = True):
     """Perform a size sort of symbols using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the size sort of symbols.
     """
-    return size_sort_action(target)
+    return await size_sort_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def undefined_symbols(target: str):
+async def undefined_symbols(target: str, use_cache: bool = True):
     """Perform an undefined symbol listing using nm.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the undefined symbol listing.
     """
-    return undefined_symbols_action(target)
+    return await undefined_symbols_action(target, use_cache=use_cache)
 # nm end
 
 # objdump start
 @mcp.tool()
-def file_headers(target: str):
+async def file_headers(target: str, use_cache: bool = True):
     """Perform a file header listing using objdump.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the file header listing.
     """
-    return file_headers_action(target)
+    return await file_headers_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def disassemble(target: str):
+async def disassemble(target: str, ctx: Context, use_cache: bool = True):
     """Perform a disassembly of the target file using objdump.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
+
+    Partial output is streamed to the client as log notifications while the tool runs.
+
+    Returns:
+        str: The output results of the disassembly of the target file, or, when it exceeds
+            the output budget, a digest (head, tail, functions, top mnemonics and call
+            targets) with a handle for read_output / read_output_lines.
+    """
+    return await run_budgeted(
+        "disassemble", lambda on_output: disassemble_action(target, on_output=on_output, use_cache=use_cache),
+        stream_to_client(ctx),
+    )
+
+@mcp.tool()
+async def disassembly_lookup(target: str, function: str = "", start: str = "", end: str = "", page: int = -1,
+                             section: str = ".text", max_bytes: int = 262144):
+    """Read one function, an address range or a page of the target's disassembly.
+
+    The section is disassembled once per binary (by content) and stored with a function and
+    address index; later lookups read only the requested part instead of running objdump.
+
+    Args:
+        target (str): The target file or executable to analyze.
+        function (str): Function name, e.g. 'main'.
+        start (str): First address in hex, e.g. '0x401000'.
+        end (str): Address the range stops before (default: end of the section).
+        page (int): Page of the whole listing, from 0.
+        section (str): Section to disassemble.
+        max_bytes (int): Maximum listing returned for a function or range; the rest is
+            available from next_address.
 
     Returns:
-        str: The output results of the disassembly of the target file.
+        dict: The listing of the function, range or page, or, with none given, the size, page
+            count and first functions of the index.
     """
-    return disassemble_action(target)
+    return await disassembly_lookup_action(target, function, start, end, page, section, max_bytes)
 
 @mcp.tool()
-def symbol_table(target: str):
+async def symbol_table(target: str, use_cache: bool = True):
     """Perform a symbol table listing using objdump.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the symbol table listing.
     """
-    return symbol_table_action(target)
+    return await symbol_table_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def section_headers(target: str):
+async def section_headers(target: str, use_cache: bool = True):
     """Perform a section header listing using objdump.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the section header listing.
     """
-    return section_headers_action(target)
+    return await section_headers_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def full_contents(target: str):
+async def full_contents(target: str, ctx: Context, use_cache: bool = True):
     """Perform a full contents listing using objdump.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
+
+    Partial output is streamed to the client as log notifications while the tool runs.
+
+    Returns:
+        str: The output results of the full contents listing, or, when it exceeds the output
+            budget, a digest (head, tail, sections, symbol counts) with a handle for
+            read_output / read_output_lines.
+    """
+    return await run_budgeted(
+        "full_contents", lambda on_output: full_contents_action(target, on_output=on_output, use_cache=use_cache),
+        stream_to_client(ctx),
+    )
+
+@mcp.tool()
+async def elf_info(target: str, include_symbols: bool = False):
+    """Read ELF headers, program headers and sections as structured data.
+
+    Args:
+        target (str): The target file or executable to analyze.
+        include_symbols (bool): Also return the static and dynamic symbol tables.
 
     Returns:
-        str: The output results of the full contents listing.
+        dict: The parsed header, segments, sections and optional symbols.
     """
-    return full_contents_action(target)
+    return await elf_info_action(target, include_symbols)
 # objdump end
 
 # strings start
 @mcp.tool()
-def basic_strings(target: str):
+async def basic_strings(target: str, use_cache: bool = True):
     """Perform a basic string listing using strings.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the basic string listing.
     """
-    return basic_strings_action(target)
+    return await basic_strings_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def min_length_strings(target: str):
+async def min_length_strings(target: str, use_cache: bool = True):
     """Perform a minimum length string listing using strings.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the minimum length string listing.
     """
-    return min_length_strings_action(target)
+    return await min_length_strings_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def offset_strings(target: str):
+async def offset_strings(target: str, use_cache: bool = True):
     """Perform an offset string listing using strings.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the offset string listing.
     """
-    return offset_strings_action(target)
+    return await offset_strings_action(target, use_cache=use_cache)
 
 @mcp.tool()
-def encoding_strings(target: str):
+async def encoding_strings(target: str, use_cache: bool = True):
     """Perform an encoding string listing using strings.
 
     Args:
         target (str): The target file or executable to analyze.
+        use_cache (bool): Reuse a cached result while the file is unchanged.
 
     Returns:
         str: The output results of the encoding string listing.
     """
-    return encoding_strings_action(target)
+    return await encoding_strings_action(target, use_cache=use_cache)
+
+@mcp.tool()
+async def all_encodings_strings(target: str, length: int = 4, format: str = "x"):
+    """Extract 7-bit, UTF-16LE and UTF-16BE strings with offsets in one pass.
+
+    Args:
+        target (str): The target file or executable to analyze.
+        length (int): Minimum string length.
+        format (str): Offset radix, 'd' (decimal), 'o' (octal) or 'x' (hexadecimal).
+
+    Returns:
+        str: One listing per encoding.
+    """
+    return await all_encodings_strings_action(target, length, format)
 # strings end
 
 # tshark start
 @mcp.tool()
-def capture_live(interface: str, duration: int = 30, filter: str = ""):
+async def capture_live(interface: str, ctx: Context, duration: int = 30, filter: str = ""):
     """Perform a live capture of network traffic using tshark.
 
     Args:
@@ -270,27 +479,98 @@ def capture_live(interface: str, duration: int = 30, filter: str = ""):
         duration (int): The duration of the capture in seconds.
         filter (str): The filter to apply to the capture.
 
+    Partial output is streamed to the client as log notifications while the tool runs.
+
+    Returns:
+        str: The output results of the live capture of network traffic, or, when it exceeds
+            the output budget, a digest (head, tail, top protocols and endpoints) with a handle
+            for read_output / read_output_lines.
+    """
+    return await run_budgeted(
+        "capture_live", lambda on_output: capture_live_action(interface, duration, filter, on_output=on_output),
+        stream_to_client(ctx),
+    )
+
+@mcp.tool()
+async def start_capture(interface: str, filter: str = "", duration: int = 0,
+                        ring_file_kb: int = 16384, ring_files: int = 8):
+    """Start a long-running live capture into a size-bounded ring buffer of capture files.
+
+    Args:
+        interface (str): The network interface to capture from.
+        filter (str): The capture filter to apply, e.g. 'port 53'.
+        duration (int): Stop after this many seconds (0: run until stop_capture).
+        ring_file_kb (int): Size of one ring buffer file in KiB.
+        ring_files (int): Number of ring buffer files kept; older files are overwritten.
+
+    Returns:
+        dict: The capture id and initial state; use poll_capture, snapshot_capture and stop_capture with it.
+    """
+    return await start_capture_action(interface, filter, duration, ring_file_kb, ring_files)
+
+@mcp.tool()
+async def poll_capture(capture_id: str, limit: int = 10):
+    """Show the state and rolling statistics of a running or stopped capture.
+
+    Args:
+        capture_id (str): Id returned by start_capture.
+        limit (int): Number of top talkers and protocols listed.
+
+    Returns:
+        dict: State, packet and byte totals, packet and byte rates over the last minute,
+            top talkers by bytes and the protocol mix.
+    """
+    return await poll_capture_action(capture_id, limit)
+
+@mcp.tool()
+async def snapshot_capture(capture_id: str):
+    """Copy the ring files captured so far while the capture keeps running.
+
+    Args:
+        capture_id (str): Id returned by start_capture.
+
+    Returns:
+        dict: The capture state and statistics plus the copied files, which analyze_pcap and
+            query_pcap accept.
+    """
+    return await snapshot_capture_action(capture_id)
+
+@mcp.tool()
+async def stop_capture(capture_id: str, keep_files: bool = True):
+    """Stop a capture.
+
+    Args:
+        capture_id (str): Id returned by start_capture.
+        keep_files (bool): Keep the ring files on disk (false: delete them).
+
     Returns:
-        str: The output results of the live capture of network traffic.
+        dict: The final statistics and the ring files.
     """
-    return capture_live_action(interface, duration, filter)
+    return await stop_capture_action(capture_id, keep_files)
 
 
 @mcp.tool()
-def analyze_pcap(pcap_file: str, display_filter: str = ""):
+async def analyze_pcap(pcap_file: str, ctx: Context, display_filter: str = ""):
     """Perform an analysis of a pcap file using tshark.
 
     Args:
         pcap_file (str): The path to the pcap file to analyze.
         display_filter (str): The filter to apply to the analysis.
 
+    Partial output is streamed to the client as log notifications while the tool runs.
+
     Returns:
-        str: The output results of the analysis of the pcap file.
+        str: The output results of the analysis of the pcap file, or, when it exceeds the
+            output budget, a digest (head, tail, top protocols and endpoints) with a handle
+            for read_output / read_output_lines.
     """
-    return analyze_pcap_action(pcap_file, display_filter)
+    return await run_budgeted(
+        "analyze_pcap", lambda on_output: analyze_pcap_action(pcap_file, display_filter, on_output=on_output),
+        stream_to_client(ctx),
+    )
 
 @mcp.tool()
-def extract_http(pcap_file: str):
+async def extract_http(pcap_file: str):
     """Perform an HTTP extraction from a pcap file using tshark.
 
     Args:
@@ -299,10 +579,10 @@ def extract_http(pcap_file: str):
     Returns:
         str: The output results of the HTTP extraction from the pcap file.
     """
-    return extract_http_action(pcap_file)  
+    return await extract_http_action(pcap_file)  
 
 @mcp.tool()
-def protocol_hierarchy(pcap_file: str):
+async def protocol_hierarchy(pcap_file: str):
     """Perform a protocol hierarchy listing using tshark.
 
     Args:
@@ -311,10 +591,10 @@ def protocol_hierarchy(pcap_file: str):
     Returns:
         str: The output results of the protocol hierarchy listing.
     """
-    return protocol_hierarchy_action(pcap_file)    
+    return await protocol_hierarchy_action(pcap_file)    
 
 @mcp.tool()
-def conversation_statistics(pcap_file: str):
+async def conversation_statistics(pcap_file: str):
     """Perform a conversation statistics listing using tshark.
 
     Args:
@@ -323,10 +603,10 @@ def conversation_statistics(pcap_file: str):
     Returns:
         str: The output results of the conversation statistics listing.
     """
-    return conversation_statistics_action(pcap_file)   
+    return await conversation_statistics_action(pcap_file)   
 
 @mcp.tool() 
-def expert_info(pcap_file: str):
+async def expert_info(pcap_file: str):
     """Perform an expert information listing using tshark.
 
     Args:
@@ -335,12 +615,29 @@ def expert_info(pcap_file: str):
     Returns:
         str: The output results of the expert information listing.
     """
-    return expert_info_action(pcap_file)   
+    return await expert_info_action(pcap_file)   
+
+@mcp.tool()
+async def query_pcap(pcap_file: str, display_filter: str = "", group_by: str = "", limit: int = 50):
+    """Filter and aggregate the packets of a pcap file without re-dissecting it.
+
+    Args:
+        pcap_file (str): The path to the pcap file.
+        display_filter (str): Filter using protocol names, ip.src/ip.dst/ip.addr (CIDR allowed),
+            tcp/udp ports, frame.len and http.request.method/uri combined with and/or/not.
+        group_by (str): Count packets and bytes per value of 'ip.src', 'ip.dst', 'protocol',
+            'src_port', 'dst_port', 'http.request.method' or 'http.request.uri'.
+        limit (int): Maximum number of packets or groups to return.
+
+    Returns:
+        dict: Matching packet and byte counts with the first packets or the top groups.
+    """
+    return await query_pcap_action(pcap_file, display_filter, group_by, limit)
 # tshark end
 
 # traceroute start
 @mcp.tool()
-def traceroute(target: str):
+async def traceroute(target: str):
     """
     Perform a traceroute to the target.
 
@@ -350,9 +647,367 @@ def traceroute(target: str):
     Returns:
         str: The output results of the traceroute.  
     """
-    return traceroute_action(target)
+    return await traceroute_action(target)
+
+@mcp.tool()
+async def multi_traceroute(targets: list[str], ctx: Context, max_hops: int = 30, queries: int = 3,
+                           ttl: int = 3600, use_cache: bool = True):
+    """
+    Traceroute to many destinations in parallel and merge the paths into one graph.
+
+    Args:
+        targets (list): Addresses, host names, CIDR blocks or octet ranges, e.g. ['10.0.0.0/24', 'example.org'].
+        max_hops (int): Maximum TTL probed.
+        queries (int): Probes per hop.
+        ttl (int): Reuse paths traced less than ttl seconds ago.
+        use_cache (bool): Set to false to trace every destination again.
+
+    One JSON line per path is streamed to the client as log notifications as soon as it is traced.
+
+    Returns:
+        dict: summary, per-destination hops and a graph in which hops shared by several paths
+            are one node with RTT statistics, or, when they exceed the output budget, the
+            summary with a handle for read_output / read_output_lines over the JSON lines.
+    """
+    report = {}
+
+    async def run(on_output):
+        report.update(await multi_traceroute_action(targets, max_hops, queries, ttl, use_cache,
+                                                    on_output=on_output))
+        return "", ""
+
+    result = await run_budgeted("multi_traceroute", run, stream_to_client(ctx))
+    if isinstance(result, tuple) or "error" in report:
+        return report
+    return {"summary": report["summary"], **result}
 # traceroute end
 
+# batch start
+@mcp.tool()
+async def batch_analyze(path: str, ctx: Context, analyses: list[str] = None, recursive: bool = True,
+                        max_files: int = 1000, min_length: int = 4, max_items: int = 200):
+    """Analyze many files (e.g. an extracted firmware tree) in one call.
+
+    Args:
+        path (str): Directory, file or glob pattern, e.g. 'rootfs/**/*.so'.
+        analyses (list): Any of 'headers', 'sections', 'symbols', 'strings' (default: all).
+        recursive (bool): Descend into subdirectories / let '**' match across directories.
+        max_files (int): Maximum number of files analyzed.
+        min_length (int): Minimum string length.
+        max_items (int): Maximum sections, symbols and strings listed per file.
+
+    One JSON line per file is streamed to the client as log notifications as soon as it is analyzed.
+
+    Returns:
+        dict: summary and per-file results, or, when they exceed the output budget, the
+            summary with a handle for read_output / read_output_lines over the JSON lines.
+    """
+    report = {}
+
+    async def run(on_output):
+        report.update(await batch_analyze_action(path, analyses, recursive, max_files, min_length, max_items,
+                                                 on_output=on_output))
+        return "", ""
+
+    result = await run_budgeted("batch_analyze", run, stream_to_client(ctx))
+    if isinstance(result, tuple) or "error" in report:
+        return report
+    return {"summary": report["summary"], **result}
+# batch end
+
+# symbols start
+@mcp.tool()
+async def index_symbols(path: str, ctx: Context, recursive: bool = True, max_files: int = 20000):
+    """Index the exported and imported symbols of every file under a directory (e.g. a firmware rootfs).
+
+    Args:
+        path (str): Directory, file or glob pattern, e.g. 'rootfs/**/*.so*'.
+        recursive (bool): Descend into subdirectories / let '**' match across directories.
+        max_files (int): Maximum number of files looked at.
+
+    Files unchanged (same size and modification time) since they were last indexed are skipped,
+    and indexed files that no longer exist are dropped. One JSON line per indexed file is streamed
+    to the client as log notifications.
+
+    Returns:
+        dict: summary (files indexed, unchanged, removed, symbols) and index totals.
+    """
+    return await index_symbols_action(path, recursive, max_files, on_output=stream_to_client(ctx))
+
+
+@mcp.tool()
+async def find_symbol(symbol: str, kind: str = "any", match: str = "exact", root: str = "", limit: int = 100):
+    """Find which indexed files export or import a symbol. Run index_symbols on the tree first.
+
+    Args:
+        symbol (str): Symbol name, mangled or demangled, e.g. 'SSL_read' or 'std::terminate()'.
+        kind (str): 'exports' (defined, non-local), 'imports' (undefined) or 'any'.
+        match (str): 'exact', 'prefix' or 'substring' (substring scans the whole index).
+        root (str): Only files under this directory.
+        limit (int): Maximum matches listed.
+
+    Returns:
+        dict: total matches and the exporting, importing and local matches with path, version and binding.
+    """
+    return await find_symbol_action(symbol, kind, match, root, limit)
+
+
+@mcp.tool()
+async def symbol_index_stats():
+    """Show the number of files and symbols in the symbol index.
+
+    Returns:
+        dict: Index path, files, ELF files, files that failed and symbols.
+    """
+    return await symbol_index_stats_action()
+# symbols end
+
+# cache start
+@mcp.tool()
+async def cache_stats():
+    """Show hit/miss counters of the binary analysis result cache.
+
+    Returns:
+        dict: Hits per tier, misses, hit rate, stores, evictions and tier sizes.
+    """
+    return get_result_cache().stats()
+
+
+@mcp.tool()
+async def coalescing_stats():
+    """Show how many tool calls joined an identical call that was already running.
+
+    Returns:
+        dict: Processes started, calls coalesced onto a running process, coalesced rate and runs in flight.
+    """
+    return get_single_flight().stats()
+
+
+@mcp.tool()
+async def stats(format: str = "prometheus"):
+    """Show execution metrics: per-tool latency by phase, queue waits, bytes in/out,
+    cache and coalescing counters, running processes, sandbox pool and job queue.
+
+    Args:
+        format (str): 'prometheus' for the Prometheus text format, 'json' for a summary
+            with count/sum/mean per histogram.
+
+    Returns:
+        str | dict: The metrics.
+    """
+    if format == "json":
+        return get_metrics().snapshot()
+    return get_metrics().render()
+
+
+@mcp.tool()
+async def admission_status():
+    """Show the tool processes admission control is running and holding back for lack of memory or CPU.
+
+    Returns:
+        dict: Memory and CPU capacity and use, host load, admitted/waited/rejected counters, the learned
+            memory and CPU estimate per tool, and the running and queued commands.
+    """
+    admission = get_admission()
+    if admission is None:
+        return {"error": "admission control is off (KALI_MCPS_ADMISSION=false)"}
+    return admission.describe()
+
+
+@mcp.tool()
+async def resource_usage(tool: str = "", limit: int = 50):
+    """Show the CPU time, peak memory and disk I/O of tool processes run directly on this host.
+
+    Args:
+        tool: Only this tool, e.g. 'nmap' (default: all)
+        limit: Maximum finished runs listed
+
+    Returns:
+        dict: Totals per tool, the running processes with their rlimits, and the last finished runs
+            with wall and CPU seconds, max RSS, bytes read and written, exit code and why it was killed.
+    """
+    return get_usage_tracker().describe(tool, limit)
+
+
+@mcp.tool()
+async def remote_workers():
+    """Show the worker agents nmap, tshark and traceroute are dispatched to (KALI_MCPS_REMOTE_WORKERS).
+
+    Returns:
+        dict: Dispatch counters and, per agent, connection state, slots, running commands, load,
+            seconds since the last heartbeat and the last connection error.
+    """
+    executor = get_remote_executor()
+    if executor is None:
+        return {"error": "no remote workers configured, set KALI_MCPS_REMOTE_WORKERS"}
+    return {**executor.stats(), "agents": executor.describe()}
+# cache end
+
+# spool start
+@mcp.tool()
+async def read_output(handle: str, offset: int = 0, length: int = 65536):
+    """Read a byte range of an output that exceeded its budget.
+
+    Args:
+        handle (str): Handle from the digest returned by the tool.
+        offset (int): Byte offset to start from; pass next_offset of the previous call.
+        length (int): Maximum number of bytes to return.
+
+    Returns:
+        dict: data, next_offset, total_bytes and eof.
+    """
+    page = get_spool().read(handle, offset, min(length, 1024 * 1024))
+    if page is None:
+        return {"error": f"unknown or expired output handle {handle}"}
+    return page
+
+
+@mcp.tool()
+async def read_output_lines(handle: str, start: int = 0, count: int = 500):
+    """Read lines of an output that exceeded its budget.
+
+    Args:
+        handle (str): Handle from the digest returned by the tool.
+        start (int): Index of the first line, counted from 0; pass next_line of the previous call.
+        count (int): Maximum number of lines to return.
+
+    Returns:
+        dict: lines, next_line, total_lines and eof.
+    """
+    page = get_spool().read_lines(handle, start, min(count, 10000))
+    if page is None:
+        return {"error": f"unknown or expired output handle {handle}"}
+    return page
+# spool end
+
+# jobs start
+# action name -> (action, default priority); lower priorities run first so quick
+# binutils lookups are not stuck behind long network scans
+JOB_ACTIONS = {
+    "basic_symbols": (basic_symbols_action, 0),
+    "dynamic_symbols": (dynamic_symbols_action, 0),
+    "demangle_symbols": (demangle_symbols_action, 0),
+    "numeric_sort": (numeric_sort_action, 0),
+    "size_sort": (size_sort_action, 0),
+    "undefined_symbols": (undefined_symbols_action, 0),
+    "file_headers": (file_headers_action, 0),
+    "disassemble": (disassemble_action, 0),
+    "symbol_table": (symbol_table_action, 0),
+    "section_headers": (section_headers_action, 0),
+    "full_contents": (full_contents_action, 0),
+    "elf_info": (elf_info_action, 0),
+    "basic_strings": (basic_strings_action, 0),
+    "min_length_strings": (min_length_strings_action, 0),
+    "offset_strings": (offset_strings_action, 0),
+    "encoding_strings": (encoding_strings_action, 0),
+    "all_encodings_strings": (all_encodings_strings_action, 0),
+    "extract_http": (extract_http_action, 3),
+    "protocol_hierarchy": (protocol_hierarchy_action, 3),
+    "conversation_statistics": (conversation_statistics_action, 3),
+    "expert_info": (expert_info_action, 3),
+    "query_pcap": (query_pcap_action, 3),
+    "disassembly_lookup": (disassembly_lookup_action, 3),
+    "analyze_pcap": (analyze_pcap_action, 5),
+    "find_symbol": (find_symbol_action, 0),
+    "batch_analyze": (batch_analyze_action, 5),
+    "index_symbols": (index_symbols_action, 5),
+    "traceroute": (traceroute_action, 5),
+    "multi_traceroute": (multi_traceroute_action, 7),
+    "quick_scan": (quick_scan_action, 5),
+    "basic_scan": (basic_scan_action, 5),
+    "stealth_scan": (stealth_scan_action, 7),
+    "intense_scan": (intense_scan_action, 10),
+    "vulnerability_scan": (vulnerability_scan_action, 10),
+    "sharded_scan": (sharded_scan_action, 10),
+    "capture_live": (capture_live_action, 10),
+}
+for name, (action, priority) in JOB_ACTIONS.items():
+    get_job_queue().register(name, action, priority)
+
+
+@mcp.tool()
+async def submit_job(action: str, params: dict = None, priority: int = None):
+    """Run a tool in the background and return a job id immediately.
+
+    Args:
+        action (str): Tool name, e.g. "vulnerability_scan" or "disassemble".
+        params (dict): Arguments of the tool, e.g. {"target": "10.0.0.0/24"}.
+        priority (int): Lower runs first. Defaults to 0 for binutils/strings,
+            3-5 for pcap analysis, traceroute and quick scans, 10 for long scans.
+
+    Returns:
+        dict: job_id, state and priority of the queued job.
+    """
+    try:
+        job = await get_job_queue().submit(action, params, priority)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"job_id": job.id, "state": job.state, "priority": job.priority}
+
+
+@mcp.tool()
+async def job_status(job_id: str):
+    """Show the state of a background job.
+
+    Args:
+        job_id (str): Id returned by submit_job.
+
+    Returns:
+        dict: State, priority, timestamps, runtime and output size of the job.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return {"error": f"unknown job {job_id}"}
+    return job.status()
+
+
+@mcp.tool()
+async def job_result(job_id: str, offset: int = 0):
+    """Fetch partial output of a running job, or the result of a finished one.
+
+    Args:
+        job_id (str): Id returned by submit_job.
+        offset (int): Skip output already fetched; pass next_offset of the previous call.
+
+    Returns:
+        dict: Job status, output from offset, next_offset and, once done, the result.
+    """
+    response = get_job_queue().result(job_id, offset)
+    if response is None:
+        return {"error": f"unknown job {job_id}"}
+    return response
+
+
+@mcp.tool()
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; a running tool process is killed.
+
+    Args:
+        job_id (str): Id returned by submit_job.
+
+    Returns:
+        dict: Status of the job after cancelling.
+    """
+    job = await get_job_queue().cancel(job_id)
+    if job is None:
+        return {"error": f"unknown job {job_id}"}
+    return job.status()
+
+
+@mcp.tool()
+async def list_jobs(state: str = None, limit: int = 50):
+    """List background jobs, newest first.
+
+    Args:
+        state (str): Only jobs in this state: queued, running, done, failed or cancelled.
+        limit (int): Maximum number of jobs returned.
+
+    Returns:
+        list: Status of each job.
+    """
+    return get_job_queue().list(state, limit)
+# jobs end
+
 # run server, using stdio transport
 if __name__ == "__main__":
     print("Starting server is running")
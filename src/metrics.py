@@ -0,0 +1,263 @@
+"""
+Metrics of the execution layer, rendered in the Prometheus text format
+"""
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+METRICS_ENABLED = os.environ.get("KALI_MCPS_METRICS", "true").lower() == "true"
+
+# seconds; covers sub-millisecond cache hits up to 300 second scans
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# bytes; 1 MiB up to 8 GiB
+MEMORY_BUCKETS = tuple(1 << shift for shift in range(20, 34))
+
+_NULL_TIMER = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A named metric with one value per combination of label values"""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def samples(self) -> list:
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self._counts: Dict[tuple, list] = {}
+        self._sums: Dict[tuple, float] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def time(self, *labels):
+        """Context manager observing the time spent in its block"""
+        if not METRICS_ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> list:
+        lines = []
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                total += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                extra = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, extra)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(self._sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process.
+
+    Metrics are updated in place on the hot path; components that already
+    keep their own counters (result cache, container pool, ...) register a
+    stats function that is read when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self.metrics: list = []
+        self.stats_sources: Dict[str, Callable[[], dict]] = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict]) -> None:
+        """
+        Export the numeric values of a stats() dict as gauges named prefix_key
+        Nested dicts become one gauge with a 'key' label.
+        """
+        self.stats_sources[prefix] = stats
+
+    def _stats_samples(self) -> list:
+        lines = []
+        for prefix, stats in self.stats_sources.items():
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for key, value in values.items():
+                name = f"{prefix}_{key}"
+                if isinstance(value, dict):
+                    samples = [f"{name}{_labels(('key',), (k,))} {_number(v)}"
+                               for k, v in value.items() if isinstance(v, (int, float))]
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    samples = [f"{name} {_number(value)}"]
+                else:
+                    continue
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(samples)
+        return lines
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        lines.extend(self._stats_samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Metrics as a dict: counters and gauges by label values, histograms as count/sum/mean"""
+        result = {}
+        for metric in self.metrics:
+            if isinstance(metric, Histogram):
+                values = {
+                    "/".join(key): {
+                        "count": sum(metric._counts[key]),
+                        "sum": round(metric._sums[key], 6),
+                        "mean": round(metric._sums[key] / max(1, sum(metric._counts[key])), 6),
+                    }
+                    for key in sorted(metric._counts)
+                }
+            else:
+                values = {"/".join(key) or "total": value for key, value in sorted(metric._values.items())}
+            if values:
+                result[metric.name] = values
+        for prefix, stats in self.stats_sources.items():
+            try:
+                result[prefix] = stats()
+            except Exception:
+                continue
+        return result
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    return _metrics
+
+
+PHASE_SECONDS = _metrics.histogram(
+    "kali_mcps_phase_seconds", "Time spent per tool and execution phase", ("tool", "phase"))
+QUEUE_WAIT_SECONDS = _metrics.histogram(
+    "kali_mcps_queue_wait_seconds", "Time spent waiting for a worker slot or container", ("queue",))
+BYTES_IN = _metrics.counter(
+    "kali_mcps_input_bytes_total", "Bytes of input files passed to tools", ("tool",))
+BYTES_OUT = _metrics.counter(
+    "kali_mcps_output_bytes_total", "Bytes of tool output", ("tool",))
+CALLS = _metrics.counter(
+    "kali_mcps_calls_total", "Tool executions by how they were answered", ("tool", "result"))
+PROCESSES_RUNNING = _metrics.gauge(
+    "kali_mcps_processes_running", "Tool processes currently running", ("tool", "mode"))
+CPU_SECONDS = _metrics.counter(
+    "kali_mcps_cpu_seconds_total", "CPU time of direct tool processes", ("tool", "mode"))
+IO_BYTES = _metrics.counter(
+    "kali_mcps_io_bytes_total", "Storage bytes read and written by direct tool processes", ("tool", "direction"))
+PEAK_RSS_BYTES = _metrics.histogram(
+    "kali_mcps_peak_rss_bytes", "Peak resident memory of direct tool processes", ("tool",), MEMORY_BUCKETS)
+PROCESSES_KILLED = _metrics.counter(
+    "kali_mcps_processes_killed_total", "Tool processes killed by the server or their limits", ("tool", "reason"))
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        if request.split(b" ")[1:2] in ([b"/metrics"], [b"/"]):
+            body, status = get_metrics().render().encode("utf-8"), b"200 OK"
+        else:
+            body, status = b"not found\n", b"404 Not Found"
+        writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+        await writer.drain()
+    except (OSError, IndexError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(port: int, host: str = "127.0.0.1") -> Optional[asyncio.AbstractServer]:
+    """Serve GET /metrics for Prometheus scrapers"""
+    return await asyncio.start_server(_serve, host, port)
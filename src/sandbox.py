@@ -1,10 +1,24 @@
 import asyncio
-import docker
 import tarfile
 import os
 import io
-from typing import Optional, Dict, Any
-from dataclasses import dataclass
+import time
+import shlex
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Iterator
+from dataclasses import dataclass, field
+from src.metrics import get_metrics, PHASE_SECONDS, QUEUE_WAIT_SECONDS
+
+# stdout is the MCP stdio channel, progress goes to the log
+logger = logging.getLogger(__name__)
+
+# host directory bind-mounted read-only into every container; input files under it are used in place
+SHARED_DIR = os.environ.get("SANDBOX_SHARED_DIR", "")
+SHARED_MOUNT = os.environ.get("SANDBOX_SHARED_MOUNT", "/mnt/analysis")
+# bytes read from disk or the Docker API per chunk when moving files in and out of containers
+TRANSFER_CHUNK_SIZE = 1024 * 1024
 
 class SandboxSettings:
     """sandbox configuration settings"""
@@ -15,7 +29,9 @@ class SandboxSettings:
         cpu_limit: float = 1.0,
         network_enabled: bool = True,
         network_mode: str = "bridge",
-        timeout: int = 300
+        timeout: int = 300,
+        shared_dir: str = SHARED_DIR,
+        shared_mount: str = SHARED_MOUNT
     ):
         self.image = image
         self.memory_limit = memory_limit
@@ -23,6 +39,8 @@ class SandboxSettings:
         self.network_enabled = network_enabled
         self.network_mode = network_mode
         self.timeout = timeout
+        self.shared_dir = os.path.realpath(shared_dir) if shared_dir else ""
+        self.shared_mount = shared_mount
 
 class SandboxError(Exception):
     """Base exception for sandbox-related errors."""
@@ -36,10 +54,130 @@ class SandboxResourceError(SandboxError):
     """Exception raised for resource-related errors."""
 
 
+def shared_path(local_path: str, shared_dir: str = SHARED_DIR, shared_mount: str = SHARED_MOUNT) -> Optional[str]:
+    """
+    Return where a host file is visible through the read-only shared mount, or None if it is outside it
+    Args:
+        local_path: Path of the file on the host
+        shared_dir: Host directory mounted into the containers
+        shared_mount: Mount point of shared_dir inside the containers
+    """
+    if not shared_dir:
+        return None
+    root = os.path.realpath(shared_dir)
+    path = os.path.realpath(local_path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return f"{shared_mount.rstrip('/')}/{os.path.relpath(path, root)}"
+
+
+def tar_stream(files: Dict[str, str], chunk_size: int = TRANSFER_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield an uncompressed tar archive of host files, read from disk one chunk at a time
+    Args:
+        files: Dict of {local_path: name in the archive}
+        chunk_size: Bytes read from a file at once
+    """
+    for local_path, arcname in files.items():
+        with open(local_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            info = tarfile.TarInfo(arcname)
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+            info.mode = stat.st_mode & 0o777
+            yield info.tobuf(format=tarfile.PAX_FORMAT)
+            remaining = info.size
+            while remaining:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise SandboxError(f"{local_path} was truncated while being copied")
+                remaining -= len(chunk)
+                yield chunk
+        if info.size % tarfile.BLOCKSIZE:
+            yield b"\0" * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+    # end-of-archive marker
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def extract_archive(chunks: Iterable[bytes], container_path: str, dest_path: str) -> None:
+    """
+    Unpack a tar stream from get_archive as it arrives
+    A file is written to dest_path; the contents of a directory are extracted under dest_path.
+    Args:
+        chunks: Tar stream returned by get_archive
+        container_path: Path that was requested from the container
+        dest_path: Destination on the host
+    """
+    root = os.path.basename(container_path.rstrip("/"))
+    reader = io.BufferedReader(_ChunkReader(chunks), TRANSFER_CHUNK_SIZE)
+    with tarfile.open(fileobj=reader, mode="r|") as tar:
+        for member in tar:
+            name = member.name.rstrip("/")
+            if name == root:
+                if member.isdir():
+                    os.makedirs(dest_path, exist_ok=True)
+                    continue
+                member.name = os.path.basename(dest_path)
+                target_dir = os.path.dirname(dest_path) or "."
+            elif name.startswith(root + "/"):
+                member.name = name[len(root) + 1:]
+                target_dir = dest_path
+            else:
+                continue
+            os.makedirs(target_dir, exist_ok=True)
+            # the data filter refuses absolute paths, links escaping target_dir and device files
+            tar.extract(member, target_dir, filter="data")
+
+
+# (path, device, inode, size, mtime) -> sha256; avoids rehashing unchanged inputs
+_digests: "OrderedDict[tuple, str]" = OrderedDict()
+_DIGEST_CACHE_ENTRIES = 4096
+
+
+def file_digest(path: str, chunk_size: int = TRANSFER_CHUNK_SIZE) -> str:
+    """Return the sha256 of a file's contents, remembered while the file is unchanged"""
+    stat = os.stat(path)
+    identity = (os.path.realpath(path), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(identity)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                sha.update(chunk)
+        digest = _digests[identity] = sha.hexdigest()
+        if len(_digests) > _DIGEST_CACHE_ENTRIES:
+            _digests.popitem(last=False)
+    return digest
+
+
 class SandboxClient:
     """Sandbox client, providing only container creation and cleanup functionality"""
     
     def __init__(self):
+        # imported here so servers that never use the sandbox don't pay for loading the Docker SDK
+        import docker
         self.client = docker.from_env()
         self.container = None
 
@@ -53,25 +191,119 @@ class SandboxClient:
                 "mem_limit": config.memory_limit,
                 "nano_cpus": int(config.cpu_limit * 1e9),
                 "network_mode": config.network_mode if config.network_enabled else "none",
+                # keep the container alive so commands can be exec'd into it
+                "entrypoint": ["sleep", "infinity"],
             }
+            if config.shared_dir:
+                container_config["volumes"] = {config.shared_dir: {"bind": config.shared_mount, "mode": "ro"}}
             
             # create and start container
-            self.container = self.client.containers.run(**container_config)
-            print(f"Container created: {self.container.id}")
+            with PHASE_SECONDS.time("sandbox", "container_create"):
+                self.container = await asyncio.to_thread(self.client.containers.run, **container_config)
+            logger.debug("Container created: %s", self.container.id)
         except Exception as e:
             raise SandboxError(f"Failed to create container: {str(e)}")
     
-    async def run_command(self, command: str) -> str:
-        """Execute a command in the container"""
+    async def run_command(self, command) -> str:
+        """
+        Execute a command in the container
+        Args:
+            command: Argument list, run without a shell; a string is split like one
+        Returns:
+            stdout and stderr of the command
+        """
         if not self.container:
             raise SandboxError("Container not created")
         
         try:
-            exec_result = self.container.exec_run(command, tty=True)
-            return exec_result.output.decode('utf-8')
+            exec_result = await asyncio.to_thread(self.container.exec_run, command, tty=False)
+            return exec_result.output.decode('utf-8', errors='replace')
         except Exception as e:
             raise SandboxError(f"Failed to execute command: {str(e)}")
 
+    async def stream_command(self, command, status: Optional[dict] = None):
+        """
+        Execute a command in the container and yield raw stdout chunks as they arrive
+        Args:
+            command: Argument list, run without a shell
+            status: Filled with the command's "stderr" chunks and, once it exits, its "exit_code"
+        """
+        if not self.container:
+            raise SandboxError("Container not created")
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        if status is None:
+            status = {}
+        status.setdefault("stderr", [])
+        status.setdefault("exit_code", None)
+
+        def pump():
+            try:
+                # no TTY, so stderr stays out of stdout (nmap -oX - must stay parseable)
+                api = self.container.client.api
+                exec_id = api.exec_create(self.container.id, command, tty=False)["Id"]
+                for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+                    if stdout:
+                        loop.call_soon_threadsafe(queue.put_nowait, stdout)
+                    if stderr:
+                        status["stderr"].append(stderr)
+                status["exit_code"] = api.exec_inspect(exec_id).get("ExitCode")
+            except Exception as e:
+                loop.call_soon_threadsafe(
+                    queue.put_nowait, SandboxError(f"Failed to execute command: {str(e)}")
+                )
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        pump_task = asyncio.ensure_future(asyncio.to_thread(pump))
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await pump_task
+
+    async def is_running(self) -> bool:
+        """Check whether the container is still up"""
+        if not self.container:
+            return False
+        try:
+            await asyncio.to_thread(self.container.reload)
+            return self.container.status == "running"
+        except Exception:
+            return False
+
+    async def reset_scratch(self, scratch_dir: str) -> bool:
+        """
+        Wipe the scratch directory and report whether it is clean afterwards
+        Args:
+            scratch_dir: Directory inside the container used for input files
+        """
+        if not self.container:
+            return False
+        try:
+            script = (
+                f"rm -rf {scratch_dir} && mkdir -p {scratch_dir} && "
+                f"test -z \"$(ls -A {scratch_dir})\""
+            )
+            exec_result = await asyncio.to_thread(self.container.exec_run, ["sh", "-c", script])
+            return exec_result.exit_code == 0
+        except Exception:
+            return False
+
+    async def make_dirs(self, paths: list) -> bool:
+        """Create directories inside the container, keeping what they already hold"""
+        if not self.container:
+            return False
+        try:
+            exec_result = await asyncio.to_thread(self.container.exec_run, ["mkdir", "-p", *paths])
+            return exec_result.exit_code == 0
+        except Exception:
+            return False
+
     async def copy_to_container(self, source_path: str, container_path: str) -> None:
         """
         Copy a file from host to container
@@ -79,67 +311,337 @@ class SandboxClient:
             source_path: Path to the file on host
             container_path: Path where to put the file in container
         """
+        await self.copy_files_to_container({source_path: container_path})
+
+    async def copy_files_to_container(self, files: Dict[str, str]) -> None:
+        """
+        Copy files from host to container in one streamed tar archive
+        Args:
+            files: Dict of {local_path: container_path}
+        """
         if not self.container:
             raise SandboxError("Container not created")
-        
+        if not files:
+            return
+
+        # extract at the deepest common directory, naming every file relative to it
+        root = os.path.commonpath([os.path.dirname(path) for path in files.values()])
+        members = {local: os.path.relpath(path, root) for local, path in files.items()}
         try:
-            # create a memory-based tar file
-            tar_stream = io.BytesIO()
-            with tarfile.open(fileobj=tar_stream, mode='w') as tar:
-                # add file to tar
-                tar.add(source_path, arcname=os.path.basename(container_path))
-            
-            tar_stream.seek(0)
-            # copy to container
-            self.container.put_archive(
-                path=os.path.dirname(container_path),
-                data=tar_stream
-            )
-            print(f"File copied to container: {container_path}")
+            with PHASE_SECONDS.time("sandbox", "copy_in"):
+                # the archive is generated while the Docker SDK sends it, so file contents are never held in memory
+                await asyncio.to_thread(self.container.put_archive, path=root, data=tar_stream(members))
         except Exception as e:
             raise SandboxError(f"Failed to copy file to container: {str(e)}")
 
+    async def link_files(self, links: Dict[str, str]) -> None:
+        """
+        Hard-link files already inside the container to further paths, copying across file systems
+        Args:
+            links: Dict of {existing container path: new container path}
+        """
+        if not self.container:
+            raise SandboxError("Container not created")
+        if not links:
+            return
+        script = " && ".join(
+            f"mkdir -p {shlex.quote(os.path.dirname(dst))} && "
+            f"{{ ln -f {shlex.quote(src)} {shlex.quote(dst)} 2>/dev/null || cp {shlex.quote(src)} {shlex.quote(dst)}; }}"
+            for src, dst in links.items()
+        )
+        exec_result = await asyncio.to_thread(self.container.exec_run, ["sh", "-c", script])
+        if exec_result.exit_code != 0:
+            raise SandboxError(f"Failed to link files in container: {exec_result.output.decode('utf-8', 'replace')}")
+
+    async def remove_files(self, paths: list) -> None:
+        """Delete files inside the container"""
+        if self.container and paths:
+            await asyncio.to_thread(self.container.exec_run, ["rm", "-f", *paths])
+
     async def copy_from_container(self, container_path: str, dest_path: str) -> None:
         """
-        Copy a file from container to host
+        Copy a file or directory from container to host
         Args:
-            container_path: Path to the file in container
-            dest_path: Path where to put the file on host
+            container_path: Path to the file or directory in container
+            dest_path: Path where to put the file (or the directory's contents) on host
         """
         if not self.container:
             raise SandboxError("Container not created")
         
         try:
             # get the tar stream of the file from container
-            bits, stat = self.container.get_archive(container_path)
-            
-            # create the destination directory (if it doesn't exist)
-            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            
-            # write the tar stream to a temporary file
-            with open(dest_path, 'wb') as f:
-                for chunk in bits:
-                    f.write(chunk)
-            print(f"File copied from container: {dest_path}")
+            bits, stat = await asyncio.to_thread(
+                self.container.get_archive, container_path, chunk_size=TRANSFER_CHUNK_SIZE
+            )
+            # unpack it while it is being received
+            await asyncio.to_thread(extract_archive, bits, container_path, dest_path)
+            logger.debug("File copied from container: %s", dest_path)
         except Exception as e:
             raise SandboxError(f"Failed to copy file from container: {str(e)}")
+
+    async def copy_files_from_container(self, files: Dict[str, str]) -> None:
+        """
+        Copy several files or directories from container to host
+        Args:
+            files: Dict of {container_path: dest_path}
+        """
+        for container_path, dest_path in files.items():
+            await self.copy_from_container(container_path, dest_path)
     
     async def cleanup(self) -> None:
         """Clean up and remove the container"""
         if self.container:
             try:
-                self.container.stop()
-                self.container.remove()
-                print(f"Container cleaned up: {self.container.id}")
+                await asyncio.to_thread(self.container.stop)
+                await asyncio.to_thread(self.container.remove)
+                logger.debug("Container cleaned up: %s", self.container.id)
                 self.container = None
             except Exception as e:
-                print(f"Error cleaning up container: {str(e)}")
+                logger.warning("Error cleaning up container: %s", e)
 
 def create_sandbox_client() -> SandboxClient:
     """Create a factory function for the sandbox client"""
     return SandboxClient()
 
 
+@dataclass
+class PooledContainer:
+    """A started container handed out by the ContainerPool"""
+    client: SandboxClient
+    profile: tuple
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    executions: int = 0
+    # sha256 -> size of the input files held in the pool's blob directory, least recently used first
+    blobs: "OrderedDict[str, int]" = field(default_factory=OrderedDict)
+    # serializes uploads when several commands share the container
+    upload_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ContainerPool:
+    """
+    Pool of pre-started sandbox containers.
+
+    Containers are grouped by profile (image, network_enabled, memory_limit),
+    so a CommandRunner subclass always gets a container matching its own
+    settings. A container is recycled once it has served `max_executions`
+    commands, when its scratch directory cannot be cleaned, or when it fails
+    a health check; idle containers are evicted after `idle_timeout` seconds.
+
+    Input files are uploaded once per container into a content-addressed
+    blob directory that survives scratch resets and are hard-linked into
+    the scratch directory, so re-analyzing the same firmware or pcap on a
+    pooled container does not send it again.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_executions: int = 50,
+        idle_timeout: int = 600,
+        scratch_dir: str = "/tmp/kali_mcps",
+        blob_dir: str = "/tmp/kali_mcps_blobs",
+        blob_cache_bytes: int = 2 * 1024 * 1024 * 1024
+    ):
+        self.size = size
+        self.max_executions = max_executions
+        self.idle_timeout = idle_timeout
+        self.scratch_dir = scratch_dir
+        self.blob_dir = blob_dir
+        self.blob_cache_bytes = blob_cache_bytes
+        self._idle: Dict[tuple, list] = {}
+        self._busy: Dict[int, PooledContainer] = {}
+        self._lock = asyncio.Lock()
+        self.uploaded_bytes = 0
+        self.reused_bytes = 0
+
+    @staticmethod
+    def profile_of(config: SandboxSettings) -> tuple:
+        """Return the pool key for a sandbox configuration"""
+        return (config.image, config.network_enabled, config.memory_limit, config.shared_dir)
+
+    async def _start(self, config: SandboxSettings) -> PooledContainer:
+        client = create_sandbox_client()
+        await client.create(config=config)
+        if not await client.reset_scratch(self.scratch_dir):
+            await client.cleanup()
+            raise SandboxError("Failed to prepare scratch directory")
+        # uploaded inputs are kept here for the container's lifetime, unlike the scratch directory
+        if not await client.make_dirs([self.blob_dir]):
+            await client.cleanup()
+            raise SandboxError("Failed to prepare blob directory")
+        return PooledContainer(client=client, profile=self.profile_of(config))
+
+    async def _retire(self, pooled: PooledContainer) -> None:
+        await pooled.client.cleanup()
+
+    async def warm(self, config: SandboxSettings, count: Optional[int] = None) -> None:
+        """
+        Pre-start containers for a profile until `count` are idle
+        Args:
+            config: Sandbox settings describing the profile
+            count: Number of idle containers to keep (default: pool size)
+        """
+        count = self.size if count is None else count
+        profile = self.profile_of(config)
+        async with self._lock:
+            missing = count - len(self._idle.get(profile, []))
+        for _ in range(max(missing, 0)):
+            pooled = await self._start(config)
+            async with self._lock:
+                self._idle.setdefault(profile, []).append(pooled)
+
+    async def checkout(self, config: SandboxSettings) -> PooledContainer:
+        """Take a healthy container for the given settings, starting one if none is idle"""
+        with QUEUE_WAIT_SECONDS.time("sandbox_checkout"):
+            return await self._checkout(config)
+
+    async def _checkout(self, config: SandboxSettings) -> PooledContainer:
+        await self.evict_idle()
+        profile = self.profile_of(config)
+        while True:
+            async with self._lock:
+                idle = self._idle.get(profile, [])
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                pooled = await self._start(config)
+                break
+            if await pooled.client.is_running():
+                break
+            await self._retire(pooled)
+
+        pooled.last_used = time.monotonic()
+        async with self._lock:
+            self._busy[id(pooled)] = pooled
+        return pooled
+
+    async def checkin(self, pooled: PooledContainer, healthy: bool = True) -> None:
+        """
+        Return a container to the pool
+        Args:
+            pooled: Container previously obtained from checkout
+            healthy: False if the caller saw the container misbehave
+        """
+        async with self._lock:
+            self._busy.pop(id(pooled), None)
+        pooled.executions += 1
+        pooled.last_used = time.monotonic()
+
+        recycle = (
+            not healthy
+            or pooled.executions >= self.max_executions
+            or not await pooled.client.is_running()
+            or not await pooled.client.reset_scratch(self.scratch_dir)
+        )
+        if not recycle:
+            async with self._lock:
+                idle = self._idle.setdefault(pooled.profile, [])
+                if len(idle) < self.size:
+                    idle.append(pooled)
+                    return
+        await self._retire(pooled)
+
+    async def upload(self, pooled: PooledContainer, files: Dict[str, str]) -> None:
+        """
+        Make host files available at the given paths of a checked out container
+        Content the container already holds is linked instead of being uploaded again.
+        Args:
+            pooled: Container obtained from checkout
+            files: Dict of {local_path: container_path}
+        """
+        async with pooled.upload_lock:
+            await self._upload(pooled, files)
+
+    async def _upload(self, pooled: PooledContainer, files: Dict[str, str]) -> None:
+        digests = {}
+        for local_path in files:
+            digests[local_path] = await asyncio.to_thread(file_digest, local_path)
+
+        missing: Dict[str, str] = {}
+        for local_path, digest in digests.items():
+            size = os.path.getsize(local_path)
+            if digest in pooled.blobs:
+                pooled.blobs.move_to_end(digest)
+                self.reused_bytes += size
+            elif digest not in missing.values():
+                missing[local_path] = digest
+
+        if missing:
+            incoming = {digest: os.path.getsize(local_path) for local_path, digest in missing.items()}
+            needed = sum(pooled.blobs.values()) + sum(incoming.values()) - self.blob_cache_bytes
+            in_use = set(digests.values())
+            evicted = []
+            for digest, size in list(pooled.blobs.items()):
+                if needed <= 0:
+                    break
+                if digest not in in_use:
+                    del pooled.blobs[digest]
+                    evicted.append(f"{self.blob_dir}/{digest}")
+                    needed -= size
+            await pooled.client.remove_files(evicted)
+            await pooled.client.copy_files_to_container(
+                {local_path: f"{self.blob_dir}/{digest}" for local_path, digest in missing.items()}
+            )
+            pooled.blobs.update(incoming)
+            self.uploaded_bytes += sum(incoming.values())
+
+        await pooled.client.link_files(
+            {f"{self.blob_dir}/{digests[local_path]}": path for local_path, path in files.items()}
+        )
+
+    async def evict_idle(self) -> None:
+        """Stop containers that have been idle longer than idle_timeout"""
+        now = time.monotonic()
+        expired = []
+        async with self._lock:
+            for profile, idle in self._idle.items():
+                keep = []
+                for pooled in idle:
+                    if now - pooled.last_used > self.idle_timeout:
+                        expired.append(pooled)
+                    else:
+                        keep.append(pooled)
+                self._idle[profile] = keep
+        for pooled in expired:
+            await self._retire(pooled)
+
+    async def shutdown(self) -> None:
+        """Stop every container owned by the pool"""
+        async with self._lock:
+            containers = [p for idle in self._idle.values() for p in idle]
+            containers.extend(self._busy.values())
+            self._idle.clear()
+            self._busy.clear()
+        for pooled in containers:
+            await self._retire(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return idle/busy counts per profile and bytes uploaded or reused from container blobs"""
+        return {
+            "idle": {str(profile): len(idle) for profile, idle in self._idle.items()},
+            "busy": len(self._busy),
+            "uploaded_bytes": self.uploaded_bytes,
+            "reused_bytes": self.reused_bytes,
+        }
+
+
+_container_pool: Optional[ContainerPool] = None
+
+
+def get_container_pool() -> ContainerPool:
+    """Return the process-wide container pool, configured from the environment"""
+    global _container_pool
+    if _container_pool is None:
+        _container_pool = ContainerPool(
+            size=int(os.environ.get("SANDBOX_POOL_SIZE", "2")),
+            max_executions=int(os.environ.get("SANDBOX_POOL_MAX_EXECUTIONS", "50")),
+            idle_timeout=int(os.environ.get("SANDBOX_POOL_IDLE_TIMEOUT", "600")),
+            blob_cache_bytes=int(os.environ.get("SANDBOX_BLOB_CACHE_BYTES", str(2 * 1024 * 1024 * 1024))),
+        )
+        get_metrics().register_stats("kali_mcps_sandbox_pool", _container_pool.stats)
+    return _container_pool
+
+
 
 # example
 async def run_in_sandbox(command: str) -> str: